@@ -0,0 +1,185 @@
+"""In-memory aggregation of every dashboard metric from one read of ``songs``.
+
+The dashboard used to ask Supabase for each number separately (one ``count``
+per status, genre and album).  ``DashboardAggregate`` instead receives the
+song rows once and stores them in a ``SongColumns`` snapshot (columnar.py),
+so the cost of a page load no longer depends on how many lookup rows exist
+and a large catalog takes a few dozen bytes per song instead of a dict.
+Songs can also be removed and re-added, which lets callers patch the
+snapshot when a single song changes.
+"""
+from datetime import date, timedelta
+from itertools import repeat
+
+from columnar import SongColumns
+
+COMPLETED_STATUSES = (9, 10)
+RELEASED_STATUS = 10
+ABANDONED_STATUS = 8
+FAVORITE_RATING = 5
+UPCOMING_DUE_DAYS = 7
+RECENT_LIMIT = 5
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+# Columnas que necesita el dashboard (listas + contadores) en una sola lectura.
+SONG_PROJECTION = "*, artists(name), albums(name), song_statuses(name)"
+# embed -> columna de la canción
+EMBEDS = {"artists": "artist_id", "albums": "album_id", "song_statuses": "status"}
+
+
+def with_lookup_names(song, lookups):
+    """Add the ``artists``/``albums``/``song_statuses`` embeds to a bare row.
+
+    Write endpoints get plain rows back from Supabase; the dashboard lists
+    expect the same shape as ``SONG_PROJECTION``.  ``lookups`` maps each
+    table to ``{id: row}``.
+    """
+    song = dict(song)
+    for embed, field in EMBEDS.items():
+        ref = lookups.get(embed, {}).get(song.get(field))
+        song[embed] = {"name": ref.get("name")} if ref else None
+    return song
+
+
+class DashboardAggregate:
+    """Dashboard metrics for a fixed ``today`` over a columnar song snapshot."""
+
+    def __init__(self, statuses, genres, albums, today=None):
+        self.today = today or date.today()
+        self.statuses = list(statuses or [])
+        self.genres = list(genres or [])
+        self.albums = list(albums or [])
+
+        self.columns = SongColumns()
+        # embed -> id -> {"name": ...} para las listas; se completan con los embeds de cada canción
+        self.embeds = {embed: {} for embed in EMBEDS}
+        for embed, rows in (("song_statuses", self.statuses), ("albums", self.albums)):
+            self.embeds[embed].update((r.get("id"), {"name": r.get("name")}) for r in rows)
+        self._cached = None
+
+    # ------------------------------
+    # API pública
+    # ------------------------------
+
+    def _remember_names(self, songs):
+        for embed, field in EMBEDS.items():
+            # último embed visto por id; solo se recorre en Python un embed por id
+            refs = dict(zip(map(dict.get, songs, repeat(field)), map(dict.get, songs, repeat(embed))))
+            self.embeds[embed].update((key, {"name": ref.get("name")}) for key, ref in refs.items() if ref and key is not None)
+
+    def add(self, song):
+        self._remember_names([song])
+        self.columns.upsert(song)
+
+    def add_many(self, songs):
+        songs = list(songs)
+        self._remember_names(songs)
+        self.columns.load(songs)
+        return self
+
+    def remove(self, song_id):
+        return self.columns.remove(song_id)
+
+    def add_lookup(self, table, row):
+        """Register a new status/genre/album so it gets its own chart slot."""
+        target = {"song_statuses": self.statuses, "genres": self.genres, "albums": self.albums}.get(table)
+        if target is not None and row and all(r.get("id") != row.get("id") for r in target):
+            target.append(row)
+        if table in self.embeds and row:
+            self.embeds[table][row.get("id")] = {"name": row.get("name")}
+        self._cached = None
+
+    # ------------------------------
+    # Filtros sobre el snapshot
+    # ------------------------------
+
+    def _masks(self):
+        """Masks and counts shared by ``kpis`` and ``context``, cached per snapshot version."""
+        cols = self.columns
+        if self._cached is not None and self._cached[0] == cols.version:
+            return self._cached[1]
+        today = self.today
+        completed = cols.is_in("status", COMPLETED_STATUSES)
+        # PostgREST evalúa NOT IN con NULL como falso: sin status no cuenta.
+        open_ = cols.both(cols.not_null("status"), cols.negate(completed))
+        year_end = date(today.year, 12, 31)
+        masks = {
+            "completed": completed,
+            "upcoming_due": cols.both(open_, cols.between("due_date", today, today + timedelta(days=UPCOMING_DUE_DAYS))),
+            "overdue": cols.both(open_, cols.between("due_date", None, today - timedelta(days=1))),
+            "upcoming_releases": cols.both(completed, cols.between("release_date", today, year_end)),
+            "released": cols.both(cols.is_in("status", [RELEASED_STATUS]),
+                                  cols.between("release_date", None, today - timedelta(days=1))),
+            "this_year": cols.both(completed, cols.between("release_date", date(today.year, 1, 1), year_end)),
+        }
+        self._cached = (cols.version, masks)
+        return masks
+
+    def _list(self, rows, updated_at=False):
+        out = []
+        embeds = [(embed, field, self.embeds[embed]) for embed, field in EMBEDS.items()]
+        for row in rows:
+            song = self.columns.row(row, updated_at)
+            for embed, field, refs in embeds:
+                song[embed] = refs.get(song[field])
+            out.append(song)
+        return out
+
+    def recent(self, limit=RECENT_LIMIT):
+        return self._list(self.columns.latest(limit), updated_at=True)
+
+    def kpis(self):
+        """Headline numbers of the dashboard (cards and progress bar)."""
+        cols = self.columns
+        masks = self._masks()
+        if "kpis" in masks:
+            return dict(masks["kpis"])
+        total = len(cols)
+        completed = cols.count(masks["completed"])
+        rating_sum, rating_count = cols.rating_stats()
+        masks["kpis"] = {
+            "total_songs": total,
+            "completed_songs": completed,
+            "progress_percentage": round((completed / total) * 100, 1) if total > 0 else 0,
+            "favorite_songs": cols.count(cols.is_in("rating", [FAVORITE_RATING])),
+            "abandoned_songs": cols.count(cols.is_in("status", [ABANDONED_STATUS])),
+            "avg_rating": round(rating_sum / rating_count, 1) if rating_count else 0,
+            "upcoming_release_count": cols.count(masks["upcoming_releases"]),
+        }
+        return dict(masks["kpis"])
+
+    def context(self):
+        """Template variables expected by ``dashboard.html``."""
+        cols = self.columns
+        masks = self._masks()
+        kpis = self.kpis()
+        status_counts = cols.count_by("status")
+        genre_counts = cols.count_by("genre")
+        album_counts = cols.count_by("album_id")
+        monthly = cols.month_counts("release_date", masks["this_year"])
+        return {
+            "upcoming_due": self._list(cols.rows(masks["upcoming_due"], "due_date")),
+            "upcoming_releases": self._list(cols.rows(masks["upcoming_releases"], "release_date")),
+            "overdue_songs": self._list(cols.rows(masks["overdue"], "due_date", desc=True)),
+            "released_songs": self._list(cols.rows(masks["released"])),
+            "total_songs": kpis["total_songs"],
+            "completed_songs": kpis["completed_songs"],
+            "progress_percentage": kpis["progress_percentage"],
+            "recent_songs": self.recent(),
+            "status_labels": [s["name"] for s in self.statuses],
+            "status_colors": [s.get("color") for s in self.statuses],
+            "status_counts": [status_counts.get(s["id"], 0) for s in self.statuses],
+            "genre_labels": [g["name"] for g in self.genres],
+            "genre_color": [g.get("color") for g in self.genres],
+            "genre_counts": [genre_counts.get(g["id"], 0) for g in self.genres],
+            "album_labels": [a["name"] for a in self.albums],
+            "album_colors": [a.get("color") for a in self.albums],
+            "album_counts": [album_counts.get(a["id"], 0) for a in self.albums],
+            "favorite_songs": kpis["favorite_songs"],
+            "abandoned_songs": kpis["abandoned_songs"],
+            "avg_rating": kpis["avg_rating"],
+            "kpis": kpis,
+            "months": list(MONTHS),
+            "activity_counts": [monthly.get(i, 0) for i in range(12)],
+        }
@@ -0,0 +1,394 @@
+"""Background alerts when songs become due, overdue or reach their release.
+
+``DeadlineScheduler`` keeps a min-heap of upcoming transitions keyed by the
+day they happen:
+
+* ``due_soon``  -- an open song enters the ``UPCOMING_DUE_DAYS`` window,
+* ``overdue``   -- the day after an open song's due date,
+* ``released``  -- the release date of a completed song.
+
+The heap is filled by two range queries (``due_date`` and ``release_date``
+between yesterday and ``horizon_days`` ahead, both indexed columns in the
+replica) every ``refresh_interval`` seconds, and by the write routes through
+``song_saved``/``song_deleted``, so a tick only pops the transitions whose
+day has come instead of scanning the table.  Every alert is claimed per sink
+in a ``Dedup`` store before it is sent: with ``SQLiteDedup`` (one host) or
+``RedisDedup`` every Gunicorn worker can run a scheduler and each transition
+still fires once.  A send that fails releases its claim and the transition
+is retried with exponential backoff while it is within ``catch_up_days``.  Alerts go to pluggable sinks (``LogSink``,
+``WebhookSink``, ``EmailSink``).
+"""
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from aggregates import COMPLETED_STATUSES, UPCOMING_DUE_DAYS
+from columnar import parse_date
+
+logger = logging.getLogger(__name__)
+
+ALERT_PROJECTION = "id, name, status, due_date, release_date"
+# días que se guarda una marca de deduplicación (más que cualquier ventana de alerta)
+DEDUP_TTL_DAYS = 30
+# reintentos de una alerta que un destino no pudo enviar: 1, 2, 4... minutos, hasta 1 hora
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 3600
+
+
+def song_transitions(song):
+    """``{kind: (fire_day, deadline)}`` for a song; days are ordinals."""
+    status = song.get("status")
+    due = parse_date(song.get("due_date"))
+    release = parse_date(song.get("release_date"))
+    out = {}
+    # PostgREST evalúa NOT IN con NULL como falso: sin status no cuenta como abierta
+    if status is not None and status not in COMPLETED_STATUSES and due:
+        out["due_soon"] = (due.toordinal() - UPCOMING_DUE_DAYS, due.toordinal())
+        out["overdue"] = (due.toordinal() + 1, due.toordinal())
+    if status in COMPLETED_STATUSES and release:
+        out["released"] = (release.toordinal(), release.toordinal())
+    return out
+
+
+# ------------------------------
+# Deduplicación
+# ------------------------------
+
+class LocalDedup:
+    """In-process claims (a single worker)."""
+
+    def __init__(self):
+        self._claimed = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, ttl):
+        now = time.time()
+        with self._lock:
+            if self._claimed.get(key, 0) > now:
+                return False
+            self._claimed[key] = now + ttl
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._claimed.pop(key, None)
+
+
+class SQLiteDedup:
+    """Claims in a SQLite file shared by the workers of one host."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS alert_claims (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def claim(self, key, ttl):
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM alert_claims WHERE key = ? AND expires_at < ?", (key, now))
+                # INSERT OR IGNORE es atómico: solo un worker inserta la clave
+                cur = conn.execute("INSERT OR IGNORE INTO alert_claims (key, expires_at) VALUES (?, ?)", (key, now + ttl))
+                return cur.rowcount == 1
+        finally:
+            conn.close()
+
+    def release(self, key):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM alert_claims WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+
+class RedisDedup:
+    """Claims with ``SET NX`` in Redis, shared by every worker."""
+
+    def __init__(self, redis_url, prefix="music-tracker:alert:"):
+        import redis  # dependencia opcional, solo si se configura la URL
+
+        self._redis = redis.Redis.from_url(redis_url)
+        self._prefix = prefix
+
+    def claim(self, key, ttl):
+        return bool(self._redis.set(self._prefix + key, 1, nx=True, ex=max(int(ttl), 1)))
+
+    def release(self, key):
+        self._redis.delete(self._prefix + key)
+
+
+# ------------------------------
+# Destinos
+# ------------------------------
+
+def alert_message(alert):
+    name = alert.get("name") or f"#{alert['song_id']}"
+    if alert["type"] == "due_soon":
+        return f"'{name}' is due on {alert['date']} ({alert['days']} days left)"
+    if alert["type"] == "overdue":
+        return f"'{name}' is overdue since {alert['date']}"
+    return f"'{name}' is released today ({alert['date']})"
+
+
+class LogSink:
+    def send(self, alert):
+        logger.info("alert %s", json.dumps(alert))
+
+
+class WebhookSink:
+    """POST every alert as JSON to ``url``."""
+
+    def __init__(self, url, timeout=5):
+        import httpx
+
+        self.url = url
+        self._client = httpx.Client(timeout=timeout)
+
+    def send(self, alert):
+        self._client.post(self.url, json={**alert, "text": alert_message(alert)}).raise_for_status()
+
+
+class EmailSink:
+    """Stub: composes the email for ``to`` and logs it (no SMTP server is configured)."""
+
+    def __init__(self, to, sender="music-tracker@localhost"):
+        self.to = to
+        self.sender = sender
+        self.outbox = []
+
+    def send(self, alert):
+        email = {"from": self.sender, "to": self.to, "subject": f"[Music Tracker] {alert['type']}", "body": alert_message(alert)}
+        self.outbox.append(email)
+        logger.info("email (stub) %s", json.dumps(email))
+
+
+# ------------------------------
+# Planificador
+# ------------------------------
+
+class DeadlineScheduler:
+    """Min-heap of the next deadline transitions, fired once through ``dedup``.
+
+    ``fetch(column, start, end)`` returns the songs (``ALERT_PROJECTION``)
+    whose ``column`` date is in ``[start, end]``.  Transitions missed while
+    no scheduler was running are still sent up to ``catch_up_days`` later.
+    """
+
+    def __init__(self, fetch, sinks, dedup=None, horizon_days=14, catch_up_days=1,
+                 refresh_interval=900, tick_interval=60):
+        self.fetch = fetch
+        self.sinks = list(sinks)
+        self.dedup = dedup or LocalDedup()
+        self.horizon_days = horizon_days
+        self.catch_up_days = catch_up_days
+        self.refresh_interval = refresh_interval
+        self.tick_interval = tick_interval
+        self._heap = []
+        # song_id -> {kind: (fire_day, deadline)}; las entradas del heap que no coinciden están obsoletas
+        self._pending = {}
+        self._names = {}
+        # (kind, song_id, deadline) -> (intentos fallidos, no antes de este time.monotonic())
+        self._retries = {}
+        self._lock = threading.Lock()
+        self.refreshed_at = None
+        self.sent = 0
+        self.last_error = None
+
+    # ------------------------------
+    # Estado
+    # ------------------------------
+
+    def _track(self, song, today):
+        transitions = {
+            kind: (fire, deadline) for kind, (fire, deadline) in song_transitions(song).items()
+            # fuera de la ventana: otro refresh la traerá cuando se acerque
+            if today.toordinal() - self.catch_up_days <= self._last_day(kind, fire, deadline)
+            and fire <= today.toordinal() + self.horizon_days
+        }
+        song_id = song["id"]
+        if transitions:
+            self._names[song_id] = song.get("name")
+            self._pending[song_id] = transitions
+            for kind, (fire, deadline) in transitions.items():
+                heapq.heappush(self._heap, (fire, kind, song_id, deadline))
+        else:
+            self._pending.pop(song_id, None)
+            self._names.pop(song_id, None)
+
+    def _last_day(self, kind, fire, deadline):
+        # due_soon sigue vigente hasta el día de entrega; las demás, el día en que ocurren
+        return deadline if kind == "due_soon" else fire
+
+    def refresh(self, today=None):
+        """Reload the window around ``today`` with two range queries."""
+        today = today or date.today()
+        start = today - timedelta(days=self.catch_up_days + 1)
+        end = today + timedelta(days=self.horizon_days + UPCOMING_DUE_DAYS)
+        songs = {}
+        for column in ("due_date", "release_date"):
+            for song in self.fetch(column, start, end):
+                songs[song["id"]] = song
+        with self._lock:
+            self._heap = []
+            self._pending = {}
+            self._names = {}
+            for song in songs.values():
+                self._track(song, today)
+            self.refreshed_at = time.monotonic()
+        return len(songs)
+
+    def song_saved(self, song, today=None):
+        """Track a song inserted or updated by this worker (a full songs row)."""
+        with self._lock:
+            self._track(song, today or date.today())
+
+    def song_deleted(self, song_id):
+        with self._lock:
+            self._pending.pop(song_id, None)
+            self._names.pop(song_id, None)
+
+    def invalidate(self):
+        """Refresh on the next tick (e.g. after a bulk import)."""
+        with self._lock:
+            self.refreshed_at = None
+
+    # ------------------------------
+    # Disparo
+    # ------------------------------
+
+    def tick(self, today=None):
+        """Send the transitions whose day has come; returns the alerts sent."""
+        today = today or date.today()
+        now = time.monotonic()
+        due = []
+        waiting = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= today.toordinal():
+                entry = heapq.heappop(self._heap)
+                fire, kind, song_id, deadline = entry
+                if self._pending.get(song_id, {}).get(kind) != (fire, deadline):
+                    continue
+                retry = self._retries.get((kind, song_id, deadline))
+                if retry and retry[1] > now:
+                    # todavía en espera tras un envío fallido
+                    waiting.append(entry)
+                    continue
+                del self._pending[song_id][kind]
+                if today.toordinal() - self.catch_up_days > self._last_day(kind, fire, deadline):
+                    self._retries.pop((kind, song_id, deadline), None)
+                    continue
+                due.append((fire, kind, song_id, deadline, self._names.get(song_id)))
+            for entry in waiting:
+                heapq.heappush(self._heap, entry)
+        sent = []
+        for fire, kind, song_id, deadline, name in due:
+            deadline_date = date.fromordinal(deadline)
+            alert = {
+                "type": kind,
+                "song_id": song_id,
+                "name": name,
+                "date": deadline_date.isoformat(),
+                "days": deadline - today.toordinal(),
+            }
+            delivered = failed = False
+            for sink in self.sinks:
+                # la clave incluye la fecha: si cambia la fecha de entrega, la alerta vuelve a salir.
+                # Una por destino: un reintento no repite los destinos que ya la recibieron
+                key = f"{kind}:{song_id}:{deadline_date.isoformat()}:{type(sink).__name__}"
+                if not self.dedup.claim(key, DEDUP_TTL_DAYS * 86400):
+                    continue
+                try:
+                    sink.send(alert)
+                    delivered = True
+                except Exception as e:
+                    self.dedup.release(key)
+                    failed = True
+                    self.last_error = str(e)
+                    logger.warning("alert sink %s failed: %s", type(sink).__name__, e)
+            if failed:
+                self._retry_later(fire, kind, song_id, deadline)
+            else:
+                with self._lock:
+                    self._retries.pop((kind, song_id, deadline), None)
+            if delivered:
+                sent.append(alert)
+        self.sent += len(sent)
+        return sent
+
+    def _retry_later(self, fire, kind, song_id, deadline):
+        with self._lock:
+            if song_id not in self._names:
+                # la canción se borró o dejó de tener fecha mientras se enviaba
+                self._retries.pop((kind, song_id, deadline), None)
+                return
+            attempts = self._retries.get((kind, song_id, deadline), (0, 0))[0] + 1
+            delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+            self._retries[(kind, song_id, deadline)] = (attempts, time.monotonic() + delay)
+            pending = self._pending.setdefault(song_id, {})
+            # una edición de la canción mientras se enviaba manda sobre el reintento
+            if kind not in pending:
+                pending[kind] = (fire, deadline)
+                heapq.heappush(self._heap, (fire, kind, song_id, deadline))
+
+    def run_once(self, today=None):
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at >= self.refresh_interval:
+            self.refresh(today)
+        return self.tick(today)
+
+    def start(self):
+        """Refresh and tick in a daemon thread; returns an Event that stops it."""
+        def loop():
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.warning("alert scheduler failed: %s", e)
+                if stop.wait(self.tick_interval):
+                    return
+
+        stop = threading.Event()
+        threading.Thread(target=loop, name="alert-scheduler", daemon=True).start()
+        return stop
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": sum(len(t) for t in self._pending.values()),
+                "next": date.fromordinal(self._heap[0][0]).isoformat() if self._heap else None,
+                "sent": self.sent,
+                "retrying": len(self._retries),
+                "sinks": [type(s).__name__ for s in self.sinks],
+                "dedup": type(self.dedup).__name__,
+                "last_error": self.last_error,
+            }
+
+
+def sinks_from_env():
+    sinks = []
+    for name in (s.strip() for s in os.environ.get("ALERT_SINKS", "log").split(",")):
+        if name == "log":
+            sinks.append(LogSink())
+        elif name == "webhook" and os.environ.get("ALERT_WEBHOOK_URL"):
+            sinks.append(WebhookSink(os.environ["ALERT_WEBHOOK_URL"]))
+        elif name == "email" and os.environ.get("ALERT_EMAIL_TO"):
+            sinks.append(EmailSink(os.environ["ALERT_EMAIL_TO"]))
+    return sinks
+
+
+def dedup_from_env():
+    redis_url = os.environ.get("ALERT_DEDUP_REDIS_URL")
+    if redis_url:
+        return RedisDedup(redis_url)
+    path = os.environ.get("ALERT_DEDUP_PATH")
+    return SQLiteDedup(path) if path else LocalDedup()
@@ -1,302 +1,524 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, current_app
-from supabase import create_client, Client
+from flask import Blueprint, Flask, Response, get_template_attribute, make_response, render_template, request, redirect, url_for, jsonify, current_app, stream_with_context
+from supabase import create_client, ClientOptions
 from dotenv import load_dotenv
 import os
-import sys
-import subprocess
-from datetime import date, timedelta, datetime
-from collections import Counter
+import click
+import json
+import time
+from datetime import date
+from functools import wraps
+from types import SimpleNamespace
+
+from aggregates import DashboardAggregate, SONG_PROJECTION, with_lookup_names
+from alerts import ALERT_PROJECTION, DeadlineScheduler, dedup_from_env, sinks_from_env
+from batch_edit import MAX_BATCH_IDS, BatchError, parse_batch, plan_batch, run_batch
+from bulk_io import DEFAULT_CHUNK_SIZE, FORMATS as BULK_FORMATS, SongImporter, detect_format, export_lines, iter_songs, read_rows
+from compression import DEFAULT_MIN_SIZE as COMPRESS_MIN_SIZE, init_app as init_compression
+from dashboard_cache import DashboardSnapshot
+from dashboard_sections import SECTIONS as DASHBOARD_SECTIONS, cheap_kpis, inline_charts, section_payload
+from datatables import SEARCH_INDEX_IDS, SONG_LIST_PROJECTION, is_filtered, page_query, parse_request as parse_datatables_request, with_list_embeds
+from db import DEFAULT_PAGE_SIZE, drop_connections, http_client_from_env
+from fanout import FanOut
+from file_launcher import FileLauncher, PathIndex
+from idempotency import Idempotency, keys_from_env
+from instrumentation import InstrumentedClient, SlowRequestSampler, init_app as init_instrumentation, record_response_bytes
+from live_events import MAX_ROWS_PER_EVENT, RELOAD_EVENT, EventStream, broker_from_env as live_broker_from_env
+from lookup_cache import LOOKUP_TABLES, LookupCache, backend_from_env
+from memory_store import MemoryStore
+from replica import SQLiteReplica
+from reports import REPORT_PROJECTION, REPORTS, SongReports, report_csv
+from search_index import KINDS as SEARCH_KINDS, SEARCH_PROJECTION, SongSearch
+from repository import Repository
+from static_assets import init_app as init_static_assets
+from song_fields import CREATED_KEYS, coerce_song_fields, coerce_song_update, resolve_pending
+from write_buffer import LookupNames, WriteCoalescer
+
+# Rutas, comandos y hooks; create_app() los registra en cada app que construye
+bp = Blueprint("music_tracker", __name__, cli_group=None)
+
+
+def create_app(config=None, upstream=None, warm=False):
+    """Build the app: configuration, backend clients and services.
+
+    Settings come from the environment (and ``.env``); ``config`` overrides
+    ``app.config`` entries such as ``DASHBOARD_ASYNC``.  ``upstream``
+    replaces the backend chosen by ``DATA_BACKEND`` (``bench.py`` passes a
+    ``MemoryStore``).  The services are kept in
+    ``app.extensions["music_tracker"]`` (see ``services()``).  With ``warm``
+    the caches of ``WARM_UP`` are filled before returning; with
+    ``preload_app`` that runs once in the gunicorn master and every worker
+    inherits the result.
+    """
+    # Cargar variables de entorno desde el archivo .env
+    load_dotenv()
+
+    app = Flask(__name__)
+    app.config.update(
+        # DASHBOARD_ASYNC=1: primero la página con los KPIs, luego cada sección desde /api/dashboard/<section>
+        DASHBOARD_ASYNC=os.environ.get("DASHBOARD_ASYNC", "0") == "1",
+        # LIVE_UPDATES=1: /events (Server-Sent Events) empuja los cambios de canciones a
+        # la lista y al dashboard abiertos; conviene un worker asíncrono (ver README)
+        LIVE_UPDATES=os.environ.get("LIVE_UPDATES", "0") == "1",
+        # carpeta desde la que /open-file puede abrir archivos; FILE_STATUS=1 marca
+        # en la lista los archivos que ya no existen
+        OPEN_BASE_DIR=os.path.realpath(os.environ.get("OPEN_BASE_DIR") or os.getcwd()),
+        FILE_STATUS=os.environ.get("FILE_STATUS", "0") == "1",
+    )
+    app.config.update(config or {})
+    app.jinja_env.globals["live_updates"] = app.config["LIVE_UPDATES"]
+
+    svc = app.extensions["music_tracker"] = SimpleNamespace(app=app, http_client=None, background_pid=None)
+
+    # Backend de datos: Supabase, o DATA_BACKEND=memory para trabajar sin red
+    # (MEMORY_SEED apunta a un JSON {"songs": [...], "artists": [...], ...}).
+    if upstream is None and os.environ.get("DATA_BACKEND", "supabase") == "memory":
+        seed = os.environ.get("MEMORY_SEED")
+        upstream = MemoryStore.from_json(seed) if seed else MemoryStore()
+    elif upstream is None:
+        # Configuración de Supabase
+        url: str = os.environ.get("SUPABASE_URL")
+        key: str = os.environ.get("SUPABASE_KEY")
+        svc.http_client = http_client_from_env(event_hooks={"response": [record_response_bytes]})
+        upstream = create_client(url, key, options=ClientOptions(httpx_client=svc.http_client))
+    svc.upstream = upstream
+
+    # Réplica local opcional (REPLICA_PATH): las lecturas salen de SQLite, las
+    # escrituras siguen yendo al backend y se aplican localmente si tienen éxito.
+    svc.replica = None
+    if os.environ.get("REPLICA_PATH"):
+        svc.replica = SQLiteReplica(
+            os.environ["REPLICA_PATH"],
+            full_sync_every=int(os.environ.get("REPLICA_FULL_SYNC_EVERY", 20)),
+        )
+        try:
+            svc.replica.sync(upstream)
+        except Exception as e:
+            # sin conexión se sirve lo que ya tenga el archivo local
+            svc.replica.last_sync_error = str(e)
+            app.logger.warning("replica sync failed, serving local copy: %s", e)
+
+    # Acceso a datos de todas las rutas (repository.py); cada consulta queda medida
+    svc.repo = Repository(
+        InstrumentedClient(upstream),
+        reader=InstrumentedClient(svc.replica) if svc.replica else None,
+        replica=svc.replica,
+    )
+
+    # Server-Timing, log JSON por petición (REQUEST_LOG=0 lo apaga), /metrics y,
+    # con SLOW_REQUEST_MS, perfiles cProfile de las peticiones lentas
+    slow_request_ms = os.environ.get("SLOW_REQUEST_MS")
+    init_instrumentation(
+        app,
+        sampler=SlowRequestSampler(
+            float(slow_request_ms),
+            os.environ.get("SLOW_REQUEST_DIR", "slow_requests"),
+            sample_rate=float(os.environ.get("SLOW_REQUEST_SAMPLE_RATE", 1)),
+        ) if slow_request_ms else None,
+        log_requests=os.environ.get("REQUEST_LOG", "1") != "0",
+    )
+
+    # HTML/JSON con ETag y comprimido con gzip/brotli (COMPRESSION=0 si ya lo hace un
+    # proxy); url_for('static', ...) devuelve URLs con hash que el navegador cachea un año
+    if os.environ.get("COMPRESSION", "1") != "0":
+        init_compression(
+            app,
+            min_size=int(os.environ.get("COMPRESS_MIN_SIZE", COMPRESS_MIN_SIZE)),
+            level=int(os.environ.get("COMPRESS_LEVEL", 6)),
+        )
+    init_static_assets(app)
+
+    # Consultas independientes del dashboard en paralelo (DASHBOARD_CONCURRENCY=0 las ejecuta en serie)
+    svc.dashboard_fanout = FanOut(
+        max_workers=int(os.environ.get("DASHBOARD_CONCURRENCY", 6)),
+        timeout=float(os.environ.get("DASHBOARD_QUERY_TIMEOUT", 8)),
+        name="dashboard",
+    )
+
+    # Snapshot del dashboard por día; DASHBOARD_SNAPSHOT_TTL fuerza un recálculo completo
+    svc.dashboard_snapshot = DashboardSnapshot(max_age=int(os.environ.get("DASHBOARD_SNAPSHOT_TTL", 300)))
+
+    svc.live_events = live_broker_from_env() if app.config["LIVE_UPDATES"] else None
+    if svc.live_events is not None:
+        svc.live_events.on_remote = lambda event, data: apply_remote_event(svc, event, data)
+
+    # Cache de tablas de referencia (artists, albums, genres, song_statuses).
+    # LOOKUP_CACHE_TTL=0 lo desactiva; LOOKUP_CACHE_REDIS_URL lo comparte entre workers.
+    svc.lookup_cache = LookupCache(
+        lambda table: svc.repo.table(table).all(),
+        ttl=int(os.environ.get("LOOKUP_CACHE_TTL", 300)),
+        max_rows=int(os.environ.get("LOOKUP_CACHE_MAX_ROWS", 20000)),
+        backend=backend_from_env(),
+    )
+
+    # Índice de búsqueda (search_index.py): se construye en la primera búsqueda, lo
+    # actualizan las escrituras y se reconstruye en segundo plano cada SEARCH_INDEX_TTL
+    svc.search_index = SongSearch(
+        lambda: load_search_sources(svc),
+        max_age=int(os.environ.get("SEARCH_INDEX_TTL", 600)),
+    )
 
-# Cargar variables de entorno desde el archivo .env
-load_dotenv()
+    # Reportes (reports.py): acumulados por día que se construyen en el primer
+    # reporte, se actualizan con las escrituras y se rehacen cada REPORTS_TTL
+    svc.song_reports = SongReports(
+        lambda: load_report_sources(svc),
+        max_age=int(os.environ.get("REPORTS_TTL", 600)),
+    )
+
+    # Alertas de vencimiento (alerts.py): ALERTS=1 arranca el planificador en cada
+    # worker; ALERT_DEDUP_PATH/ALERT_DEDUP_REDIS_URL evitan avisos repetidos entre workers
+    svc.deadline_alerts = DeadlineScheduler(
+        lambda column, start, end: svc.repo.songs.between(column, start.isoformat(), end.isoformat(), ALERT_PROJECTION),
+        sinks_from_env(),
+        dedup=dedup_from_env(),
+        horizon_days=int(os.environ.get("ALERT_HORIZON_DAYS", 14)),
+        catch_up_days=int(os.environ.get("ALERT_CATCH_UP_DAYS", 1)),
+        refresh_interval=int(os.environ.get("ALERT_REFRESH_INTERVAL", 900)),
+        tick_interval=int(os.environ.get("ALERT_TICK_INTERVAL", 60)),
+    )
+
+    # Apertura de archivos (file_launcher.py): la carpeta permitida se resuelve una sola vez
+    svc.file_launcher = FileLauncher(
+        app.config["OPEN_BASE_DIR"],
+        workers=int(os.environ.get("FILE_LAUNCHER_WORKERS", 2)),
+        max_queue=int(os.environ.get("FILE_LAUNCHER_QUEUE", 32)),
+        timeout=float(os.environ.get("FILE_LAUNCHER_TIMEOUT", 10)),
+    )
+    svc.path_index = PathIndex(app.config["OPEN_BASE_DIR"], ttl=int(os.environ.get("FILE_STATUS_TTL", 60)))
+
+    # Escrituras (write_buffer.py, idempotency.py): las ediciones seguidas de una canción
+    # se juntan en un update, los new:<nombre> se crean una sola vez y los reintentos con
+    # el mismo Idempotency-Key devuelven la respuesta original
+    svc.song_writes = WriteCoalescer(
+        lambda song_id, patch, created: write_song_patch(svc, song_id, patch, created),
+        window=int(os.environ.get("WRITE_COALESCE_MS", 50)) / 1000,
+    )
+    svc.lookup_names = LookupNames(
+        lambda table: svc.lookup_cache.get(table),
+        lambda table: svc.repo.table(table),
+        on_created=lambda table, row: lookup_row_created(svc, table, row),
+        use_upsert=os.environ.get("LOOKUP_UPSERT", "1") == "1",
+        ttl=svc.lookup_cache.ttl,
+        max_entries=svc.lookup_cache.max_rows,
+    )
+    svc.idempotency = Idempotency(keys_from_env(), ttl=int(os.environ.get("IDEMPOTENCY_TTL", 86400)))
 
-app = Flask(__name__)
+    app.register_blueprint(bp)
+    if warm:
+        warm_up(svc)
+    return app
 
-# Configuración de Supabase
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
+
+def services(app=None):
+    """The services ``create_app`` built for ``app`` (default: the current app)."""
+    return (app or current_app).extensions["music_tracker"]
+
+
+def idempotent(view):
+    """``@idempotency.route`` with the ``Idempotency`` of the app serving the request."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return services().idempotency.route(view)(*args, **kwargs)
+    return wrapper
 
 # ------------------------------
 # Rutas para canciones
 # ------------------------------
 
-@app.route("/", methods=["GET"])
-def dashboard():
-    today = date.today()
-
-    # === 1. Canciones próximas a vencer ===
-    upcoming_due = supabase.table("songs").select(
-        "*, artists(name), albums(name), song_statuses(name)"
-    ).not_.in_("status", [9, 10]
-    ).gte("due_date", today.isoformat()
-    ).lte("due_date", (today + timedelta(days=7)).isoformat()
-    ).order("due_date", desc=False).execute()
-
-    # === 2. Próximos lanzamientos ===
-    today = date.today()
-    start_of_year = date(today.year, 1, 1)
-    end_of_year = date(today.year, 12, 31)
-
-    upcoming_releases = (
-        supabase.table("songs")
-        .select("*, artists(name), albums(name)")
-        .in_("status", [9, 10])
-        .gte("release_date", today.isoformat())  # fecha igual o posterior a hoy
-        .gte("release_date", start_of_year.isoformat())  # dentro del año actual
-        .lte("release_date", end_of_year.isoformat())
-        .order("release_date", desc=False)
-        .execute()
+def load_dashboard_sources(svc):
+    """Fetch songs (paged) and the lookup tables concurrently.
+
+    Returns ``(songs, lookups, unavailable)``; a source that failed or timed
+    out is listed in ``unavailable`` instead of aborting the whole page.
+    """
+    def song_page(start):
+        return svc.repo.songs.select(SONG_PROJECTION).order("id").range(
+            start, start + DEFAULT_PAGE_SIZE - 1
+        ).execute().data or []
+
+    songs, lookups, errors = svc.dashboard_fanout.fetch_paged(
+        song_page,
+        svc.repo.songs.count,
+        DEFAULT_PAGE_SIZE,
+        extra={table: (lambda t=table: svc.lookup_cache.get(t)) for table in ("song_statuses", "genres", "albums")},
+    )
+    unavailable = sorted("songs" if name == "rows" else name for name in errors)
+    return songs or [], lookups, unavailable
+
+
+def load_search_sources(svc):
+    """Songs (paged in parallel) and lookup rows for the search index."""
+    def song_page(start):
+        return svc.repo.songs.select(SEARCH_PROJECTION).order("id").range(
+            start, start + DEFAULT_PAGE_SIZE - 1
+        ).execute().data or []
+
+    songs, lookups, errors = svc.dashboard_fanout.fetch_paged(
+        song_page,
+        svc.repo.songs.count,
+        DEFAULT_PAGE_SIZE,
+        extra={table: (lambda t=table: svc.lookup_cache.get(t)) for table in ("artists", "albums", "genres")},
     )
+    if errors:
+        raise RuntimeError(f"search index sources unavailable: {errors}")
+    return songs, lookups
+
+
+def load_report_sources(svc):
+    """Songs (paged in parallel) and the lookups whose names the reports show."""
+    def song_page(start):
+        return svc.repo.songs.select(REPORT_PROJECTION).order("id").range(
+            start, start + DEFAULT_PAGE_SIZE - 1
+        ).execute().data or []
+
+    songs, lookups, errors = svc.dashboard_fanout.fetch_paged(
+        song_page,
+        svc.repo.songs.count,
+        DEFAULT_PAGE_SIZE,
+        extra={table: (lambda t=table: svc.lookup_cache.get(t)) for table in ("artists", "albums", "genres")},
+    )
+    if errors:
+        raise RuntimeError(f"report sources unavailable: {errors}")
+    return songs, lookups
+
+
+def build_dashboard_aggregate(svc):
+    songs, lookups, unavailable = load_dashboard_sources(svc)
+    aggregate = DashboardAggregate(
+        lookups.get("song_statuses"), lookups.get("genres"), lookups.get("albums"), today=date.today()
+    )
+    aggregate.add_many(songs)
+    return aggregate, unavailable
 
-    # === 3. Retrasados ===
-    overdue_songs = supabase.table("songs").select(
-        "*, artists(name), albums(name)"
-    ).not_.in_("status", [9, 10]
-    ).lt("due_date", today.isoformat()
-    ).order("due_date", desc=True).execute()
-
-    # === 4. Lanzadas (histórico) ===
-    released_songs = supabase.table("songs").select(
-        "*, artists(name), albums(name)"
-    ).eq("status", 10
-    ).lt("release_date", today.isoformat()
-    ).execute()
-
-    # === 5. Totales y progreso general ===
-    total_songs = supabase.table("songs").select("id", count="exact").execute().count
-    completed_songs = supabase.table("songs").select("id", count="exact").in_("status", [9, 10]).execute().count
-    progress_percentage = round((completed_songs / total_songs) * 100, 1) if total_songs > 0 else 0
-
-    # === 7. Distribución de status ===
-    statuses = supabase.table("song_statuses").select("id, name, color").execute().data
-    status_labels, status_counts, status_colors = [], [],  []
-    for status in statuses:
-        count = supabase.table("songs").select("id", count="exact").eq("status", status["id"]).execute().count
-        status_labels.append(status["name"])
-        status_colors.append(status["color"])
-        status_counts.append(count)
-
-    # === 8. Distribución de géneros ===
-    genres = supabase.table("genres").select("id, name, color").execute().data
-    genre_labels, genre_counts, genre_color = [], [], []
-    for genre in genres:
-        count = supabase.table("songs").select("id", count="exact").eq("genre", genre["id"]).execute().count
-        genre_labels.append(genre["name"])
-        genre_color.append(genre["color"])
-        genre_counts.append(count)
-
-    # === 9. Canciones recientes ===
-    recent_songs = supabase.table("songs").select("*").order("updated_at", desc=True).limit(5).execute().data
-
-    # === 10. Canciones favoritas (rating = 5) ===
-    favorite_songs = supabase.table("songs").select("id", count="exact").eq("rating", 5).execute().count
-    
-    # === 11. Actividad anual (terminadas por mes) ===
-    year_start = date(today.year, 1, 1)
-    completed_year = supabase.table("songs").select("release_date").in_("status", [9, 10]).gte("release_date", year_start.isoformat()).execute().data
-
-    monthly_activity = Counter()
-    for song in completed_year:
-        if song.get("release_date"):
-            try:
-                d = datetime.strptime(song["release_date"], "%Y-%m-%d")
-                month = d.strftime("%b")
-                monthly_activity[month] += 1
-            except:
-                continue
-
-    months = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
-    activity_counts = [monthly_activity.get(m, 0) for m in months]
-
-    # === 12. Canciones por álbum ===
-    albums = supabase.table("albums").select("id, name, color").execute().data
-    album_labels, album_counts, album_colors = [], [], []
-    for album in albums:
-        count = supabase.table("songs").select("id", count="exact").eq("album_id", album["id"]).execute().count
-        album_labels.append(album["name"])
-        album_colors.append(album["color"])
-        album_counts.append(count)
-
-    # === ⭐ Promedio general de rating ===
-    ratings_data = supabase.table("songs").select("rating").not_.is_("rating", None).execute().data
-    if ratings_data:
-        avg_rating = round(sum([s["rating"] for s in ratings_data if s.get("rating")]) / len(ratings_data), 1)
+
+def notify_songs_saved(svc, rows, event="song.updated", created=None):
+    """Patch the dashboard snapshot with rows returned by an insert/update.
+
+    With live updates on, the rows (shaped like ``/api/songs`` rows) and any
+    lookup rows created on the way are also pushed to the open pages.
+    """
+    if not rows:
+        return
+    # un índice por id de cada tabla de referencia, en lugar de recorrerlas por fila
+    lookups = {table: {r.get('id'): r for r in svc.lookup_cache.get(table) or []} for table in LOOKUP_TABLES}
+    for row in rows:
+        svc.dashboard_snapshot.song_saved(with_lookup_names(row, lookups))
+    listed = [with_list_embeds(r, lookups) for r in rows]
+    svc.search_index.songs_saved(listed)
+    svc.song_reports.songs_saved(rows)
+    for row in rows:
+        svc.deadline_alerts.song_saved(row)
+    if svc.live_events is not None:
+        if len(rows) > MAX_ROWS_PER_EVENT:
+            svc.live_events.publish(RELOAD_EVENT, {})
+        else:
+            svc.live_events.publish(event, {"songs": listed, "created": created or {}})
+
+
+def apply_remote_event(svc, event, data):
+    """Catch up with a write made by another worker (``LIVE_EVENTS_REDIS_URL``)."""
+    svc.dashboard_snapshot.invalidate()
+    tables = {key: table for table, key in CREATED_KEYS.items()}
+    for key, rows in (data.get("created") or {}).items():
+        for row in rows:
+            svc.search_index.lookup_added(tables.get(key), row)
+            svc.song_reports.lookup_added(tables.get(key), row)
+    if event in ("song.created", "song.updated"):
+        svc.search_index.songs_saved(data.get("songs") or [])
+        svc.song_reports.songs_saved(data.get("songs") or [])
+        for row in data.get("songs") or []:
+            svc.deadline_alerts.song_saved(row)
+    elif event == "song.deleted":
+        for song_id in data.get("ids") or []:
+            svc.search_index.song_deleted(song_id)
+            svc.song_reports.song_deleted(song_id)
+            svc.deadline_alerts.song_deleted(song_id)
     else:
-        avg_rating = 0
-
-    # === 🪫 Canciones abandonadas ===
-    abandoned_songs = supabase.table("songs").select("id", count="exact").eq("status", 8).execute().count  # usa el status correspondiente a 'Abandonada'
-    
-    return render_template(
-        "dashboard.html",
-        upcoming_due=upcoming_due.data,
-        upcoming_releases=upcoming_releases.data,
-        released_songs=released_songs.data,
-        overdue_songs=overdue_songs.data,
-        total_songs=total_songs,
-        completed_songs=completed_songs,
-        progress_percentage=progress_percentage,
-        recent_songs=recent_songs,
-        status_labels=status_labels,
-        status_counts=status_counts,
-        genre_labels=genre_labels,
-        genre_color=genre_color,
-        status_colors=status_colors,
-        album_colors=album_colors,
-        genre_counts=genre_counts,
-        favorite_songs=favorite_songs,
-        abandoned_songs=abandoned_songs,
-        avg_rating=avg_rating,
-        months=months,
-        activity_counts=activity_counts,
-        album_labels=album_labels,
-        album_counts=album_counts,
+        svc.search_index.invalidate()
+        svc.song_reports.invalidate()
+        svc.deadline_alerts.invalidate()
+
+
+def publish_live_event(svc, event, data):
+    if svc.live_events is not None:
+        svc.live_events.publish(event, data)
+
+
+def conditional_response(svc, body, etag, mimetype=None):
+    resp = make_response(body)
+    if mimetype:
+        resp.mimetype = mimetype
+    if etag:
+        resp.set_etag(etag)
+        resp.last_modified = svc.dashboard_snapshot.last_modified
+        # el navegador guarda la página pero revalida siempre (304 si no cambió)
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+@bp.route("/", methods=["GET"])
+def dashboard():
+    svc = services()
+    if current_app.config["DASHBOARD_ASYNC"] or request.args.get("async") == "1":
+        # Solo el esqueleto: KPIs del snapshot si existe, si no 4 counts en paralelo
+        kpis = svc.dashboard_snapshot.kpis() or cheap_kpis(svc.repo.songs, svc.dashboard_fanout)
+        return render_template("dashboard.html", async_sections=True, sections=DASHBOARD_SECTIONS, kpis=kpis, unavailable=[])
+
+    # Una sola lectura de canciones (paginada en paralelo junto con las tablas
+    # de referencia); todas las métricas se calculan en memoria (aggregates.py).
+    # El resultado se guarda por día y se parchea en cada escritura (dashboard_cache.py).
+    aggregate, unavailable = svc.dashboard_snapshot.get(lambda: build_dashboard_aggregate(svc))
+    html, etag = svc.dashboard_snapshot.render(
+        aggregate,
+        lambda context: render_template(
+            "dashboard.html", async_sections=False, unavailable=unavailable,
+            charts=inline_charts(context, unavailable), **context
+        ),
     )
+    return conditional_response(svc, html, etag)
+
 
+def render_section_macro(name, songs):
+    return get_template_attribute("dashboard/sections.html", name)(songs)
 
-@app.route("/songs", methods=["GET"])
+
+@bp.route("/api/dashboard/<section>", methods=["GET"])
+def dashboard_section(section):
+    """One dashboard section as JSON (HTML fragment for lists, series for charts)."""
+    svc = services()
+    if section not in DASHBOARD_SECTIONS:
+        return jsonify({'error': f'Unknown section: {section}'}), 404
+    aggregate, unavailable = svc.dashboard_snapshot.get(lambda: build_dashboard_aggregate(svc))
+    body, etag = svc.dashboard_snapshot.section(
+        aggregate, section,
+        lambda context: json.dumps(section_payload(section, context, unavailable, render_section_macro), default=str),
+    )
+    return conditional_response(svc, body, etag, mimetype="application/json")
+
+
+@bp.route("/songs", methods=["GET"])
 def list_songs():
-    songs = supabase.table("songs").select("*, artists(name, color), albums(name, color), song_statuses(name, color), genres(name, color)").execute()
-    artists = supabase.table('artists').select('*').execute()
-    albums = supabase.table('albums').select('*').execute()
-    song_statuses = supabase.table('song_statuses').select('*').execute()
-    genres = supabase.table('genres').select('*').execute()
-    # Imprimir los datos en la consola del servidor
-    #print("=== Canciones obtenidas de Supabase ===")
-    #print(songs.data)  # Esto mostrará una lista de diccionarios con la información
-    return render_template("songs/list.html", songs=songs.data, artists=artists.data, albums=albums.data, song_statuses=song_statuses.data, genres=genres.data)
-
-@app.route("/songs/add", methods=["GET", "POST"])
+    svc = services()
+    # Las filas las pide DataTables a /api/songs (procesamiento en servidor);
+    # aquí solo se envían las tablas de referencia para los editores.
+    artists = svc.lookup_cache.get('artists')
+    albums = svc.lookup_cache.get('albums')
+    song_statuses = svc.lookup_cache.get('song_statuses')
+    genres = svc.lookup_cache.get('genres')
+    return render_template("songs/list.html", artists=artists, albums=albums, song_statuses=song_statuses, genres=genres)
+
+
+@bp.route("/api/songs", methods=["GET"])
+def songs_api():
+    """DataTables server-side endpoint: one page of songs, filtered and sorted in the database."""
+    svc = services()
+    params = parse_datatables_request(request.args)
+    lookups = {table: svc.lookup_cache.get(table) for table in LOOKUP_TABLES} if params['search'] else {}
+    # el índice suma coincidencias por prefijo y con errores de tipeo (si ya está construido)
+    if params['search'] and svc.search_index.ensure(wait=False):
+        params['search_ids'] = svc.search_index.song_ids(params['search'], SEARCH_INDEX_IDS)
+
+    query = svc.repo.songs.select(SONG_LIST_PROJECTION, count='exact')
+    resp = page_query(query, params, lookups).execute()
+    records_filtered = resp.count or 0
+    if is_filtered(params):
+        records_total = svc.repo.songs.count()
+    else:
+        records_total = records_filtered
+
+    rows = resp.data or []
+    if current_app.config["FILE_STATUS"]:
+        # existencia/tamaño de cada archivo, desde la caché de stat
+        files = svc.path_index.lookup(row.get('path') for row in rows)
+        for row in rows:
+            row['file'] = files.get(row.get('path'))
+
+    return jsonify({
+        'draw': params['draw'],
+        'recordsTotal': records_total,
+        'recordsFiltered': records_filtered,
+        'data': rows,
+    })
+
+
+@bp.route("/api/search", methods=["GET"])
+def search_api():
+    """Typeahead over the search index: ``?q=<text>&type=songs|artists|albums|genres&limit=10``."""
+    svc = services()
+    kind = request.args.get('type', 'songs')
+    if kind not in SEARCH_KINDS:
+        return jsonify({'error': f'Unknown type: {kind}'}), 400
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    if not query:
+        return jsonify({'query': query, 'type': kind, 'results': []})
+    if not svc.search_index.ensure():
+        return jsonify({'error': 'Search index unavailable.'}), 503
+    return jsonify({'query': query, 'type': kind, 'results': svc.search_index.search(kind, query, limit)})
+
+
+@bp.route("/api/reports/<name>", methods=["GET"])
+def report_api(name):
+    """Report from the daily rollups: ``throughput``, ``cycle_time``, ``overdue_aging`` or ``breakdown``.
+
+    Query params: ``start``/``end`` (ISO dates, last 365 days by default),
+    ``granularity`` (day|week|month|year), ``by`` (artist|album|genre) and
+    ``format=csv`` to download the rows instead of JSON.
+    """
+    svc = services()
+    if name not in REPORTS:
+        return jsonify({'error': f'Unknown report: {name}'}), 404
+    try:
+        if not svc.song_reports.ensure():
+            return jsonify({'error': 'Reports unavailable.'}), 503
+        report = svc.song_reports.run(name, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if request.args.get('format') == 'csv':
+        filename = f'{name}-{date.today().isoformat()}.csv'
+        return Response(report_csv(report), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    return jsonify({'report': name, **report})
+
+
+def lookup_row_created(svc, table, row):
+    """Push a lookup row this process had not seen yet into the caches."""
+    svc.lookup_cache.add_row(table, row)
+    svc.dashboard_snapshot.lookup_added(table, row)
+    svc.search_index.lookup_added(table, row)
+    svc.song_reports.lookup_added(table, row)
+
+
+def write_song_patch(svc, song_id, patch, created):
+    """One upstream update for the edits ``song_writes`` merged together."""
+    resp = svc.repo.songs.update(patch, [song_id])
+    if not getattr(resp, 'error', None):
+        notify_songs_saved(svc, getattr(resp, 'data', None), "song.updated", created)
+    return resp
+
+
+@bp.route("/songs/add", methods=["GET", "POST"])
+@idempotent
 def add_song():
+    svc = services()
     if request.method == "POST":
         # accept JSON or form
         data = request.get_json(silent=True)
         if not data:
             data = request.form.to_dict()
 
-        insert_data = {}
-
-        # simple text fields
-        for field in ['name', 'project_name', 'path', 'url']:
-            if field in data:
-                insert_data[field] = data.get(field) or None
-
-        # rating
-        if 'rating' in data:
-            try:
-                insert_data['rating'] = int(data.get('rating')) if data.get('rating') not in (None, '') else None
-            except Exception:
-                insert_data['rating'] = None
-
-        # dates
-        for d in ['due_date', 'release_date']:
-            if d in data:
-                insert_data[d] = data.get(d) or None
-
-        # in_album
-        if 'in_album' in data:
-            val = data.get('in_album')
-            if isinstance(val, str):
-                val_l = val.lower()
-                insert_data['in_album'] = 1 if val_l in ('1', 'true', 't', 'yes', 'y', 'on') else 0
-            else:
-                try:
-                    insert_data['in_album'] = 1 if int(val) else 0
-                except Exception:
-                    insert_data['in_album'] = 1 if bool(val) else 0
-
-        created = {}
-
-        # artist_id / new: token
-        if 'artist_id' in data:
-            a_val = data.get('artist_id')
-            if not a_val:
-                insert_data['artist_id'] = None
-            else:
-                a_str = str(a_val)
-                if a_str.startswith('new:'):
-                    artist_name = a_str.split(':', 1)[1]
-                    ins = supabase.table('artists').insert({'name': artist_name}).execute()
-                    ins_data = getattr(ins, 'data', None)
-                    if ins_data and len(ins_data) > 0:
-                        insert_data['artist_id'] = ins_data[0].get('id')
-                        created['artist'] = {'id': ins_data[0].get('id'), 'name': ins_data[0].get('name') or artist_name}
-                    else:
-                        insert_data['artist_id'] = None
-                else:
-                    try:
-                        insert_data['artist_id'] = int(a_val)
-                    except Exception:
-                        insert_data['artist_id'] = None
-
-        # album_id / new:
-        if 'album_id' in data:
-            al_val = data.get('album_id')
-            if not al_val:
-                insert_data['album_id'] = None
-            else:
-                al_str = str(al_val)
-                if al_str.startswith('new:'):
-                    album_name = al_str.split(':', 1)[1]
-                    ins = supabase.table('albums').insert({'name': album_name}).execute()
-                    ins_data = getattr(ins, 'data', None)
-                    if ins_data and len(ins_data) > 0:
-                        insert_data['album_id'] = ins_data[0].get('id')
-                        created['album'] = {'id': ins_data[0].get('id'), 'name': ins_data[0].get('name') or album_name}
-                    else:
-                        insert_data['album_id'] = None
-                else:
-                    try:
-                        insert_data['album_id'] = int(al_val)
-                    except Exception:
-                        insert_data['album_id'] = None
-
-        # genre / new:
-        if 'genre' in data:
-            g_val = data.get('genre')
-            if not g_val:
-                insert_data['genre'] = None
-            else:
-                g_str = str(g_val)
-                if g_str.startswith('new:'):
-                    genre_name = g_str.split(':', 1)[1]
-                    ins = supabase.table('genres').insert({'name': genre_name}).execute()
-                    ins_data = getattr(ins, 'data', None)
-                    if ins_data and len(ins_data) > 0:
-                        insert_data['genre'] = ins_data[0].get('id')
-                        created['genre'] = {'id': ins_data[0].get('id'), 'name': ins_data[0].get('name') or genre_name}
-                    else:
-                        insert_data['genre'] = None
-                else:
-                    try:
-                        insert_data['genre'] = int(g_val)
-                    except Exception:
-                        insert_data['genre'] = None
-        elif 'genre' in data:
-            # legacy string
-            insert_data['genre'] = data.get('genre') or None
-
-        # status handling
-        if 'status' in data:
-            try:
-                insert_data['status'] = int(data.get('status')) if data.get('status') not in (None, '') else None
-            except Exception:
-                insert_data['status'] = None
-        elif 'status' in data:
-            # allow sending status as text or id
-            try:
-                insert_data['status'] = int(data.get('status'))
-            except Exception:
-                insert_data['status'] = data.get('status') or None
+        # same coercion rules as the bulk importer (see song_fields.py)
+        insert_data, pending = coerce_song_fields(data)
+        created = resolve_pending(insert_data, pending, svc.lookup_names.resolve)
 
         # perform insert
-        resp = supabase.table('songs').insert(insert_data).execute()
+        resp = svc.repo.songs.insert(insert_data)
         if getattr(resp, 'error', None):
             # basic error handling: for form submit redirect back with an error might be better, but keep it simple
             return jsonify({'error': str(resp.error)}), 400
 
         result_data = getattr(resp, 'data', None)
+        notify_songs_saved(svc, result_data, "song.created", created)
         # if caller expects JSON, return created resource
         if request.is_json:
             out = {'success': True, 'data': result_data}
@@ -305,21 +527,28 @@ def add_song():
             return jsonify(out), 201
 
         # otherwise redirect back to list
-        return redirect(url_for('list_songs'))
+        return redirect(url_for('.list_songs'))
 
-    artists = supabase.table("artists").select("*").execute().data
-    albums = supabase.table("albums").select("*").execute().data
-    song_statuses = supabase.table('song_statuses').select('*').execute().data
-    genres = supabase.table('genres').select('*').execute().data
+    artists = svc.lookup_cache.get("artists")
+    albums = svc.lookup_cache.get("albums")
+    song_statuses = svc.lookup_cache.get('song_statuses')
+    genres = svc.lookup_cache.get('genres')
     return render_template("songs/add.html", artists=artists, albums=albums, song_statuses=song_statuses, genres=genres)
 
-@app.route("/songs/delete/<int:song_id>")
+@bp.route("/songs/delete/<int:song_id>")
 def delete_song(song_id):
-    supabase.table("songs").delete().eq("id", song_id).execute()
-    return redirect(url_for("list_songs"))
-
-
-@app.route('/songs/edit/<int:song_id>', methods=['POST'])
+    svc = services()
+    svc.repo.songs.delete([song_id])
+    svc.dashboard_snapshot.song_deleted(song_id)
+    svc.search_index.song_deleted(song_id)
+    svc.song_reports.song_deleted(song_id)
+    svc.deadline_alerts.song_deleted(song_id)
+    publish_live_event(svc, "song.deleted", {"ids": [song_id]})
+    return redirect(url_for(".list_songs"))
+
+
+@bp.route('/songs/edit/<int:song_id>', methods=['POST'])
+@idempotent
 def edit_song(song_id):
     """Update a song. Accepts JSON (preferred) or form data.
 
@@ -329,155 +558,22 @@ def edit_song(song_id):
       - artist (artist name) -> will be resolved to artist_id if exists
       - album (album name) -> will be resolved to album_id if exists
     """
+    svc = services()
     # Accept JSON or form-encoded data
     data = request.get_json(silent=True)
     if not data:
         data = request.form.to_dict()
 
-    update_data = {}
-    created = {}
-
-    # simple string fields (leave status to status when provided)
-    for field in ['name', 'project_name', 'genre', 'path', 'url']:
-        if field in data:
-            update_data[field] = data.get(field) or None
-
-    # numeric/nullable
-    if 'rating' in data:
-        try:
-            update_data['rating'] = int(data.get('rating')) if data.get('rating') not in (None, '') else None
-        except ValueError:
-            update_data['rating'] = None
-
-    # dates (store as-is or None)
-    for dfield in ['due_date', 'release_date']:
-        if dfield in data:
-            update_data[dfield] = data.get(dfield) or None
-
-    # in_album boolean/int
-    if 'in_album' in data:
-        val = data.get('in_album')
-        if isinstance(val, str):
-            val_l = val.lower()
-            update_data['in_album'] = 1 if val_l in ('1', 'true', 't', 'yes', 'y', 'on') else 0
-        else:
-            try:
-                update_data['in_album'] = 1 if int(val) else 0
-            except Exception:
-                update_data['in_album'] = 1 if bool(val) else 0
-
-    # Artist ID handling: prefer explicit artist_id, allow special 'new:<name>' token to create
-    if 'artist_id' in data:
-        a_val = data.get('artist_id')
-        if not a_val:
-            update_data['artist_id'] = None
-        else:
-            a_str = str(a_val)
-            if a_str.startswith('new:'):
-                artist_name = a_str.split(':', 1)[1]
-                ins = supabase.table('artists').insert({'name': artist_name}).execute()
-                ins_data = getattr(ins, 'data', None)
-                if ins_data and len(ins_data) > 0:
-                    update_data['artist_id'] = ins_data[0].get('id')
-                    # return created artist info to client
-                    created['artist'] = {'id': ins_data[0].get('id'), 'name': ins_data[0].get('name') or artist_name}
-                else:
-                    update_data['artist_id'] = None
-            else:
-                try:
-                    update_data['artist_id'] = int(a_val)
-                except Exception:
-                    update_data['artist_id'] = None
-    # fallback: resolve artist name -> artist_id
-    elif 'artist' in data:
-        artist_name = data.get('artist')
-        if not artist_name:
-            update_data['artist_id'] = None
-        else:
-            artist_resp = supabase.table('artists').select('id').eq('name', artist_name).limit(1).execute()
-            artist_rows = getattr(artist_resp, 'data', None)
-            if artist_rows:
-                update_data['artist_id'] = artist_rows[0].get('id')
-            else:
-                # create the artist if not found
-                ins = supabase.table('artists').insert({'name': artist_name}).execute()
-                ins_data = getattr(ins, 'data', None)
-                if ins_data and len(ins_data) > 0:
-                    update_data['artist_id'] = ins_data[0].get('id')
-                else:
-                    update_data['artist_id'] = None
-
-    # Album ID handling: prefer explicit album_id, allow 'new:<name>' token to create
-    if 'album_id' in data:
-        al_val = data.get('album_id')
-        if not al_val:
-            update_data['album_id'] = None
-        else:
-            al_str = str(al_val)
-            if al_str.startswith('new:'):
-                album_name = al_str.split(':', 1)[1]
-                ins = supabase.table('albums').insert({'name': album_name}).execute()
-                ins_data = getattr(ins, 'data', None)
-                if ins_data and len(ins_data) > 0:
-                    update_data['album_id'] = ins_data[0].get('id')
-                    created['album'] = {'id': ins_data[0].get('id'), 'name': ins_data[0].get('name') or album_name}
-                else:
-                    update_data['album_id'] = None
-            else:
-                try:
-                    update_data['album_id'] = int(al_val)
-                except Exception:
-                    update_data['album_id'] = None
-    # fallback: resolve album name -> album_id
-    elif 'album' in data:
-        album_name = data.get('album')
-        if not album_name:
-            update_data['album_id'] = None
-
-    # Genre ID handling: prefer explicit genre, allow 'new:<name>' token to create
-    if 'genre' in data:
-        g_val = data.get('genre')
-        if not g_val:
-            update_data['genre'] = None
-        else:
-            g_str = str(g_val)
-            if g_str.startswith('new:'):
-                genre_name = g_str.split(':', 1)[1]
-                ins = supabase.table('genres').insert({'name': genre_name}).execute()
-                ins_data = getattr(ins, 'data', None)
-                if ins_data and len(ins_data) > 0:
-                    update_data['genre'] = ins_data[0].get('id')
-                    created['genre'] = {'id': ins_data[0].get('id'), 'name': ins_data[0].get('name') or genre_name}
-                else:
-                    update_data['genre'] = None
-            else:
-                try:
-                    update_data['genre'] = int(g_val)
-                except Exception:
-                    update_data['genre'] = None
-    # fallback: allow legacy 'genre' string (kept for compatibility)
-    elif 'genre' in data:
-        if data.get('genre'):
-            update_data['genre'] = data.get('genre')
-
-    # Status ID handling: prefer explicit status (reference to song_statuses table)
-    if 'status' in data:
-        s_val = data.get('status')
-        if not s_val:
-            update_data['status'] = None
-        else:
-            try:
-                update_data['status'] = int(s_val)
-            except Exception:
-                update_data['status'] = None
-    # fallback: allow old 'status' string field (kept for backward compatibility)
-    elif 'status' in data:
-        update_data['status'] = data.get('status') or None
+    update_data, pending, by_name = coerce_song_update(data)
+    created = resolve_pending(update_data, pending, svc.lookup_names.resolve)
+    # legacy 'artist' name field: reuse an existing artist or create it
+    resolve_pending(update_data, by_name, svc.lookup_names.resolve)
 
     if not update_data:
         return jsonify({'error': 'No valid fields to update provided.'}), 400
 
-    resp = supabase.table('songs').update(update_data).eq('id', song_id).execute()
+    # las ediciones seguidas de la misma canción salen en un solo update
+    resp = svc.song_writes.submit(song_id, update_data, created)
     # supabase-py may attach an 'error' attribute or return status
     if getattr(resp, 'error', None):
         return jsonify({'error': str(resp.error)}), 400
@@ -488,57 +584,308 @@ def edit_song(song_id):
     return jsonify(result), 200
 
 
-# Endpoint to open a local file on the server (useful when running locally).
-# Security: only allow opening paths that are under a configured base directory.
-@app.route('/open-file', methods=['POST'])
+@bp.route('/songs/batch', methods=['POST'])
+@idempotent
+def batch_edit_songs():
+    """Update many songs at once; see batch_edit.py for the request format.
+
+    Songs sharing the same normalized patch are written with one upstream
+    update. Always answers 200 with per-id results unless the body is malformed.
+    """
+    svc = services()
+    try:
+        items = parse_batch(request.get_json(silent=True))
+    except BatchError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    groups, results, created = plan_batch(items, svc.lookup_names.resolve, svc.lookup_names.resolve)
+    run_batch(svc.repo.songs, groups, results)
+    notify_songs_saved(svc, [r['data'] for r in results.values() if r['success']], "song.updated", created)
+
+    out = {
+        'success': all(r['success'] for r in results.values()),
+        'updated': sum(1 for r in results.values() if r['success']),
+        'results': {str(k): v for k, v in results.items()},
+    }
+    if created:
+        out['created'] = created
+    return jsonify(out), 200
+
+
+# ------------------------------
+# Actualizaciones en vivo (Server-Sent Events)
+# ------------------------------
+
+@bp.route('/events', methods=['GET'])
+def live_events_stream():
+    """Stream song changes to the songs list and dashboard (``LIVE_UPDATES=1``).
+
+    Browsers reconnect on their own and send ``Last-Event-ID``; events they
+    missed are replayed, or a ``songs.reload`` tells them to refetch.
+    """
+    svc = services()
+    if svc.live_events is None:
+        return jsonify({'error': 'Live updates are disabled.'}), 404
+    if not svc.live_events.connect():
+        resp = jsonify({'error': 'Too many live connections, try again later.'})
+        resp.status_code = 503
+        resp.headers['Retry-After'] = '30'
+        return resp
+    stream = EventStream(
+        svc.live_events,
+        last_event_id=request.headers.get('Last-Event-ID'),
+        heartbeat=int(os.environ.get('LIVE_HEARTBEAT', 15)),
+        max_duration=int(os.environ.get('LIVE_MAX_DURATION', 300)),
+    )
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # nginx no debe acumular el stream
+        'X-Accel-Buffering': 'no',
+    })
+
+
+# ------------------------------
+# Importación / exportación masiva
+# ------------------------------
+
+@bp.route('/songs/import', methods=['POST'])
+def import_songs():
+    """Bulk import songs from a CSV or NDJSON upload (``file`` field or raw body).
+
+    Query/form params: ``format`` (csv|ndjson, guessed from the filename
+    otherwise) and ``chunk_size``. Returns a per-row error report.
+    """
+    svc = services()
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    fmt = detect_format(
+        filename=upload.filename if upload else None,
+        content_type=request.content_type,
+        explicit=request.values.get('format'),
+    )
+    if fmt not in BULK_FORMATS:
+        return jsonify({'success': False, 'error': f'Unsupported format: {fmt}'}), 400
+    chunk_size = request.values.get('chunk_size', type=int) or DEFAULT_CHUNK_SIZE
+
+    importer = SongImporter(svc.repo, svc.lookup_cache, chunk_size=chunk_size)
+    report = importer.run(read_rows(stream, fmt))
+    if report['inserted']:
+        svc.dashboard_snapshot.invalidate()
+        svc.search_index.invalidate()
+        svc.song_reports.invalidate()
+        svc.deadline_alerts.invalidate()
+        publish_live_event(svc, RELOAD_EVENT, {})
+    return jsonify({'success': report['failed'] == 0, **report}), 200
+
+
+@bp.route('/songs/export', methods=['GET'])
+def export_songs():
+    svc = services()
+    fmt = detect_format(explicit=request.args.get('format', 'csv'))
+    if fmt not in BULK_FORMATS:
+        return jsonify({'success': False, 'error': f'Unsupported format: {fmt}'}), 400
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f'songs-{date.today().isoformat()}.{fmt}'
+    return Response(
+        stream_with_context(export_lines(iter_songs(svc.repo.songs), fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'},
+    )
+
+
+@bp.cli.command('import-songs')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(BULK_FORMATS), default=None)
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True)
+def import_songs_command(path, fmt, chunk_size):
+    """Import songs from a CSV or NDJSON file."""
+    svc = services()
+    fmt = fmt or detect_format(filename=path)
+    with open(path, encoding='utf-8-sig', newline='') as fh:
+        report = SongImporter(svc.repo, svc.lookup_cache, chunk_size=chunk_size).run(read_rows(fh, fmt))
+    for err in report['errors']:
+        click.echo(f"line {err['line']}: {err['error']}", err=True)
+    click.echo(f"inserted={report['inserted']} failed={report['failed']}")
+
+
+@bp.cli.command('export-songs')
+@click.option('--format', 'fmt', type=click.Choice(BULK_FORMATS), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-')
+def export_songs_command(fmt, output):
+    """Export every song (with artist/album/genre names) to stdout or a file."""
+    svc = services()
+    for chunk in export_lines(iter_songs(svc.repo.songs), fmt):
+        output.write(chunk)
+
+
+@bp.cli.command('send-alerts')
+def send_alerts_command():
+    """Send today's due/overdue/release alerts once (for cron instead of ALERTS=1)."""
+    svc = services()
+    for alert in svc.deadline_alerts.run_once():
+        click.echo(json.dumps(alert))
+
+
+@bp.cli.command('replica-sync')
+@click.option('--full', is_flag=True, help='Reload every table instead of syncing by updated_at.')
+def replica_sync_command(full):
+    """Sync the local SQLite replica (requires REPLICA_PATH)."""
+    svc = services()
+    if not svc.replica:
+        raise click.ClickException('REPLICA_PATH is not set.')
+    click.echo(f"pulled={svc.replica.sync(svc.upstream, full=full)}")
+
+
+# Endpoint to open local files on the server (useful when running locally).
+# Security: only paths under OPEN_BASE_DIR (default: the app root) are opened.
+# Body: {"path": ...}, {"paths": [...]} or {"ids": [...]} (the songs' paths).
+# The files are opened by the launcher workers, not in the request thread.
+OPEN_FILE_ERRORS = {
+    'invalid': (400, 'Invalid path.'),
+    'forbidden': (403, 'Path not allowed. Set OPEN_BASE_DIR if you need to open files outside the project.'),
+    'missing': (404, 'File not found.'),
+    'busy': (503, 'Too many files are being opened, try again in a moment.'),
+}
+
+
+@bp.route('/open-file', methods=['POST'])
 def open_file():
+    svc = services()
     data = request.get_json(silent=True)
-    if not data or 'path' not in data:
+    if not isinstance(data, dict) or not any(k in data for k in ('path', 'paths', 'ids')):
         return jsonify({'success': False, 'error': 'No path provided.'}), 400
-    path = data.get('path')
-    # normalize
-    try:
-        abs_path = os.path.abspath(path)
-    except Exception as e:
-        return jsonify({'success': False, 'error': f'Invalid path: {e}'}), 400
-
-    # Allowed base dir from env variable; if not set, default to app root
-    base = os.environ.get('OPEN_BASE_DIR')
-    if not base:
-        base = os.path.abspath(os.getcwd())
-    else:
-        base = os.path.abspath(base)
-
-    if not abs_path.startswith(base):
-        return jsonify({'success': False, 'error': 'Path not allowed. Set OPEN_BASE_DIR if you need to open files outside the project.'}), 403
 
-    # Try to open the file on the host machine where the server runs
-    try:
-        if sys.platform.startswith('win'):
-            os.startfile(abs_path)
-        elif sys.platform.startswith('darwin'):
-            subprocess.Popen(['open', abs_path])
-        else:
-            # linux
-            subprocess.Popen(['xdg-open', abs_path])
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    if 'path' in data:
+        result = svc.file_launcher.submit([data['path']])[0]
+        if result['status'] in OPEN_FILE_ERRORS:
+            code, error = OPEN_FILE_ERRORS[result['status']]
+            return jsonify({'success': False, 'error': error}), code
+        return jsonify({'success': True}), 200
+
+    if 'ids' in data:
+        ids = data['ids'] if isinstance(data['ids'], list) else []
+        ids = [i for i in ids if isinstance(i, int) or (isinstance(i, str) and i.isdigit())]
+        if not ids:
+            return jsonify({'success': False, 'error': 'No ids provided.'}), 400
+        resp = svc.repo.songs.select('id, path').in_('id', [int(i) for i in ids]).execute()
+        paths = [row['path'] for row in resp.data or [] if row.get('path')]
+    else:
+        paths = data['paths'] if isinstance(data['paths'], list) else []
+    if not paths:
+        return jsonify({'success': False, 'error': 'No path provided.'}), 400
+    if len(paths) > MAX_BATCH_IDS:
+        return jsonify({'success': False, 'error': f'At most {MAX_BATCH_IDS} files per request.'}), 400
 
-    return jsonify({'success': True}), 200
+    results = svc.file_launcher.submit(paths)
+    opened = sum(r['status'] in ('queued', 'duplicate') for r in results)
+    return jsonify({'success': opened > 0, 'opened': opened, 'results': results}), 202
 
 # ------------------------------
 # Rutas para artistas y álbumes
 # ------------------------------
 
-@app.route("/artists")
+@bp.route("/artists")
 def list_artists():
-    artists = supabase.table("artists").select("*").execute()
-    return render_template("artists/list.html", artists=artists.data)
+    svc = services()
+    artists = svc.lookup_cache.get("artists")
+    return render_template("artists/list.html", artists=artists)
 
-@app.route("/albums")
+@bp.route("/albums")
 def list_albums():
-    albums = supabase.table("albums").select("*").execute()
-    return render_template("albums/list.html", albums=albums.data)
+    svc = services()
+    albums = svc.lookup_cache.get("albums")
+    return render_template("albums/list.html", albums=albums)
+
+
+@bp.route("/cache/stats")
+def cache_stats():
+    svc = services()
+    return jsonify({**svc.lookup_cache.stats(), 'search_index': svc.search_index.stats(), 'reports': svc.song_reports.stats(),
+                    'alerts': svc.deadline_alerts.stats(), 'file_launcher': svc.file_launcher.stats(),
+                    'path_index': svc.path_index.stats(), 'song_writes': svc.song_writes.stats(),
+                    'lookup_names': svc.lookup_names.stats(), 'idempotency': svc.idempotency.stats()})
+
+# ------------------------------
+# Arranque (gunicorn.conf.py)
+# ------------------------------
+
+def start_background_tasks(svc):
+    """Start the replica sync, alert and live-event threads once per process.
+
+    Called by ``gunicorn.conf.py`` when a worker is ready and, otherwise, by
+    the first request; a preloading master or a CLI command never starts them.
+    """
+    if svc.background_pid == os.getpid():
+        return
+    svc.background_pid = os.getpid()
+    sync_interval = int(os.environ.get("REPLICA_SYNC_INTERVAL", 60))
+    if svc.replica and sync_interval > 0:
+        svc.replica.start_background_sync(svc.upstream, sync_interval)
+    if os.environ.get("ALERTS", "0") == "1":
+        svc.deadline_alerts.start()
+    if svc.live_events is not None:
+        svc.live_events.start()
+
+
+@bp.before_app_request
+def ensure_background_tasks():
+    start_background_tasks(services())
+
+
+def after_fork(svc):
+    """Reset what a worker inherits from a preloaded master (``preload_app``).
+
+    The warmed caches are kept (shared copy-on-write); sockets, SQLite
+    connections and thread pools are per process.
+    """
+    if svc.http_client is not None:
+        drop_connections(svc.http_client)
+    if svc.replica:
+        svc.replica.after_fork()
+    svc.dashboard_fanout.after_fork()
+    if svc.live_events is not None:
+        svc.live_events.after_fork()
+
+
+def warm_up(svc, targets=None):
+    """Prime caches before the process takes traffic; returns ``{target: ms or error}``.
+
+    ``targets`` defaults to ``WARM_UP`` (``lookups,dashboard,songs``):
+    ``dashboard`` and ``songs`` also compile and render their templates.
+    A failing target is logged and skipped, so a worker still starts when
+    Supabase is unreachable.
+    """
+    app = svc.app
+    if targets is None:
+        targets = [t.strip() for t in os.environ.get("WARM_UP", "lookups,dashboard,songs").split(",") if t.strip()]
+    steps = {
+        "lookups": lambda: [svc.lookup_cache.get(table) for table in LOOKUP_TABLES],
+        "dashboard": lambda: _render_for_warm_up(app, "/", dashboard),
+        "songs": lambda: _render_for_warm_up(app, "/songs", list_songs),
+        "search": lambda: svc.search_index.ensure(),
+        "reports": lambda: svc.song_reports.ensure(),
+    }
+    timings = {}
+    for target in targets:
+        if target not in steps:
+            app.logger.warning("unknown warm-up target: %s", target)
+            continue
+        started = time.perf_counter()
+        try:
+            steps[target]()
+            timings[target] = round((time.perf_counter() - started) * 1000, 1)
+        except Exception as e:
+            app.logger.warning("warm-up %s failed: %s", target, e)
+            timings[target] = f"error: {e}"
+    app.logger.info("warm-up %s", json.dumps(timings))
+    return timings
+
+
+def _render_for_warm_up(app, path, view):
+    # la vista se llama directamente: sin before_request ni log de petición
+    with app.test_request_context(path):
+        view()
+
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,130 @@
+"""Multi-row song updates for ``POST /songs/batch``.
+
+A batch is either one patch shared by many ids::
+
+    {"ids": [1, 2, 3], "patch": {"status": 5}}
+
+or a list of per-id patches::
+
+    {"updates": [{"id": 1, "patch": {"in_album": 1}}, {"id": 2, "patch": {"in_album": 0}}]}
+
+Every patch is validated once with the ``edit_song()`` rules, songs that end
+up with the same normalized patch are grouped, and each group is written with
+a single ``update(...).in_("id", ids)`` call.
+"""
+import json
+
+from song_fields import coerce_song_update, merge_created, resolve_pending
+
+MAX_BATCH_IDS = 1000
+# ids por petición: mantiene la URL de PostgREST (id=in.(...)) acotada
+IN_CHUNK_SIZE = 200
+
+NO_FIELDS_ERROR = 'No valid fields to update provided.'
+
+
+class BatchError(ValueError):
+    """The request body itself is malformed (maps to HTTP 400)."""
+
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_batch(body):
+    """Return ``[(raw_id, patch_dict), ...]`` from a batch request body."""
+    if not isinstance(body, dict):
+        raise BatchError('Expected a JSON object.')
+    items = []
+    if 'updates' in body:
+        updates = body.get('updates')
+        if not isinstance(updates, list):
+            raise BatchError('"updates" must be a list.')
+        for entry in updates:
+            if not isinstance(entry, dict):
+                raise BatchError('Each update must be an object with "id" and "patch".')
+            patch = entry.get('patch')
+            if patch is None:
+                patch = {k: v for k, v in entry.items() if k != 'id'}
+            items.append((entry.get('id'), patch))
+    else:
+        ids = body.get('ids')
+        patch = body.get('patch')
+        if not isinstance(ids, list) or not isinstance(patch, dict):
+            raise BatchError('Send {"ids": [...], "patch": {...}} or {"updates": [...]}.')
+        items = [(i, patch) for i in ids]
+    if len(items) > MAX_BATCH_IDS:
+        raise BatchError(f'At most {MAX_BATCH_IDS} songs per batch.')
+    return items
+
+
+def plan_batch(items, create, find_or_create):
+    """Validate ``items`` and group them by identical normalized patch.
+
+    ``create``/``find_or_create`` resolve ``new:<name>`` tokens and legacy
+    names; each distinct name is resolved only once per batch.  Returns
+    ``(groups, results, created)`` where ``groups`` maps a canonical patch key
+    to ``(patch, [ids])``, ``results`` already holds per-id failures and
+    ``created`` lists every lookup row resolved from a ``new:`` token.
+    """
+    results = {}
+    groups = {}
+    created = {}
+    memo = {}
+
+    def once(fn):
+        def resolve(table, name):
+            key = (fn.__name__, table, name)
+            if key not in memo:
+                memo[key] = fn(table, name)
+            return memo[key]
+        return resolve
+
+    create_once, find_once = once(create), once(find_or_create)
+
+    for raw_id, patch in items:
+        song_id = _as_id(raw_id)
+        if song_id is None:
+            results[str(raw_id)] = {'success': False, 'error': 'Invalid id.'}
+            continue
+        if not isinstance(patch, dict):
+            results[song_id] = {'success': False, 'error': 'Patch must be an object.'}
+            continue
+        update_data, pending, by_name = coerce_song_update(patch)
+        merge_created(created, resolve_pending(update_data, pending, create_once))
+        resolve_pending(update_data, by_name, find_once)
+        if not update_data:
+            results[song_id] = {'success': False, 'error': NO_FIELDS_ERROR}
+            continue
+        key = json.dumps(update_data, sort_keys=True, default=str)
+        groups.setdefault(key, (update_data, []))[1].append(song_id)
+    return groups, results, created
+
+
+def run_batch(songs, groups, results):
+    """Execute the grouped updates through the songs ``TableRepository``.
+
+    Fills ``results`` per id and returns it.
+    """
+    for patch, ids in groups.values():
+        ids = list(dict.fromkeys(ids))
+        for start in range(0, len(ids), IN_CHUNK_SIZE):
+            chunk = ids[start:start + IN_CHUNK_SIZE]
+            try:
+                resp = songs.update(patch, chunk)
+                if getattr(resp, 'error', None):
+                    raise RuntimeError(str(resp.error))
+            except Exception as e:
+                for song_id in chunk:
+                    results[song_id] = {'success': False, 'error': str(e)}
+                continue
+            rows = {row.get('id'): row for row in (getattr(resp, 'data', None) or [])}
+            for song_id in chunk:
+                if song_id in rows:
+                    results[song_id] = {'success': True, 'data': rows[song_id]}
+                else:
+                    results[song_id] = {'success': False, 'error': 'Song not found.'}
+    return results
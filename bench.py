@@ -0,0 +1,313 @@
+"""Route benchmarks against synthetic catalogs on the in-memory backend.
+
+Drives the Flask app through its test client with ``DATA_BACKEND=memory``
+(see memory_store.py), so the numbers measure this app's code and not
+network time.  For every catalog and route it records p50/p95 latency,
+upstream queries per request, peak Python memory and response size, and
+writes them as JSON so runs can be compared across changes:
+
+    python bench.py                                  # 1k, 10k and 100k songs
+    python bench.py --sizes 1000 --output bench.json
+    python bench.py --baseline bench.json            # exit 1 on regression
+
+A route regresses when its p95 grows more than ``--tolerance`` (and at
+least ``--min-delta-ms``) or when it issues more upstream queries than in
+the baseline, e.g. a per-album count loop sneaking back into the dashboard.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+
+# El benchmark nunca toca Supabase ni la réplica (los vacíos ganan a .env)
+os.environ["DATA_BACKEND"] = "memory"
+os.environ["MEMORY_SEED"] = ""
+os.environ["REPLICA_PATH"] = ""
+os.environ["LOOKUP_CACHE_REDIS_URL"] = ""
+os.environ["REQUEST_LOG"] = "0"
+os.environ["SLOW_REQUEST_MS"] = ""
+
+import app as webapp  # noqa: E402
+from memory_store import MemoryStore  # noqa: E402
+
+CATALOGS = {
+    1000: {"albums": 10, "genres": 8, "statuses": 10, "artists": 20},
+    10000: {"albums": 100, "genres": 20, "statuses": 12, "artists": 200},
+    100000: {"albums": 1000, "genres": 40, "statuses": 15, "artists": 2000},
+}
+DEFAULT_ITERATIONS = 20
+# iteraciones mínimas por ruta en los catálogos grandes
+MIN_ITERATIONS = 3
+
+
+class CountingStore(MemoryStore):
+    """``MemoryStore`` that counts the queries the app sends upstream."""
+
+    def __init__(self, tables=None):
+        super().__init__(tables)
+        self.queries = 0
+
+    def _execute_select(self, query):
+        with self._lock:
+            self.queries += 1
+        return super()._execute_select(query)
+
+    def _execute_write(self, query):
+        with self._lock:
+            self.queries += 1
+        return super()._execute_write(query)
+
+
+# ------------------------------
+# Catálogos sintéticos
+# ------------------------------
+
+def generate_catalog(songs, albums=10, genres=8, statuses=10, artists=20, seed=0):
+    """Deterministic ``{table: rows}`` with ``songs`` songs spread over the lookups."""
+    rnd = random.Random(seed)
+    today = date.today()
+
+    def lookup(prefix, count):
+        return [{"id": i, "name": f"{prefix} {i}", "color": f"#{rnd.randrange(0x1000000):06x}"} for i in range(1, count + 1)]
+
+    def some_date():
+        if rnd.random() < 0.3:
+            return None
+        return (today + timedelta(days=rnd.randint(-365, 365))).isoformat()
+
+    rows = []
+    for i in range(1, songs + 1):
+        updated = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rnd.randrange(600000))
+        rows.append({
+            "id": i,
+            "name": f"Song {i}",
+            "project_name": f"project_{i}",
+            "artist_id": rnd.randint(1, artists) if rnd.random() < 0.9 else None,
+            "album_id": rnd.randint(1, albums) if rnd.random() < 0.7 else None,
+            "genre": rnd.randint(1, genres) if rnd.random() < 0.9 else None,
+            "status": rnd.randint(1, statuses) if rnd.random() < 0.95 else None,
+            "rating": rnd.choice([None, 1, 2, 3, 4, 5]),
+            "in_album": rnd.random() < 0.5,
+            "path": f"/music/project_{i}.als" if rnd.random() < 0.5 else None,
+            "url": None,
+            "due_date": some_date(),
+            "release_date": some_date(),
+            "created_at": (updated - timedelta(days=i % 400)).isoformat(),
+            "updated_at": updated.isoformat(),
+        })
+    return {
+        "songs": rows,
+        "artists": lookup("Artist", artists),
+        "albums": lookup("Album", albums),
+        "genres": lookup("Genre", genres),
+        "song_statuses": lookup("Status", statuses),
+    }
+
+
+def install(catalog):
+    """A fresh app over a store holding ``catalog``; returns ``(app, store)``."""
+    store = CountingStore(catalog)
+    app = webapp.create_app(upstream=store)
+    svc = webapp.services(app)
+    # el índice de búsqueda y los reportes se construyen aquí para que no corran en segundo plano durante las mediciones
+    svc.search_index.rebuild()
+    svc.song_reports.rebuild()
+    return app, store
+
+
+# ------------------------------
+# Escenarios
+# ------------------------------
+
+_LIST_COLUMNS = ("name", "project_name", "genre", "artist_id", "album_id", "status",
+                 "rating", "path", "url", "due_date", "release_date", "in_album")
+
+
+def _api_args(**extra):
+    args = {"draw": 1, "start": 0, "length": 25, "order[0][column]": 9, "order[0][dir]": "asc"}
+    for i, column in enumerate(_LIST_COLUMNS):
+        args[f"columns[{i}][data]"] = column
+    args.update(extra)
+    return args
+
+
+def scenarios(app, size, rnd):
+    """``{route: (setup, request)}``; ``setup`` runs untimed before each request."""
+    etag = {}
+    snapshot = webapp.services(app).dashboard_snapshot
+
+    def remember_etag():
+        resp = app.test_client().get("/")
+        etag["value"] = resp.headers.get("ETag")
+
+    return {
+        "dashboard_cold": (snapshot.invalidate, lambda c: c.get("/")),
+        "dashboard_warm": (None, lambda c: c.get("/")),
+        "dashboard_304": (remember_etag, lambda c: c.get("/", headers={"If-None-Match": etag["value"] or ""})),
+        "dashboard_shell_cold": (snapshot.invalidate, lambda c: c.get("/?async=1")),
+        "list_songs": (None, lambda c: c.get("/songs")),
+        "songs_api": (None, lambda c: c.get("/api/songs", query_string=_api_args(start=rnd.randrange(max(size - 25, 1))))),
+        "songs_api_search": (None, lambda c: c.get("/api/songs", query_string=_api_args(**{"search[value]": "Album 1"}))),
+        "search_typeahead": (None, lambda c: c.get("/api/search", query_string={"type": "songs", "q": f"sogn {rnd.randint(1, size)}"})),
+        "search_typeahead_artists": (None, lambda c: c.get("/api/search", query_string={"type": "artists", "q": "artsit"})),
+        "report_throughput": (None, lambda c: c.get("/api/reports/throughput", query_string={
+            "start": (date.today() - timedelta(days=3 * 365)).isoformat(), "granularity": "week",
+        })),
+        "report_breakdown_csv": (None, lambda c: c.get("/api/reports/breakdown", query_string={"by": "artist", "format": "csv"})),
+        "add_song": (None, lambda c: c.post("/songs/add", json={
+            "name": "Bench song", "artist_id": 1, "album_id": 1, "genre": 1, "status": 2, "rating": 3,
+        })),
+        "edit_song": (None, lambda c: c.post(f"/songs/edit/{rnd.randint(1, size)}", json={"rating": rnd.randint(1, 5)})),
+    }
+
+
+def _has_results(resp):
+    if not resp.get_json().get("results"):
+        raise RuntimeError("expected search results, got none")
+
+
+# comprobaciones sobre la respuesta: un escenario que no devuelve filas mide otra cosa
+CHECKS = {
+    "search_typeahead": _has_results,
+    "search_typeahead_artists": _has_results,
+}
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(client, store, setup, request, iterations, check=None):
+    timings, queries, sizes = [], [], []
+    for _ in range(iterations + 1):
+        if setup:
+            setup()
+        before = store.queries
+        start = time.perf_counter()
+        resp = request(client)
+        elapsed = time.perf_counter() - start
+        if resp.status_code >= 400:
+            raise RuntimeError(f"HTTP {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+        if check:
+            check(resp)
+        timings.append(elapsed * 1000)
+        queries.append(store.queries - before)
+        sizes.append(len(resp.get_data()))
+    # la primera vuelta calienta caches de Jinja/lookups y no cuenta
+    timings, queries, sizes = timings[1:], queries[1:], sizes[1:]
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    request(client)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50_ms": round(_percentile(timings, 50), 3),
+        "p95_ms": round(_percentile(timings, 95), 3),
+        "queries": round(sum(queries) / len(queries), 2),
+        "peak_kib": round(peak / 1024, 1),
+        "response_bytes": round(sum(sizes) / len(sizes)),
+    }
+
+
+def run(sizes, iterations, routes=None, seed=0):
+    results = {}
+    for size in sizes:
+        spec = CATALOGS.get(size) or {"albums": max(size // 100, 5), "genres": 20, "statuses": 10, "artists": max(size // 50, 10)}
+        app, store = install(generate_catalog(size, seed=seed, **spec))
+        client = app.test_client()
+        # menos vueltas en catálogos grandes para que la corrida termine en minutos
+        count = max(MIN_ITERATIONS, min(iterations, iterations * 10000 // size))
+        rnd = random.Random(seed)
+        results[str(size)] = {"catalog": {"songs": size, **spec}, "routes": {}}
+        for name, (setup, request) in scenarios(app, size, rnd).items():
+            if routes and name not in routes:
+                continue
+            stats = measure(client, store, setup, request, count, CHECKS.get(name))
+            results[str(size)]["routes"][name] = stats
+            print(f"{size:>7} {name:<18} p50={stats['p50_ms']:>9.2f}ms p95={stats['p95_ms']:>9.2f}ms "
+                  f"queries={stats['queries']:>6} peak={stats['peak_kib']:>9.1f}KiB bytes={stats['response_bytes']}",
+                  flush=True)
+    return results
+
+
+def compare(baseline, results, tolerance, min_delta_ms):
+    """Return a list of human-readable regressions of ``results`` against ``baseline``."""
+    problems = []
+    for size, current in results.items():
+        base_routes = baseline.get("results", {}).get(size, {}).get("routes", {})
+        for name, stats in current["routes"].items():
+            base = base_routes.get(name)
+            if not base:
+                continue
+            if stats["queries"] > base["queries"]:
+                problems.append(f"{size}/{name}: queries {base['queries']} -> {stats['queries']}")
+            delta = stats["p95_ms"] - base["p95_ms"]
+            if delta > min_delta_ms and stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                problems.append(f"{size}/{name}: p95 {base['p95_ms']}ms -> {stats['p95_ms']}ms")
+    return problems
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(str(s) for s in CATALOGS),
+                        help="comma-separated catalog sizes (songs)")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--routes", default="", help="comma-separated subset of routes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="previous JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p95 growth")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore p95 changes smaller than this")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    routes = {r.strip() for r in args.routes.split(",") if r.strip()}
+    results = run(sizes, args.iterations, routes, args.seed)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dashboard_concurrency": int(os.environ.get("DASHBOARD_CONCURRENCY", 6)),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            problems = compare(json.load(fh), results, args.tolerance, args.min_delta_ms)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""Bulk import and streaming export of songs (CSV or NDJSON).
+
+Import reads the file lazily, applies the same field coercion as
+``add_song()`` (see ``song_fields.py``) and writes in chunks: all the
+``new:<name>`` artists, albums and genres of a chunk are deduplicated and
+created with one insert per table, then the songs go in with one insert per
+chunk.  Export pages through ``songs`` with keyset pagination and yields the
+output line by line, so the whole catalog is never held in memory.
+
+The export carries both the ids and the names of the artist, album and
+genre; import prefers the names, so a file exported from one database
+attaches its songs to the rows with the same names in another one.
+"""
+import csv
+import io
+import json
+
+from song_fields import LOOKUP_FIELDS, NEW_TOKEN, coerce_song_fields
+
+FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 500
+EXPORT_PAGE_SIZE = 1000
+
+# columnas con el nombre de la referencia (las que produce la exportación)
+NAME_COLUMNS = {'artist': 'artist_id', 'album': 'album_id', 'genre_name': 'genre'}
+
+EXPORT_PROJECTION = "*, artists(name), albums(name), genres(name), song_statuses(name)"
+EXPORT_COLUMNS = (
+    'id', 'name', 'project_name', 'artist_id', 'artist', 'album_id', 'album',
+    'genre', 'genre_name', 'status', 'status_name', 'rating', 'in_album',
+    'path', 'url', 'due_date', 'release_date', 'updated_at',
+)
+
+
+class RowError(Exception):
+    """A row that cannot be parsed; carries a readable message."""
+
+
+def detect_format(filename=None, content_type=None, explicit=None):
+    if explicit:
+        fmt = explicit.lower()
+        return 'ndjson' if fmt in ('jsonl', 'json', 'ndjson') else fmt
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')) or 'json' in (content_type or ''):
+        return 'ndjson'
+    return 'csv'
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row_or_exception)`` from a binary or text stream."""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # reader.line_num apunta a la última línea leída del archivo
+            yield reader.line_num, {k: v for k, v in row.items() if k}
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f'invalid JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError('each line must be a JSON object')
+            continue
+        yield line_number, row
+
+
+def _with_name_tokens(row):
+    """Turn ``artist``/``album``/``genre_name`` columns into ``new:`` tokens.
+
+    A non-empty name wins over the id column: ids are only meaningful in the
+    database the file was exported from, names resolve (or get created) in
+    any database.  The id column is used when the name is missing.
+    """
+    row = dict(row)
+    for name_col, field in NAME_COLUMNS.items():
+        name = row.pop(name_col, None)
+        if name:
+            row[field] = NEW_TOKEN + str(name)
+    return row
+
+
+class SongImporter:
+    """Chunked importer writing through a ``Repository`` (see repository.py)."""
+
+    def __init__(self, repo, lookup_cache=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.repo = repo
+        self.lookup_cache = lookup_cache
+        self.chunk_size = max(int(chunk_size), 1)
+        self.report = {'inserted': 0, 'failed': 0, 'errors': [], 'created': {t: [] for t in LOOKUP_FIELDS.values()}}
+
+    # ------------------------------
+    # Referencias (artists/albums/genres)
+    # ------------------------------
+
+    def _known_names(self, table):
+        rows = self.lookup_cache.get(table) if self.lookup_cache else []
+        return {r.get('name'): r for r in rows}
+
+    def _resolve_names(self, table, names):
+        """Return ``{name: id}``, creating missing names with a single insert."""
+        known = self._known_names(table)
+        found = {n: known[n]['id'] for n in names if n in known}
+        missing = [n for n in names if n not in found]
+        if missing:
+            # el cache puede estar desfasado: confirmar contra la base
+            for row in self.repo.table(table).find_by_names(missing):
+                found[row['name']] = row['id']
+                if self.lookup_cache:
+                    self.lookup_cache.add_row(table, row)
+            missing = [n for n in missing if n not in found]
+        if missing:
+            resp = self.repo.table(table).insert([{'name': n} for n in missing])
+            for row in resp.data or []:
+                found[row['name']] = row['id']
+                self.report['created'][table].append({'id': row['id'], 'name': row['name']})
+                if self.lookup_cache:
+                    self.lookup_cache.add_row(table, row)
+        return found
+
+    # ------------------------------
+    # Canciones
+    # ------------------------------
+
+    def _insert_chunk(self, chunk):
+        """Insert ``[(line, payload), ...]``; isolate failures row by row."""
+        if not chunk:
+            return
+        try:
+            resp = self.repo.songs.insert([p for _, p in chunk], default_to_null=False)
+            if getattr(resp, 'error', None):
+                raise RuntimeError(str(resp.error))
+            # solo cuentan las filas que devolvió el insert
+            self.report['inserted'] += len(getattr(resp, 'data', None) or [])
+            return
+        except Exception:
+            if len(chunk) == 1:
+                raise
+        for line, payload in chunk:
+            try:
+                self._insert_chunk([(line, payload)])
+            except Exception as e:
+                self._error(line, str(e))
+
+    def _error(self, line, message):
+        self.report['failed'] += 1
+        self.report['errors'].append({'line': line, 'error': message})
+
+    def _flush(self, rows):
+        pending_names = {table: set() for table in LOOKUP_FIELDS.values()}
+        parsed = []
+        for line, row in rows:
+            payload, pending = coerce_song_fields(_with_name_tokens(row))
+            for field, name in pending.items():
+                pending_names[LOOKUP_FIELDS[field]].add(name)
+            parsed.append((line, payload, pending))
+
+        ids = {}
+        failed_tables = {}
+        for table, names in pending_names.items():
+            if names:
+                try:
+                    ids[table] = self._resolve_names(table, sorted(names))
+                except Exception as e:
+                    failed_tables[table] = str(e)
+
+        chunk = []
+        for line, payload, pending in parsed:
+            failed = [t for t in (LOOKUP_FIELDS[f] for f in pending) if t in failed_tables]
+            if failed:
+                self._error(line, f'could not create {failed[0]}: {failed_tables[failed[0]]}')
+                continue
+            for field, name in pending.items():
+                payload[field] = ids[LOOKUP_FIELDS[field]].get(name)
+            chunk.append((line, payload))
+        try:
+            self._insert_chunk(chunk)
+        except Exception as e:
+            self._error(chunk[0][0], str(e))
+
+    def run(self, rows):
+        """Import ``(line, row)`` pairs as produced by ``read_rows``."""
+        batch = []
+        for line, row in rows:
+            if isinstance(row, Exception):
+                self._error(line, str(row))
+                continue
+            batch.append((line, row))
+            if len(batch) >= self.chunk_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+        return self.report
+
+
+def iter_songs(songs, page_size=EXPORT_PAGE_SIZE):
+    """Yield every song with its joins, paging by ``id`` (keyset pagination).
+
+    ``songs`` is the songs ``TableRepository``.
+    """
+    last_id = None
+    while True:
+        query = songs.select(EXPORT_PROJECTION).order('id').limit(page_size)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        page = query.execute().data or []
+        yield from page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]['id']
+
+
+def flatten_song(song):
+    row = {k: song.get(k) for k in EXPORT_COLUMNS}
+    row['artist'] = (song.get('artists') or {}).get('name')
+    row['album'] = (song.get('albums') or {}).get('name')
+    row['genre_name'] = (song.get('genres') or {}).get('name')
+    row['status_name'] = (song.get('song_statuses') or {}).get('name')
+    return row
+
+
+def export_lines(songs, fmt):
+    """Yield the export file chunk by chunk (header first for CSV)."""
+    if fmt == 'ndjson':
+        for song in songs:
+            yield json.dumps(flatten_song(song), ensure_ascii=False) + '\n'
+        return
+
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for song in songs:
+        writer.writerow(flatten_song(song))
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+    if buf.getvalue():
+        yield buf.getvalue()
@@ -0,0 +1,313 @@
+"""Compact column store of the songs table for analytics.
+
+A list of PostgREST dicts costs well over a kilobyte per song.
+``SongColumns`` keeps one typed ``array`` per column instead: status,
+genre, album and artist as small integer codes (see ``Codebook``), dates as
+ordinal days, ``updated_at`` as microseconds and the rating as a signed
+byte, about 40 bytes per song plus its name.  Rows are updated in place
+(``upsert``/``remove``), so the snapshot can follow writes without a reload.
+
+Filters return byte masks (one ``0``/``1`` per row) built with ``map`` over
+C-level predicates such as ``set.__contains__`` or ``range.__contains__``,
+so a filter or a group-by over a large catalog never runs Python bytecode
+per row.
+"""
+import heapq
+import operator
+import sys
+from array import array
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import compress, repeat
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# columna -> tipo del array de códigos
+CODED_COLUMNS = {"status": "H", "genre": "H", "album_id": "I", "artist_id": "I"}
+DATE_COLUMNS = ("due_date", "release_date")
+NULL_RATING = -1
+# fechas NULL se guardan como 0; los filtros por fecha nunca las incluyen
+NULL_DAY = 0
+_MAX_DAY = date.max.toordinal()
+
+
+class Codebook(dict):
+    """Small integer codes for the values of a low-cardinality column (0 = NULL).
+
+    ``codebook[value]`` assigns the next code to unseen values, so a whole
+    column is encoded with ``map(codebook.__getitem__, values)``.
+    """
+
+    def __init__(self):
+        super().__init__({None: 0})
+        self.values = [None]
+
+    def __missing__(self, value):
+        code = self[value] = len(self.values)
+        self.values.append(value)
+        return code
+
+    def codes_for(self, values):
+        return {self[v] for v in values if v in self}
+
+
+class _DayCodes(dict):
+    """ISO date string -> ordinal day, memoized (a catalog has few distinct dates)."""
+
+    def __missing__(self, value):
+        parsed = parse_date(value)
+        day = self[value] = parsed.toordinal() if parsed else NULL_DAY
+        return day
+
+
+def parse_date(value):
+    """Return a ``date`` for an ISO date/timestamp string, or None."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _moment(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _micros(value):
+    moment = _moment(value)
+    if moment is None:
+        return 0
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return round(moment.timestamp() * 1_000_000)
+
+
+@lru_cache(maxsize=4096)
+def _iso_day(day):
+    return date.fromordinal(day).isoformat() if day else None
+
+
+class _Ratings(dict):
+    """Rating value -> stored byte (``NULL_RATING`` for NULL or out of range)."""
+
+    def __missing__(self, value):
+        try:
+            rating = int(value)
+        except (TypeError, ValueError):
+            rating = NULL_RATING
+        if not 0 <= rating <= 127:
+            rating = NULL_RATING
+        self[value] = rating
+        return rating
+
+
+_RATINGS = _Ratings()
+
+
+class SongColumns:
+    """The songs table as parallel typed arrays; ``row_of`` maps a song id to its row."""
+
+    def __init__(self, songs=()):
+        self.ids = array("q")
+        self.names = []
+        self.codebooks = {column: Codebook() for column in CODED_COLUMNS}
+        self._day_codes = _DayCodes()
+        self.coded = {column: array(typecode) for column, typecode in CODED_COLUMNS.items()}
+        self.days = {column: array("i") for column in DATE_COLUMNS}
+        self.updated = array("q")
+        self.rating = array("b")
+        self.row_of = {}
+        # timestamp sin zona en la tabla: se devuelve igual, sin "+00:00"
+        self.naive_updated = False
+        # sube con cada cambio; permite cachear resultados derivados
+        self.version = 0
+        self.load(songs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _columns(self):
+        return [self.ids, self.names, self.updated, self.rating, *self.coded.values(), *self.days.values()]
+
+    # ------------------------------
+    # Escritura
+    # ------------------------------
+
+    def _write(self, row, song):
+        if row is None:
+            self._append([song])
+            return
+        self.names[row] = song.get("name")
+        self.updated[row] = _micros(song.get("updated_at"))
+        self._check_naive(song.get("updated_at"))
+        self.rating[row] = _RATINGS[song.get("rating")]
+        for column, codes in self.coded.items():
+            codes[row] = self.codebooks[column][song.get(column)]
+        for column, days in self.days.items():
+            days[row] = self._day_codes[song.get(column)]
+
+    def _check_naive(self, value):
+        moment = _moment(value)
+        if moment is not None:
+            self.naive_updated = moment.tzinfo is None
+
+    def _append(self, songs):
+        # columna a columna: cada extend recorre las filas con map() en C
+        start = len(self.ids)
+        self.ids.extend(map(operator.itemgetter("id"), songs))
+        self.row_of.update(zip(self.ids[start:], range(start, len(self.ids))))
+        self.names.extend(map(dict.get, songs, repeat("name")))
+        self.updated.extend(map(_micros, map(dict.get, songs, repeat("updated_at"))))
+        self._check_naive(next(filter(None, map(dict.get, songs, repeat("updated_at"))), None))
+        self.rating.extend(map(_RATINGS.__getitem__, map(dict.get, songs, repeat("rating"))))
+        for column, codes in self.coded.items():
+            codes.extend(map(self.codebooks[column].__getitem__, map(dict.get, songs, repeat(column))))
+        for column, days in self.days.items():
+            days.extend(map(self._day_codes.__getitem__, map(dict.get, songs, repeat(column))))
+
+    def load(self, songs):
+        """Bulk insert/replace; new songs are appended column by column."""
+        fresh = {}
+        for song in songs:
+            if song["id"] in self.row_of:
+                self._write(self.row_of[song["id"]], song)
+            else:
+                # un id repetido en la misma carga se queda con la última versión
+                fresh[song["id"]] = song
+        self._append(list(fresh.values()))
+        self.version += 1
+        return self
+
+    def upsert(self, song):
+        """Insert or replace one song (a full row, as returned by an insert/update)."""
+        self._write(self.row_of.get(song["id"]), song)
+        self.version += 1
+
+    def remove(self, song_id):
+        """Drop a song; the last row moves into its slot. Returns False if unknown."""
+        row = self.row_of.pop(song_id, None)
+        if row is None:
+            return False
+        last = len(self.ids) - 1
+        for column in self._columns():
+            if row != last:
+                column[row] = column[last]
+            column.pop()
+        if row != last:
+            self.row_of[self.ids[row]] = row
+        self.version += 1
+        return True
+
+    # ------------------------------
+    # Filtros (máscaras de bytes)
+    # ------------------------------
+
+    def everything(self):
+        return b"\x01" * len(self.ids)
+
+    def is_in(self, column, values):
+        """Rows whose ``column`` is one of ``values`` (NULL never matches)."""
+        if column == "rating":
+            wanted = {int(v) for v in values if v is not None}
+            return bytes(map(wanted.__contains__, self.rating))
+        codes = self.codebooks[column].codes_for(v for v in values if v is not None)
+        return bytes(map(codes.__contains__, self.coded[column]))
+
+    def not_null(self, column):
+        if column == "rating":
+            return bytes(map(range(0, 128).__contains__, self.rating))
+        if column in self.days:
+            return bytes(map(bool, self.days[column]))
+        return bytes(map(bool, self.coded[column]))
+
+    def between(self, column, start=None, end=None):
+        """Rows with a ``column`` date in ``[start, end]``; either bound may be None."""
+        low = start.toordinal() if start else NULL_DAY + 1
+        high = end.toordinal() if end else _MAX_DAY
+        return bytes(map(range(max(low, NULL_DAY + 1), high + 1).__contains__, self.days[column]))
+
+    @staticmethod
+    def both(*masks):
+        result = masks[0]
+        for mask in masks[1:]:
+            result = bytes(map(operator.and_, result, mask))
+        return result
+
+    @staticmethod
+    def negate(mask):
+        return mask.translate(bytes([1, 0]) + bytes(254))
+
+    # ------------------------------
+    # Consultas
+    # ------------------------------
+
+    def count(self, mask=None):
+        return len(self.ids) if mask is None else mask.count(1)
+
+    def count_by(self, column, mask=None):
+        """``Counter`` of the decoded values of a coded column (NULL counts as None)."""
+        codes = self.coded[column]
+        counts = Counter(codes if mask is None else compress(codes, mask))
+        values = self.codebooks[column].values
+        return Counter({values[code]: n for code, n in counts.items()})
+
+    def rating_stats(self, mask=None):
+        """``(sum, count)`` of the non-NULL ratings."""
+        ratings = self.rating if mask is None else array("b", compress(self.rating, mask))
+        nulls = ratings.count(NULL_RATING)
+        return sum(ratings) + nulls, len(ratings) - nulls
+
+    def month_counts(self, column, mask):
+        """``Counter`` month (0-11) -> rows, over the rows selected by ``mask``."""
+        return Counter(date.fromordinal(day).month - 1 for day in compress(self.days[column], mask))
+
+    def rows(self, mask, order_by=None, desc=False):
+        """Row numbers selected by ``mask``, optionally sorted by a date column then id."""
+        rows = list(compress(range(len(self.ids)), mask))
+        if order_by is not None:
+            days, ids = self.days[order_by], self.ids
+            sign = -1 if desc else 1
+            rows.sort(key=lambda r: (sign * days[r], ids[r]))
+        else:
+            rows.sort(key=self.ids.__getitem__)
+        return rows
+
+    def latest(self, limit):
+        """Row numbers of the ``limit`` most recently updated songs."""
+        with_dates = compress(range(len(self.ids)), map(bool, self.updated))
+        return heapq.nlargest(limit, with_dates, key=self.updated.__getitem__)
+
+    def row(self, row, updated_at=True):
+        """Plain dict of one row, with the stored columns only."""
+        out = {"id": self.ids[row], "name": self.names[row]}
+        for column, codes in self.coded.items():
+            out[column] = self.codebooks[column].values[codes[row]]
+        for column, days in self.days.items():
+            out[column] = _iso_day(days[row])
+        out["rating"] = None if self.rating[row] == NULL_RATING else self.rating[row]
+        if updated_at:
+            micros = self.updated[row]
+            moment = EPOCH + timedelta(microseconds=micros)
+            if self.naive_updated:
+                moment = moment.replace(tzinfo=None)
+            out["updated_at"] = moment.isoformat() if micros else None
+        return out
+
+    def nbytes(self):
+        """Approximate memory held by the snapshot."""
+        arrays = [self.ids, self.updated, self.rating, *self.coded.values(), *self.days.values()]
+        total = sum(a.buffer_info()[1] * a.itemsize for a in arrays)
+        total += sys.getsizeof(self.names) + sum(sys.getsizeof(n) for n in self.names if n is not None)
+        total += sys.getsizeof(self.row_of)
+        return total
@@ -0,0 +1,84 @@
+"""Compressed responses and ETags for rendered pages.
+
+The songs list and the dashboard are tens of kilobytes of HTML, and
+``/api/songs`` pages are JSON; all of it compresses 5-10x.  ``init_app``
+registers an ``after_request`` hook that:
+
+* adds an ETag (hash of the body) to ``GET`` HTML/JSON responses that have
+  none and answers ``304 Not Modified`` when the browser already has it,
+* compresses HTML, JSON, CSS, JS, CSV and plain text above ``min_size``
+  bytes with brotli (if ``pip install brotli`` is available) or gzip,
+  following the client's ``Accept-Encoding``.
+
+Streamed responses (``/events``, exports) and files sent with ``send_file``
+are left alone; ``static_assets.py`` compresses static files once instead.
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli  # dependencia opcional: pip install brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/css", "text/plain", "text/csv", "text/javascript",
+    "application/javascript", "application/json", "image/svg+xml",
+}
+# páginas a las que se les calcula un ETag si la vista no puso uno
+ETAG_TYPES = {"text/html", "application/json"}
+DEFAULT_MIN_SIZE = 1024
+
+
+def accepted_encoding(accept_encodings):
+    """``br``, ``gzip`` or None, by the client's preference (brotli only if installed)."""
+    return accept_encodings.best_match(["br", "gzip"] if brotli else ["gzip"])
+
+
+def compress(data, encoding, level=6):
+    """Compress ``data``; ``level`` is the gzip level (1-9), brotli uses a comparable quality."""
+    if encoding == "br":
+        # calidad 4 tarda como gzip 6 y comprime más; 11 solo para archivos que se comprimen una vez
+        return brotli.compress(data, quality=11 if level >= 9 else 4)
+    # mtime=0: el mismo cuerpo da siempre los mismos bytes
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _add_etag(response):
+    if response.get_etag()[0] is None:
+        response.add_etag()
+        if not response.cache_control:
+            # el navegador guarda la página pero revalida siempre (304 si no cambió)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def init_app(app, min_size=DEFAULT_MIN_SIZE, level=6, etags=True):
+    """Register the ETag + compression hook on ``app``."""
+
+    @app.after_request
+    def _compress_response(response):
+        if response.direct_passthrough or response.is_streamed or response.status_code != 200:
+            return response
+        if etags and request.method in ("GET", "HEAD") and response.mimetype in ETAG_TYPES:
+            response = _add_etag(response)
+            if response.status_code != 200:
+                return response
+        if response.mimetype not in COMPRESSIBLE_TYPES or "Content-Encoding" in response.headers:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = accepted_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+        response.set_data(compress(data, encoding, level))
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # otra representación del mismo contenido: el ETag pasa a ser débil
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,152 @@
+"""Per-day snapshot of the dashboard, patched in place on song writes.
+
+The snapshot holds a ``DashboardAggregate`` for ``today`` (the overdue and
+upcoming windows depend on it) plus the HTML rendered from it.  Song writes
+call ``song_saved``/``song_deleted`` which patch that single song in the
+aggregate instead of recomputing everything; the rendered HTML and its
+ETag are regenerated lazily on the next read.  A full rebuild happens when
+the day changes, after ``max_age`` seconds (writes made by other workers only
+show up then) or after ``invalidate()``.  Concurrent requests for a stale
+snapshot share one rebuild, which matters when the async dashboard fetches
+all of its sections at once.
+"""
+import hashlib
+import threading
+import time
+from datetime import date, datetime, timezone
+
+
+class DashboardSnapshot:
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self.aggregate = None
+        self.day = None
+        self.built_at = 0.0
+        self.last_modified = None
+        # sube con cada escritura; un rebuild que se cruza con una escritura no se guarda
+        self.generation = 0
+        self._html = None
+        self._etag = None
+        self._context = None
+        # sección -> (json, etag) para /api/dashboard/<section>
+        self._sections = {}
+
+    def _is_fresh(self, today):
+        return (
+            self.aggregate is not None
+            and self.day == today
+            and time.monotonic() - self.built_at < self.max_age
+        )
+
+    def _touch(self):
+        self.generation += 1
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self._html = None
+        self._etag = None
+        self._context = None
+        self._sections = {}
+
+    def kpis(self, today=None):
+        """KPIs of the stored aggregate if it is fresh, else None (never builds).
+
+        Computed under the lock: ``kpis()`` caches its result in the
+        aggregate, which section requests may be reading at the same time.
+        """
+        with self._lock:
+            return self.aggregate.kpis() if self._is_fresh(today or date.today()) else None
+
+    def get(self, build, today=None):
+        """Return ``(aggregate, unavailable)``, calling ``build()`` when stale.
+
+        ``build`` returns ``(aggregate, unavailable)``; partial results (some
+        source unavailable) are returned but never stored.
+        """
+        today = today or date.today()
+        with self._lock:
+            if self._is_fresh(today):
+                return self.aggregate, []
+
+        with self._build_lock:
+            # otra petición pudo reconstruirlo mientras esperábamos
+            with self._lock:
+                if self._is_fresh(today):
+                    return self.aggregate, []
+                generation = self.generation
+
+            aggregate, unavailable = build()
+            if unavailable:
+                return aggregate, unavailable
+
+            with self._lock:
+                if self.generation == generation:
+                    self.aggregate = aggregate
+                    self.day = today
+                    self.built_at = time.monotonic()
+                    self._touch()
+            return aggregate, []
+
+    def context(self, aggregate):
+        """``aggregate.context()``, computed once per change for the stored aggregate."""
+        with self._lock:
+            if aggregate is not self.aggregate:
+                return aggregate.context()
+            if self._context is None:
+                self._context = self.aggregate.context()
+            return self._context
+
+    def render(self, aggregate, render_context):
+        """Return ``(html, etag)``, rendering once per change.
+
+        If ``aggregate`` is not the stored one (partial data, or invalidated
+        meanwhile) the page is rendered uncached and the ETag is None.
+        """
+        with self._lock:
+            if aggregate is not self.aggregate:
+                return render_context(aggregate.context()), None
+            if self._html is None:
+                self._html = render_context(self.context(aggregate))
+                self._etag = hashlib.sha1(self._html.encode("utf-8")).hexdigest()
+            return self._html, self._etag
+
+    def section(self, aggregate, name, build_body):
+        """Return ``(body, etag)`` for one dashboard section, like ``render``.
+
+        ``build_body(context)`` returns the serialized section.
+        """
+        with self._lock:
+            if aggregate is not self.aggregate:
+                return build_body(aggregate.context()), None
+            if name not in self._sections:
+                body = build_body(self.context(aggregate))
+                self._sections[name] = (body, hashlib.sha1(body.encode("utf-8")).hexdigest())
+            return self._sections[name]
+
+    # ------------------------------
+    # Actualizaciones incrementales
+    # ------------------------------
+
+    def song_saved(self, song):
+        """A song was inserted or updated; ``song`` must carry the dashboard embeds."""
+        with self._lock:
+            if self.aggregate is not None:
+                self.aggregate.add(song)
+            self._touch()
+
+    def song_deleted(self, song_id):
+        with self._lock:
+            if self.aggregate is not None:
+                self.aggregate.remove(song_id)
+            self._touch()
+
+    def lookup_added(self, table, row):
+        with self._lock:
+            if self.aggregate is not None:
+                self.aggregate.add_lookup(table, row)
+            self._touch()
+
+    def invalidate(self):
+        with self._lock:
+            self.aggregate = None
+            self._touch()
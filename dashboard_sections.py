@@ -0,0 +1,91 @@
+"""Dashboard sections served on their own (``DASHBOARD_ASYNC=1``).
+
+In async mode ``/`` renders only the page shell with the headline numbers,
+and ``dashboard.html`` fetches every list and chart in parallel from
+``/api/dashboard/<section>``, so the first paint no longer waits for the
+whole songs read.  Each section response has its own ETag.  The regular
+(synchronous) page builds the same payloads inline, so both modes share
+``templates/dashboard/sections.html`` and the chart code.
+"""
+from aggregates import ABANDONED_STATUS, COMPLETED_STATUSES, FAVORITE_RATING
+
+# sección -> variable del contexto del dashboard (la macro se llama igual que la sección)
+LIST_SECTIONS = {
+    "upcoming_due": "upcoming_due",
+    "overdue": "overdue_songs",
+    "upcoming_releases": "upcoming_releases",
+    "released": "released_songs",
+    "recent": "recent_songs",
+}
+
+# sección -> ((labels, counts, colors), fuentes de las que depende)
+CHART_SECTIONS = {
+    "status_chart": (("status_labels", "status_counts", "status_colors"), ("songs", "song_statuses")),
+    "genre_chart": (("genre_labels", "genre_counts", "genre_color"), ("songs", "genres")),
+    "activity_chart": (("months", "activity_counts", None), ("songs",)),
+    "album_chart": (("album_labels", "album_counts", "album_colors"), ("songs", "albums")),
+}
+
+SECTIONS = ("kpis",) + tuple(LIST_SECTIONS) + tuple(CHART_SECTIONS)
+
+KPI_KEYS = (
+    "total_songs", "completed_songs", "progress_percentage", "favorite_songs",
+    "abandoned_songs", "avg_rating", "upcoming_release_count",
+)
+
+
+def cheap_kpis(songs, fanout):
+    """Headline numbers from count queries, for the shell before any snapshot exists.
+
+    ``avg_rating`` and ``upcoming_release_count`` need every row, so they stay
+    None until the ``kpis`` section arrives.
+    """
+    def count(**filters):
+        def run():
+            query = songs.select("id", count="exact")
+            for column, value in filters.items():
+                query = query.in_(column, value) if isinstance(value, (list, tuple)) else query.eq(column, value)
+            return query.limit(1).execute().count or 0
+        return run
+
+    results, _ = fanout.run({
+        "total_songs": count(),
+        "completed_songs": count(status=list(COMPLETED_STATUSES)),
+        "favorite_songs": count(rating=FAVORITE_RATING),
+        "abandoned_songs": count(status=ABANDONED_STATUS),
+    })
+    kpis = dict.fromkeys(KPI_KEYS)
+    kpis.update(results)
+    total, completed = kpis["total_songs"], kpis["completed_songs"]
+    if total is not None and completed is not None:
+        kpis["progress_percentage"] = round((completed / total) * 100, 1) if total > 0 else 0
+    return kpis
+
+
+def chart_payload(name, context, unavailable):
+    (labels, counts, colors), sources = CHART_SECTIONS[name]
+    return {
+        "unavailable": any(source in unavailable for source in sources),
+        "labels": context[labels],
+        "counts": context[counts],
+        "colors": context[colors] if colors else None,
+    }
+
+
+def section_payload(name, context, unavailable, render_macro):
+    """JSON body of ``/api/dashboard/<name>``; ``render_macro(name, songs)`` returns HTML."""
+    if name == "kpis":
+        return {"kpis": context["kpis"], "unavailable": list(unavailable)}
+    if name in LIST_SECTIONS:
+        songs = context[LIST_SECTIONS[name]]
+        return {
+            "unavailable": "songs" in unavailable,
+            "count": len(songs),
+            "html": str(render_macro(name, songs)),
+        }
+    return chart_payload(name, context, unavailable)
+
+
+def inline_charts(context, unavailable):
+    """Chart payloads embedded in the synchronous page."""
+    return {name: chart_payload(name, context, unavailable) for name in CHART_SECTIONS}
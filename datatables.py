@@ -0,0 +1,146 @@
+"""Server-side processing for the songs DataTables grid.
+
+Parses the DataTables request protocol (``draw``, ``start``, ``length``,
+``search[value]``, ``order[i][...]`` and ``columns[i][...]``) and turns it
+into a Supabase query, so only the visible page leaves the database.
+"""
+
+# Proyección que necesita cada fila de la tabla de canciones.
+SONG_LIST_PROJECTION = (
+    "*, artists(name, color), albums(name, color), "
+    "song_statuses(name, color), genres(name, color)"
+)
+
+MAX_PAGE_LENGTH = 500
+# canciones que el índice de búsqueda puede sumar a la búsqueda global
+SEARCH_INDEX_IDS = 200
+DEFAULT_PAGE_LENGTH = 25
+
+# columna de DataTables -> columna de songs que se puede ordenar/filtrar
+ORDERABLE_COLUMNS = {
+    "name", "project_name", "genre", "artist_id", "album_id", "status",
+    "rating", "path", "url", "due_date", "release_date", "in_album", "updated_at",
+}
+TEXT_COLUMNS = ("name", "project_name", "path", "url")
+ID_COLUMNS = ("genre", "artist_id", "album_id", "status", "rating", "in_album")
+DATE_COLUMNS = ("due_date", "release_date")
+
+# columnas FK -> tabla de referencia para buscar por nombre
+NAME_LOOKUPS = {"artist_id": "artists", "album_id": "albums", "genre": "genres", "status": "song_statuses"}
+
+# caracteres con significado en la sintaxis de filtros de PostgREST
+_RESERVED = str.maketrans("", "", ',()"*%\\:')
+
+
+def _int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def clean_term(value):
+    return (value or "").translate(_RESERVED).strip()
+
+
+def parse_request(args):
+    """Normalize DataTables request parameters from ``request.args``."""
+    length = _int(args.get("length"), DEFAULT_PAGE_LENGTH)
+    if length < 0 or length > MAX_PAGE_LENGTH:
+        length = MAX_PAGE_LENGTH
+
+    columns = {}
+    i = 0
+    while f"columns[{i}][data]" in args:
+        columns[i] = {
+            "data": args.get(f"columns[{i}][data]"),
+            "search": clean_term(args.get(f"columns[{i}][search][value]")),
+        }
+        i += 1
+
+    order = []
+    i = 0
+    while f"order[{i}][column]" in args:
+        col = columns.get(_int(args.get(f"order[{i}][column]"), -1), {}).get("data")
+        if col in ORDERABLE_COLUMNS:
+            order.append((col, args.get(f"order[{i}][dir]") == "desc"))
+        i += 1
+
+    filters = {
+        c["data"]: c["search"]
+        for c in columns.values()
+        if c["search"] and c["data"] in ORDERABLE_COLUMNS
+    }
+
+    return {
+        "draw": _int(args.get("draw"), 0),
+        "start": max(_int(args.get("start"), 0), 0),
+        "length": length,
+        "search": clean_term(args.get("search[value]")),
+        "order": order,
+        "filters": filters,
+    }
+
+
+def search_expression(term, lookups, song_ids=None):
+    """Build a PostgREST ``or`` expression for the global search box.
+
+    Text columns are matched with ``ilike``; artist, album, genre and status
+    names are matched against the cached lookup rows and become ``in`` lists.
+    ``song_ids`` (prefix and typo-tolerant hits from the search index) are added
+    as one more alternative.
+    """
+    parts = [f"{col}.ilike.*{term}*" for col in TEXT_COLUMNS]
+    needle = term.lower()
+    for column, table in NAME_LOOKUPS.items():
+        ids = [str(r["id"]) for r in lookups.get(table, []) if needle in str(r.get("name") or "").lower()]
+        if ids:
+            parts.append(f"{column}.in.({','.join(ids)})")
+    if song_ids:
+        parts.append(f"id.in.({','.join(str(i) for i in song_ids)})")
+    return ",".join(parts)
+
+
+def apply_filters(query, params, lookups):
+    if params["search"]:
+        query = query.or_(search_expression(params["search"], lookups, params.get("search_ids")))
+    for column, value in params["filters"].items():
+        if column in ID_COLUMNS:
+            ids = [int(v) for v in value.split("|") if v.strip().lstrip("-").isdigit()]
+            if ids:
+                query = query.in_(column, ids)
+        elif column in DATE_COLUMNS:
+            query = query.eq(column, value)
+        else:
+            query = query.ilike(column, f"*{value}*")
+    return query
+
+
+def apply_order(query, params):
+    for column, desc in params["order"]:
+        query = query.order(column, desc=desc)
+    # desempate estable para que la paginación no repita filas
+    return query.order("id", desc=False)
+
+
+def page_query(query, params, lookups):
+    query = apply_order(apply_filters(query, params, lookups), params)
+    start = params["start"]
+    return query.range(start, start + params["length"] - 1)
+
+
+def is_filtered(params):
+    return bool(params["search"] or params["filters"])
+
+
+def with_list_embeds(song, lookups):
+    """Give a bare written row the embeds of ``SONG_LIST_PROJECTION``.
+
+    Used for live updates, so the grid can redraw the row without asking
+    ``/api/songs`` again.  ``lookups`` maps each table to ``{id: row}``.
+    """
+    song = dict(song)
+    for column, table in NAME_LOOKUPS.items():
+        ref = lookups.get(table, {}).get(song.get(column))
+        song[table] = {"name": ref.get("name"), "color": ref.get("color")} if ref else None
+    return song
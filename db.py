@@ -0,0 +1,54 @@
+"""Helpers shared by every place that reads from Supabase."""
+import os
+
+import httpx
+
+# PostgREST corta las respuestas en 1000 filas por defecto (max-rows).
+DEFAULT_PAGE_SIZE = 1000
+
+
+def fetch_all(build_query, page_size=DEFAULT_PAGE_SIZE):
+    """Read every row of a query, paging with ``range`` under the max-rows cap.
+
+    ``build_query`` must return a fresh, ordered query builder on each call
+    (builders are mutable, so one cannot be reused across pages).
+    """
+    rows = []
+    start = 0
+    while True:
+        page = build_query().range(start, start + page_size - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+def drop_connections(client):
+    """Close the pooled sockets of ``client``; new ones are opened on demand.
+
+    Used after a fork: connections opened by the parent (e.g. during the
+    warm-up) must not be shared with the workers.
+    """
+    # httpx no expone el pool; cerrar el transporte lo vacía pero sigue siendo usable
+    client._transport.close()
+
+
+def http_client_from_env(event_hooks=None):
+    """Shared keep-alive ``httpx`` client for PostgREST with a bounded pool.
+
+    SUPABASE_HTTP_POOL_SIZE caps open connections (so concurrent dashboard
+    queries reuse sockets instead of opening new ones), SUPABASE_HTTP_KEEPALIVE
+    is how long idle sockets are kept and SUPABASE_HTTP_TIMEOUT bounds every
+    upstream request.  ``event_hooks`` is passed through to httpx.
+    """
+    pool_size = int(os.environ.get("SUPABASE_HTTP_POOL_SIZE", 10))
+    return httpx.Client(
+        timeout=httpx.Timeout(float(os.environ.get("SUPABASE_HTTP_TIMEOUT", 10)), connect=5.0),
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=float(os.environ.get("SUPABASE_HTTP_KEEPALIVE", 30)),
+        ),
+        follow_redirects=True,
+        event_hooks=event_hooks,
+    )
@@ -0,0 +1,102 @@
+"""Bounded concurrent execution of independent upstream queries.
+
+``FanOut`` runs a dict of zero-argument callables on a shared thread pool and
+waits for each one at most ``timeout`` seconds.  Failures and timeouts are
+returned next to the results instead of being raised, so a page can render
+whatever did arrive and mark the rest as unavailable.  With ``max_workers=0``
+the tasks run one after another in the calling thread (same error handling).
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+logger = logging.getLogger(__name__)
+
+
+class FanOut:
+    def __init__(self, max_workers=8, timeout=10.0, name="fanout"):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.name = name
+        self._executor = self._new_executor()
+
+    def _new_executor(self):
+        if self.max_workers <= 0:
+            return None
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+
+    def after_fork(self):
+        """Replace the pool inherited from the parent process (its threads did not survive the fork)."""
+        self._executor = self._new_executor()
+
+    def _run_sequential(self, tasks):
+        results, errors = {}, {}
+        for name, fn in tasks.items():
+            try:
+                results[name] = fn()
+            except Exception as e:
+                logger.warning("query %s failed: %s", name, e)
+                errors[name] = str(e)
+        return results, errors
+
+    def run(self, tasks):
+        """Run ``{name: callable}`` concurrently; return ``(results, errors)``."""
+        if self._executor is None or len(tasks) <= 1:
+            return self._run_sequential(tasks)
+
+        # cada tarea lleva el contexto de la petición (instrumentation.py)
+        futures = {name: self._executor.submit(contextvars.copy_context().run, fn) for name, fn in tasks.items()}
+        deadline = time.monotonic() + self.timeout
+        results, errors = {}, {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeout:
+                future.cancel()
+                logger.warning("query %s timed out after %.1fs", name, self.timeout)
+                errors[name] = "timeout"
+            except Exception as e:
+                logger.warning("query %s failed: %s", name, e)
+                errors[name] = str(e)
+        return results, errors
+
+    def fetch_paged(self, page, count, page_size, extra=None):
+        """Read a whole table with pages fetched in parallel.
+
+        Round one runs ``count()``, ``page(0)`` and the ``extra`` tasks
+        together; round two fetches the remaining pages at once.  Returns
+        ``(rows, results, errors)`` where ``rows`` is None if any page failed
+        (stored in ``errors['rows']``) and ``results``/``errors`` hold the
+        outcome of the ``extra`` tasks.
+        """
+        tasks = dict(extra or {})
+        tasks["_count"] = count
+        tasks["_page:0"] = lambda: page(0)
+        results, errors = self.run(tasks)
+
+        first = results.pop("_page:0", None)
+        total = results.pop("_count", None)
+        page_errors = [errors.pop(k) for k in ("_page:0", "_count") if k in errors]
+        if page_errors:
+            errors["rows"] = page_errors[0]
+            return None, results, errors
+
+        rows = list(first)
+        starts = list(range(page_size, total or 0, page_size))
+        if starts:
+            pages, failed = self.run({s: (lambda s=s: page(s)) for s in starts})
+            if failed:
+                errors["rows"] = next(iter(failed.values()))
+                return None, results, errors
+            for s in starts:
+                rows.extend(pages[s])
+
+        # filas insertadas después del count: seguir mientras la página venga llena
+        last = pages[starts[-1]] if starts else first
+        start = (starts[-1] if starts else 0) + page_size
+        while len(last) >= page_size:
+            last = page(start)
+            rows.extend(last)
+            start += page_size
+        return rows, results, errors
@@ -0,0 +1,223 @@
+"""Opening project files on the host and checking which ones still exist.
+
+``/open-file`` used to start ``xdg-open``/``open`` inside the request
+thread and never wait for it, so every click left a zombie process and a
+burst of clicks could start dozens of them.  ``FileLauncher`` puts paths on
+a bounded queue served by a few worker threads that wait for each child
+(killing it after ``timeout``), drops repeated clicks on a path that is
+still queued and answers "busy" when the queue is full.
+
+``PathIndex`` caches ``exists``/``size``/``mtime`` per path for ``ttl``
+seconds, so the songs list can flag missing project files without a
+``stat`` per row on every page.  Only paths under the base directory are
+ever opened or inspected.
+"""
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_path(path, base_dir):
+    """Absolute real path of ``path`` if it lives under ``base_dir``, else None."""
+    if not isinstance(path, str) or not path.strip():
+        return None
+    try:
+        real = os.path.realpath(path)
+    except (OSError, ValueError):
+        return None
+    try:
+        inside = os.path.commonpath([real, base_dir]) == base_dir
+    except ValueError:
+        # otra unidad en Windows
+        return None
+    return real if inside else None
+
+
+def default_opener():
+    """Command that opens a file with its default application (None on Windows)."""
+    if sys.platform.startswith('win'):
+        return None
+    if sys.platform.startswith('darwin'):
+        return ['open']
+    return ['xdg-open']
+
+
+class FileLauncher:
+    """Bounded queue of paths opened by ``workers`` threads, one child at a time each."""
+
+    def __init__(self, base_dir, workers=2, max_queue=32, timeout=10, opener=None):
+        self.base_dir = os.path.realpath(base_dir)
+        self.workers = max(int(workers), 1)
+        self.timeout = timeout
+        self.opener = opener if opener is not None else default_opener()
+        self._queue = queue.Queue(maxsize=max(int(max_queue), 1))
+        # rutas en cola; un segundo clic sobre la misma ruta no la vuelve a encolar
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.launched = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"file-launcher-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, paths):
+        """Queue ``paths``; returns one ``{"path", "status"}`` per path.
+
+        ``status`` is ``queued``, ``duplicate`` (already waiting), ``forbidden``
+        (outside the base directory), ``missing``, ``invalid`` or ``busy``
+        (queue full).
+        """
+        self._start()
+        results = []
+        for path in paths:
+            if not isinstance(path, str) or not path.strip():
+                results.append({'path': path, 'status': 'invalid'})
+                continue
+            real = resolve_path(path, self.base_dir)
+            if real is None:
+                status = 'forbidden'
+            elif not os.path.exists(real):
+                status = 'missing'
+            else:
+                with self._lock:
+                    if real in self._queued:
+                        status = 'duplicate'
+                    else:
+                        try:
+                            self._queue.put_nowait(real)
+                            self._queued.add(real)
+                            status = 'queued'
+                        except queue.Full:
+                            self.rejected += 1
+                            status = 'busy'
+            results.append({'path': path, 'status': status})
+        return results
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            try:
+                self._launch(path)
+            except Exception as e:
+                self.failed += 1
+                logger.warning("could not open %s: %s", path, e)
+            finally:
+                with self._lock:
+                    self._queued.discard(path)
+                self._queue.task_done()
+
+    def _launch(self, path):
+        if self.opener is None:
+            os.startfile(path)
+            self.launched += 1
+            return
+        proc = subprocess.Popen(
+            [*self.opener, path],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        try:
+            code = proc.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            # el visor sigue abierto en primer plano: se corta y se recoge el proceso
+            proc.kill()
+            proc.wait()
+            self.timeouts += 1
+            return
+        if code == 0:
+            self.launched += 1
+        else:
+            self.failed += 1
+            logger.warning("%s exited with %s for %s", self.opener[0], code, path)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'workers': self.workers,
+            'launched': self.launched,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'rejected': self.rejected,
+        }
+
+
+class PathIndex:
+    """``stat`` results per path, cached for ``ttl`` seconds (LRU, ``max_entries``)."""
+
+    def __init__(self, base_dir, ttl=60, max_entries=50000):
+        self.base_dir = os.path.realpath(base_dir)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _stat(self, path):
+        real = resolve_path(path, self.base_dir)
+        if real is None:
+            # fuera de la carpeta permitida: no se revela si existe
+            return None
+        try:
+            st = os.stat(real)
+        except OSError:
+            return {'exists': False, 'size': None, 'mtime': None}
+        mtime = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc).replace(microsecond=0).isoformat()
+        return {'exists': True, 'size': st.st_size, 'mtime': mtime}
+
+    def lookup(self, paths):
+        """``{path: {"exists", "size", "mtime"} or None}`` for the non-empty ``paths``."""
+        now = time.monotonic()
+        out = {}
+        stale = []
+        with self._lock:
+            for path in paths:
+                if not path or path in out:
+                    continue
+                entry = self._entries.get(path)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(path)
+                    out[path] = entry[1]
+                    self.hits += 1
+                else:
+                    out[path] = None
+                    stale.append(path)
+        # los stat se hacen fuera del lock
+        fresh = {path: self._stat(path) for path in stale}
+        with self._lock:
+            self.misses += len(fresh)
+            for path, info in fresh.items():
+                self._entries[path] = (now + self.ttl, info)
+                self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        out.update(fresh)
+        return out
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'ttl': self.ttl}
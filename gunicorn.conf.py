@@ -0,0 +1,72 @@
+"""Gunicorn settings for production.
+
+    gunicorn -c gunicorn.conf.py
+
+``wsgi_app`` builds the app with ``create_app(warm=True)``.  The app is I/O
+bound (almost every request waits on Supabase), so the default is a few
+``gthread`` workers with several threads each.  With ``LIVE_UPDATES=1`` the
+default becomes ``gevent`` (if installed), where an open ``/events``
+stream is a greenlet instead of a thread; on threaded workers the streams
+are capped at half the threads of each worker.  With ``preload_app`` the
+master imports the app and runs the warm-up once, the workers are forked
+with the caches already filled and ``post_worker_init`` gives each of them
+its own connections and background threads.  ``kill -HUP`` reloads the
+workers gracefully (with preload, restart the master to load new code).
+"""
+import importlib.util
+import multiprocessing
+import os
+
+LIVE_UPDATES = os.environ.get("LIVE_UPDATES", "0") == "1"
+
+
+def _default_worker_class():
+    # con LIVE_UPDATES cada /events abierto ocupa un hilo de gthread; con gevent es una greenlet
+    if LIVE_UPDATES and importlib.util.find_spec("gevent") is not None:
+        return "gevent"
+    return "gthread"
+
+
+wsgi_app = "app:create_app(warm=True)"
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS") or _default_worker_class()
+if worker_class == "gevent":
+    # parchear antes de importar la app, también en el master que la precarga
+    from gevent import monkey
+
+    monkey.patch_all()
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+# WEB_CONCURRENCY es la variable que usan Render/Heroku para el número de workers
+workers = int(os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+# detrás de un proxy que reutiliza conexiones, mantenerlas más que su timeout
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+# reciclar workers de a poco acota la memoria sin reiniciarlos todos a la vez
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 200))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    import app as music_tracker
+
+    # la app que create_app() construyó para este worker (o que heredó del master)
+    svc = music_tracker.services(worker.wsgi)
+    if worker.cfg.preload_app:
+        music_tracker.after_fork(svc)
+    if svc.live_events is not None and not worker.cfg.worker_class_str.startswith("gevent"):
+        # cada /events retiene un hilo: la otra mitad queda para las páginas y la API
+        limit = worker.cfg.threads // 2
+        svc.live_events.cap_clients(limit)
+        if not limit:
+            worker.log.warning("LIVE_UPDATES with %s workers and 1 thread: /events answers 503; use gevent or more threads",
+                               worker.cfg.worker_class_str)
+    music_tracker.start_background_tasks(svc)
@@ -0,0 +1,186 @@
+"""``Idempotency-Key`` support for the write routes.
+
+A client that retries a request (timeout, flaky network, double click)
+sends the same ``Idempotency-Key`` header; the first response is stored
+for ``ttl`` seconds and replayed to every retry instead of running the
+write again.  A retry that arrives while the first request is still
+running waits for it.  Reusing a key with a different body is rejected
+with ``422``.  Keys live in the process (``LocalKeys``) or, with
+``IDEMPOTENCY_REDIS_URL``, in Redis so a retry landing on another worker is
+also recognized.  Responses with a 5xx status are not stored, so those
+requests can be retried for real.  ``GET`` and ``HEAD`` ignore the header.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, make_response, request
+
+HEADER = "Idempotency-Key"
+SAFE_METHODS = ("GET", "HEAD")
+MAX_KEY_LENGTH = 255
+# espera máxima de un reintento mientras la primera petición sigue en curso
+WAIT_SECONDS = 30
+
+
+class LocalKeys:
+    """Recent keys and their responses in this process (LRU, ``max_entries``)."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, fingerprint, ttl):
+        """``(True, None)`` for the first request, else ``(False, entry)``."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires"] > now:
+                return False, entry
+            self._entries[key] = {"fingerprint": fingerprint, "expires": now + ttl, "response": None}
+            self._entries.move_to_end(key)
+            self._events[key] = threading.Event()
+            while len(self._entries) > self.max_entries:
+                old, _ = self._entries.popitem(last=False)
+                self._events.pop(old, None)
+            return True, None
+
+    def wait(self, key, timeout):
+        event = self._events.get(key)
+        if event is not None:
+            event.wait(timeout)
+        with self._lock:
+            return self._entries.get(key)
+
+    def complete(self, key, response, ttl):
+        with self._lock:
+            if key in self._entries:
+                self._entries[key]["response"] = response
+                self._entries[key]["expires"] = time.time() + ttl
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def release(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisKeys:
+    """Keys shared by every worker: ``SET NX`` claims, responses as JSON."""
+
+    def __init__(self, redis_url, prefix="music-tracker:idempotency:"):
+        import redis  # dependencia opcional, solo si se configura la URL
+
+        self._redis = redis.Redis.from_url(redis_url)
+        self._prefix = prefix
+
+    def claim(self, key, fingerprint, ttl):
+        entry = {"fingerprint": fingerprint, "response": None}
+        if self._redis.set(self._prefix + key, json.dumps(entry), nx=True, ex=max(int(ttl), 1)):
+            return True, None
+        return False, self._get(key)
+
+    def _get(self, key):
+        raw = self._redis.get(self._prefix + key)
+        return json.loads(raw) if raw else None
+
+    def wait(self, key, timeout):
+        deadline = time.monotonic() + timeout
+        entry = self._get(key)
+        while entry is not None and entry["response"] is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+            entry = self._get(key)
+        return entry
+
+    def complete(self, key, response, ttl):
+        entry = self._get(key) or {}
+        entry["response"] = response
+        self._redis.set(self._prefix + key, json.dumps(entry), ex=max(int(ttl), 1))
+
+    def release(self, key):
+        self._redis.delete(self._prefix + key)
+
+    def __len__(self):
+        return 0
+
+
+class Idempotency:
+    """Decorator factory: ``@idempotency.route`` makes a view replay retried requests."""
+
+    def __init__(self, keys=None, ttl=24 * 3600):
+        self.keys = keys or LocalKeys()
+        self.ttl = ttl
+        self.replayed = 0
+
+    def route(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            # GET/HEAD no escriben nada: se responden siempre frescos
+            if not key or request.method in SAFE_METHODS:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'error': f'{HEADER} is too long.'}), 400
+            # la misma clave solo vale para la misma ruta y el mismo cuerpo
+            scoped = f"{request.method}:{request.path}:{key}"
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+            first, entry = self.keys.claim(scoped, fingerprint, self.ttl)
+            if not first:
+                return self._replay(scoped, fingerprint, entry)
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                self.keys.release(scoped)
+                raise
+            if response.status_code >= 500 or response.is_streamed:
+                self.keys.release(scoped)
+            else:
+                self.keys.complete(scoped, {
+                    "status": response.status_code,
+                    "mimetype": response.mimetype,
+                    "body": response.get_data(as_text=True),
+                    "location": response.headers.get("Location"),
+                }, self.ttl)
+            return response
+
+        return wrapper
+
+    def _replay(self, scoped, fingerprint, entry):
+        if entry is None:
+            # la clave venció entre el claim y la lectura (Redis)
+            return jsonify({'error': 'A request with this key is still in progress.'}), 409
+        if entry["fingerprint"] != fingerprint:
+            return jsonify({'error': f'{HEADER} was already used with a different request.'}), 422
+        if entry["response"] is None:
+            entry = self.keys.wait(scoped, WAIT_SECONDS)
+        if entry is None or entry["response"] is None:
+            return jsonify({'error': 'A request with this key is still in progress.'}), 409
+        self.replayed += 1
+        stored = entry["response"]
+        response = make_response(stored["body"], stored["status"])
+        response.mimetype = stored["mimetype"]
+        if stored.get("location"):
+            response.headers["Location"] = stored["location"]
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    def stats(self):
+        return {'keys': len(self.keys), 'replayed': self.replayed, 'ttl': self.ttl}
+
+
+def keys_from_env():
+    redis_url = os.environ.get("IDEMPOTENCY_REDIS_URL")
+    return RedisKeys(redis_url) if redis_url else LocalKeys()
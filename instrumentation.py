@@ -0,0 +1,351 @@
+"""Per-request instrumentation: upstream queries, template renders, timings.
+
+``InstrumentedClient`` wraps a supabase-style client (or a local store) and
+times every ``execute()``; Flask's template signals time renders.  The data
+is collected per request (a ``contextvars`` collector, which ``FanOut``
+carries into its worker threads) and then:
+
+* sent back as a ``Server-Timing`` header (visible in the browser devtools),
+* logged as one JSON line per request (logger ``music_tracker.requests``),
+* added to Prometheus-style histograms served by ``/metrics``,
+* optionally dumped with a cProfile profile when the request took longer
+  than ``SLOW_REQUEST_MS``.
+
+Bytes received come from the ``Content-Length`` of upstream HTTP responses
+(``record_response_bytes`` is an httpx response hook); local backends
+report 0.
+"""
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import Response, before_render_template, g, request, template_rendered
+
+request_logger = logging.getLogger("music_tracker.requests")
+logger = logging.getLogger(__name__)
+
+_collector = contextvars.ContextVar("request_collector", default=None)
+_current_query = contextvars.ContextVar("current_query", default=None)
+
+WRITE_OPS = ("insert", "update", "delete", "upsert")
+# máximo de entradas por tabla en Server-Timing
+SERVER_TIMING_MAX_ENTRIES = 12
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+# ------------------------------
+# Recolección por petición
+# ------------------------------
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.renders = []
+        self.render_starts = []
+        self._lock = threading.Lock()
+
+    def add_query(self, record):
+        with self._lock:
+            self.queries.append(record)
+
+    def add_render(self, template, seconds):
+        with self._lock:
+            self.renders.append((template, seconds))
+
+    @property
+    def db_seconds(self):
+        return sum(q["seconds"] for q in self.queries)
+
+    @property
+    def render_seconds(self):
+        return sum(s for _, s in self.renders)
+
+
+def record_response_bytes(response):
+    """httpx response hook: attribute ``Content-Length`` to the running query."""
+    record = _current_query.get()
+    if record is not None:
+        record["bytes"] += int(response.headers.get("content-length") or 0)
+
+
+class _InstrumentedQuery:
+    """Proxy over a query builder; chained builders stay wrapped."""
+
+    def __init__(self, builder, table, op):
+        self._builder = builder
+        self._table = table
+        self._op = op
+
+    def __getattr__(self, name):
+        value = getattr(self._builder, name)
+        op = name if name in ("select",) + WRITE_OPS else self._op
+        if callable(value) and name != "execute":
+            def call(*args, **kwargs):
+                return self._wrap(value(*args, **kwargs), op)
+            return call
+        if name == "execute":
+            return self._execute
+        return self._wrap(value, op)
+
+    def _wrap(self, value, op):
+        return _InstrumentedQuery(value, self._table, op) if hasattr(value, "execute") else value
+
+    def _execute(self, *args, **kwargs):
+        stats = _collector.get()
+        if stats is None:
+            return self._builder.execute(*args, **kwargs)
+        record = {"table": self._table, "op": self._op, "seconds": 0.0, "rows": 0, "bytes": 0, "error": None}
+        token = _current_query.set(record)
+        start = time.perf_counter()
+        try:
+            resp = self._builder.execute(*args, **kwargs)
+            data = getattr(resp, "data", None)
+            record["rows"] = len(data) if isinstance(data, list) else int(data is not None)
+            return resp
+        except Exception as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            _current_query.reset(token)
+            stats.add_query(record)
+            METRICS.observe_query(record)
+
+
+class InstrumentedClient:
+    """Wrap ``client.table(name)`` so every ``execute()`` is recorded."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def table(self, name):
+        return _InstrumentedQuery(self.client.table(name), name, "select")
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+# ------------------------------
+# Métricas (formato Prometheus)
+# ------------------------------
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series.items()):
+            base = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key))
+            sep = "," if base else ""
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {series["count"]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series['sum']:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series['count']}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_seconds = Histogram(
+            "http_request_duration_seconds", "Request duration.", LATENCY_BUCKETS, ("route", "method", "status"))
+        self.request_queries = Histogram(
+            "http_request_upstream_queries", "Upstream queries per request.", COUNT_BUCKETS, ("route",))
+        self.query_seconds = Histogram(
+            "upstream_query_duration_seconds", "Duration of each upstream query.", LATENCY_BUCKETS, ("table", "op"))
+        self.render_seconds = Histogram(
+            "template_render_duration_seconds", "Jinja render time.", LATENCY_BUCKETS, ("template",))
+        self.bytes_total = {}
+
+    def observe_query(self, record):
+        with self._lock:
+            self.query_seconds.observe(record["seconds"], table=record["table"], op=record["op"])
+            self.bytes_total[record["table"]] = self.bytes_total.get(record["table"], 0) + record["bytes"]
+
+    def observe_request(self, route, method, status, seconds, stats):
+        with self._lock:
+            self.request_seconds.observe(seconds, route=route, method=method, status=status)
+            self.request_queries.observe(len(stats.queries), route=route)
+            for template, render in stats.renders:
+                self.render_seconds.observe(render, template=template)
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for histogram in (self.request_seconds, self.request_queries, self.query_seconds, self.render_seconds):
+                lines.extend(histogram.render())
+            lines.append("# HELP upstream_response_bytes_total Bytes received from the data backend.")
+            lines.append("# TYPE upstream_response_bytes_total counter")
+            for table, total in sorted(self.bytes_total.items()):
+                lines.append(f'upstream_response_bytes_total{{table="{_escape(table)}"}} {total}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+# ------------------------------
+# Integración con Flask
+# ------------------------------
+
+def server_timing(stats, total_seconds):
+    """``Server-Timing`` value: totals plus database time per table/op."""
+    per_table = {}
+    for q in stats.queries:
+        key = f"{q['table']}.{q['op']}"
+        count, seconds = per_table.get(key, (0, 0.0))
+        per_table[key] = (count + 1, seconds + q["seconds"])
+    entries = [
+        f'db;desc="{len(stats.queries)} queries";dur={stats.db_seconds * 1000:.1f}',
+        f"render;dur={stats.render_seconds * 1000:.1f}",
+        f"total;dur={total_seconds * 1000:.1f}",
+    ]
+    ranked = sorted(per_table.items(), key=lambda item: -item[1][1])[:SERVER_TIMING_MAX_ENTRIES]
+    for i, (key, (count, seconds)) in enumerate(ranked):
+        entries.append(f'db{i};desc="{key} x{count}";dur={seconds * 1000:.1f}')
+    return ", ".join(entries)
+
+
+class SlowRequestSampler:
+    """Profile sampled requests and keep the profile only when they were slow."""
+
+    def __init__(self, threshold_ms, directory, sample_rate=1.0):
+        self.threshold = threshold_ms / 1000
+        self.directory = directory
+        self.sample_rate = sample_rate
+
+    def start(self):
+        if random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # otro perfilador activo en este hilo
+            return None
+        return profiler
+
+    def finish(self, profiler, seconds, summary):
+        profiler.disable()
+        if seconds < self.threshold:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", summary["path"]).strip("-") or "root"
+        base = os.path.join(
+            self.directory, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{summary['method']}-{slug}-{int(seconds * 1000)}ms")
+        profiler.dump_stats(base + ".prof")
+        with open(base + ".json", "w", encoding="utf-8") as fh:
+            json.dump(summary, fh, indent=2)
+        logger.warning("slow request %s %s took %.0fms; profile in %s.prof",
+                       summary["method"], summary["path"], seconds * 1000, base)
+        return base
+
+
+def init_app(app, sampler=None, log_requests=True):
+    """Register hooks, template timing and the ``/metrics`` endpoint."""
+    if log_requests and not request_logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        request_logger.addHandler(handler)
+        request_logger.setLevel(logging.INFO)
+        request_logger.propagate = False
+
+    @app.before_request
+    def _start_request():
+        g._instrumentation_token = _collector.set(RequestStats())
+        g._profiler = sampler.start() if sampler else None
+
+    @app.after_request
+    def _finish_request(response):
+        stats = _collector.get()
+        if stats is None:
+            return response
+        seconds = time.perf_counter() - stats.started
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        response.headers["Server-Timing"] = server_timing(stats, seconds)
+        METRICS.observe_request(route, request.method, response.status_code, seconds, stats)
+
+        summary = {
+            "method": request.method,
+            "path": request.path,
+            "route": route,
+            "status": response.status_code,
+            "duration_ms": round(seconds * 1000, 2),
+            "queries": len(stats.queries),
+            "db_ms": round(stats.db_seconds * 1000, 2),
+            "render_ms": round(stats.render_seconds * 1000, 2),
+            "bytes_received": sum(q["bytes"] for q in stats.queries),
+            "query_log": [
+                {"table": q["table"], "op": q["op"], "ms": round(q["seconds"] * 1000, 2),
+                 "rows": q["rows"], "bytes": q["bytes"], "error": q["error"]}
+                for q in stats.queries
+            ],
+        }
+        if log_requests and request_logger.isEnabledFor(logging.INFO):
+            request_logger.info(json.dumps(summary, default=str))
+        if getattr(g, "_profiler", None) is not None:
+            sampler.finish(g.pop("_profiler"), seconds, summary)
+        return response
+
+    @app.teardown_request
+    def _reset_request(exc=None):
+        profiler = g.pop("_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+        token = g.pop("_instrumentation_token", None)
+        if token is not None:
+            try:
+                _collector.reset(token)
+            except ValueError:
+                # respuesta en streaming terminada en otro contexto
+                _collector.set(None)
+
+    def _before_render(sender, template, context, **extra):
+        stats = _collector.get()
+        if stats is not None:
+            stats.render_starts.append(time.perf_counter())
+
+    def _rendered(sender, template, context, **extra):
+        stats = _collector.get()
+        if stats is not None and stats.render_starts:
+            started = stats.render_starts.pop()
+            stats.add_render(template.name or "<string>", time.perf_counter() - started)
+
+    before_render_template.connect(_before_render, app, weak=False)
+    template_rendered.connect(_rendered, app, weak=False)
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
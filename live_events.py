@@ -0,0 +1,217 @@
+"""Live updates pushed to the browser with Server-Sent Events.
+
+Write routes publish ``song.created``, ``song.updated`` and ``song.deleted``
+events (plus ``songs.reload`` after bulk changes) to an ``EventBroker``;
+``/events`` streams them to every open songs list and dashboard, which
+patch rows and charts in place instead of reloading the page.
+
+The broker keeps one ring buffer of recent events per process instead of a
+queue per client: waiting clients only hold a cursor, so memory does not
+grow with the number of connections and a reconnecting browser resumes
+from its ``Last-Event-ID``.  Each open stream still occupies a worker
+connection; with an async worker (``gevent``, the default of
+``gunicorn.conf.py`` when ``LIVE_UPDATES=1``) idle streams are cheap
+greenlets.  On threaded workers every stream pins a thread, so
+``gunicorn.conf.py`` caps them at half the threads of the worker
+(``cap_clients``) and the rest get ``503`` with ``Retry-After``.  With ``LIVE_EVENTS_REDIS_URL`` events
+are relayed through Redis pub/sub so every worker sees every write.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+RELOAD_EVENT = "songs.reload"
+# escrituras más grandes se anuncian como recarga en lugar de fila a fila
+MAX_ROWS_PER_EVENT = 200
+
+
+class EventBroker:
+    """Fan-out of recent events to any number of waiting streams."""
+
+    def __init__(self, history=256, max_clients=100, relay=None):
+        # cada proceso tiene su propia secuencia; un id de otro proceso obliga a recargar
+        self.instance = uuid.uuid4().hex[:8]
+        self.max_clients = max_clients
+        self.relay = relay
+        # llamado con (event, data) para los eventos que llegan de otro worker
+        self.on_remote = None
+        self.clients = 0
+        self.published = 0
+        self._seq = 0
+        self._events = deque(maxlen=max(history, 1))
+        self._cond = threading.Condition()
+
+    def start(self):
+        """Start relaying events from the other workers (once per process)."""
+        if self.relay is not None:
+            self.relay.start(self)
+
+    def after_fork(self):
+        """New identity for a worker forked from a preloaded parent."""
+        self.instance = uuid.uuid4().hex[:8]
+        if self.relay is not None:
+            self.relay.origin = uuid.uuid4().hex
+
+    def publish(self, event, data):
+        """Publish to local streams and, with a relay, to the other workers."""
+        self._append(event, data)
+        if self.relay is not None:
+            try:
+                self.relay.publish(event, data)
+            except Exception as e:
+                logger.warning("live event relay failed: %s", e)
+
+    def receive(self, event, data):
+        """Deliver an event published by another worker."""
+        if self.on_remote is not None:
+            try:
+                self.on_remote(event, data)
+            except Exception as e:
+                logger.warning("live event hook failed: %s", e)
+        self._append(event, data)
+
+    def _append(self, event, data):
+        payload = json.dumps(data, default=str)
+        with self._cond:
+            self._seq += 1
+            self.published += 1
+            self._events.append((self._seq, event, payload))
+            self._cond.notify_all()
+
+    def cursor(self, last_event_id=None):
+        """Sequence to resume from, or None when the client missed events."""
+        with self._cond:
+            if not last_event_id:
+                return self._seq
+            instance, _, seq = last_event_id.partition(":")
+            if instance != self.instance or not seq.isdigit() or int(seq) > self._seq:
+                return None
+            seq = int(seq)
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            return seq if seq >= oldest - 1 else None
+
+    def wait(self, cursor, timeout):
+        """Events newer than ``cursor`` (waiting up to ``timeout``) and the new cursor.
+
+        A cursor that already fell out of the ring buffer yields a single
+        reload event: the client lagged too far behind to patch in place.
+        """
+        with self._cond:
+            if self._seq == cursor:
+                self._cond.wait(timeout)
+            if self._seq == cursor:
+                return [], cursor
+            oldest = self._events[0][0]
+            if cursor < oldest - 1:
+                return [(self._seq, RELOAD_EVENT, "{}")], self._seq
+            return [e for e in self._events if e[0] > cursor], self._seq
+
+    def cap_clients(self, limit):
+        """Lower ``max_clients`` to ``limit``; ``0`` refuses every stream."""
+        with self._cond:
+            self.max_clients = limit if self.max_clients is None else min(self.max_clients, limit)
+
+    def connect(self):
+        """Reserve a client slot; False when the worker is full (``max_clients=None``: no limit)."""
+        with self._cond:
+            if self.max_clients is not None and self.clients >= self.max_clients:
+                return False
+            self.clients += 1
+            return True
+
+    def disconnect(self):
+        with self._cond:
+            self.clients -= 1
+
+
+class RedisRelay:
+    """Share events between workers through a Redis pub/sub channel."""
+
+    def __init__(self, redis_url, channel="music-tracker:events"):
+        import redis  # dependencia opcional, solo si se configura la URL
+
+        self._redis = redis.Redis.from_url(redis_url)
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+
+    def publish(self, event, data):
+        message = {"origin": self.origin, "event": event, "data": data}
+        self._redis.publish(self.channel, json.dumps(message, default=str))
+
+    def start(self, broker):
+        def listen():
+            while True:
+                try:
+                    pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.channel)
+                    for message in pubsub.listen():
+                        body = json.loads(message["data"])
+                        # los eventos propios ya se publicaron localmente
+                        if body.get("origin") != self.origin:
+                            broker.receive(body["event"], body.get("data"))
+                except Exception as e:
+                    logger.warning("live event relay disconnected: %s", e)
+                    time.sleep(5)
+
+        threading.Thread(target=listen, name="live-events-relay", daemon=True).start()
+
+
+def format_event(seq, event, payload, instance):
+    return f"id: {instance}:{seq}\nevent: {event}\ndata: {payload}\n\n"
+
+
+class EventStream:
+    """Body of an ``/events`` response; the caller already ran ``connect()``.
+
+    Comments every ``heartbeat`` seconds keep proxies from closing the
+    connection and let a dead client be noticed.  After ``max_duration``
+    the stream ends and the browser reconnects with its ``Last-Event-ID``,
+    which spreads long-lived clients across workers.  ``close()`` (called
+    by the WSGI server, even if the body was never read) frees the slot.
+    """
+
+    def __init__(self, broker, last_event_id=None, heartbeat=15, max_duration=300, retry_ms=3000):
+        self.broker = broker
+        self.last_event_id = last_event_id
+        self.heartbeat = heartbeat
+        self.max_duration = max_duration
+        self.retry_ms = retry_ms
+        self._closed = False
+
+    def __iter__(self):
+        broker = self.broker
+        yield f"retry: {self.retry_ms}\n\n"
+        cursor = broker.cursor(self.last_event_id)
+        if cursor is None:
+            cursor = broker.cursor()
+            yield format_event(cursor, RELOAD_EVENT, "{}", broker.instance)
+        deadline = time.monotonic() + self.max_duration
+        while not self._closed and time.monotonic() < deadline:
+            timeout = min(self.heartbeat, max(deadline - time.monotonic(), 0))
+            events, cursor = broker.wait(cursor, timeout)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for seq, event, payload in events:
+                yield format_event(seq, event, payload, broker.instance)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.broker.disconnect()
+
+
+def broker_from_env():
+    redis_url = os.environ.get("LIVE_EVENTS_REDIS_URL")
+    return EventBroker(
+        history=int(os.environ.get("LIVE_EVENTS_HISTORY", 256)),
+        # 0 = sin límite
+        max_clients=int(os.environ.get("LIVE_MAX_CLIENTS", 100)) or None,
+        relay=RedisRelay(redis_url) if redis_url else None,
+    )
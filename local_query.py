@@ -0,0 +1,247 @@
+"""PostgREST-style query builder for the local (non-Supabase) backends.
+
+The routes talk to Supabase through ``client.table(name).select(...).eq(...)
+.order(...).execute()``.  ``LocalQuery`` records the same chain of calls as
+plain data (filters, order, window, embeds) so a local backend only has to
+implement ``_execute_select``.  The supported subset is exactly what this
+app uses: ``eq``, ``neq``, ``gt``, ``gte``, ``lt``, ``lte``, ``in_``, ``is_``,
+``like``, ``ilike``, ``or_``, ``not_``, ``order``, ``limit``, ``range`` and
+``count="exact"``.  Backends that accept writes also implement
+``_execute_write`` for ``insert``/``update``/``delete``.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from functools import cached_property, lru_cache
+from typing import Any, List, Optional
+
+# Relaciones embebidas que usa la app: tabla -> {embed: columna FK}
+EMBEDS = {
+    "songs": {
+        "artists": "artist_id",
+        "albums": "album_id",
+        "song_statuses": "status",
+        "genres": "genre",
+    },
+}
+
+_EMBED_RE = re.compile(r"(\w+)\s*\(([^)]*)\)")
+
+
+@dataclass
+class LocalResponse:
+    """Same shape as the supabase-py ``APIResponse`` attributes the app reads."""
+
+    data: List[dict]
+    count: Optional[int] = None
+
+
+@dataclass
+class Filter:
+    op: str
+    column: Optional[str] = None
+    value: Any = None
+    negate: bool = False
+    # para op == "or": lista de Filter
+    any_of: List["Filter"] = field(default_factory=list)
+
+    @cached_property
+    def value_set(self):
+        """Values of an ``in`` filter (and their text form) for O(1) membership."""
+        return {v for item in self.value if item is not None for v in (item, str(item))}
+
+
+def parse_select(columns):
+    """Split ``"*, artists(name, color)"`` into ``(["*"], {"artists": ["name", "color"]})``."""
+    embeds = {}
+    for name, cols in _EMBED_RE.findall(columns or "*"):
+        embeds[name] = [c.strip() for c in cols.split(",") if c.strip()] or ["*"]
+    plain = _EMBED_RE.sub("", columns or "*")
+    fields = [c.strip() for c in plain.split(",") if c.strip()] or ["*"]
+    return fields, embeds
+
+
+def normalize_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _literal(text):
+    """Value written inside a PostgREST filter string (``or=(...)``)."""
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        return text[1:-1]
+    if text.lower() == "null":
+        return None
+    if text.lower() in ("true", "false"):
+        return int(text.lower() == "true")
+    if re.fullmatch(r"-?\d+", text):
+        return int(text)
+    return text
+
+
+def _split_top_level(expr):
+    parts, depth, current = [], 0, []
+    for ch in expr:
+        if ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+            continue
+        depth += ch == "("
+        depth -= ch == ")"
+        current.append(ch)
+    if current:
+        parts.append("".join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def parse_or(expr):
+    """Parse ``"name.ilike.*x*,artist_id.in.(1,2)"`` into a list of filters."""
+    filters = []
+    for part in _split_top_level(expr):
+        column, rest = part.split(".", 1)
+        negate = rest.startswith("not.")
+        if negate:
+            rest = rest[4:]
+        op, raw = rest.split(".", 1)
+        if op == "in":
+            value = [_literal(v) for v in _split_top_level(raw.strip()[1:-1])]
+        elif op == "is":
+            value = _literal(raw)
+        else:
+            value = _literal(raw) if op not in ("like", "ilike") else raw
+        filters.append(Filter(op, column, value, negate))
+    return filters
+
+
+class LocalQuery:
+    """Mutable builder mirroring supabase-py's request builders."""
+
+    def __init__(self, backend, table):
+        self.backend = backend
+        self.table = table
+        self.op = "select"
+        self.payload = None
+        self.fields = ["*"]
+        self.embeds = {}
+        self.count_mode = None
+        self.filters = []
+        self.orders = []
+        self.offset = 0
+        self.limit_value = None
+        self._negate_next = False
+
+    # --- proyección ---
+    def select(self, columns="*", count=None, **_):
+        self.fields, self.embeds = parse_select(columns)
+        self.count_mode = count
+        return self
+
+    # --- filtros ---
+    @property
+    def not_(self):
+        self._negate_next = True
+        return self
+
+    def _add(self, op, column, value):
+        self.filters.append(Filter(op, column, normalize_value(value), self._negate_next))
+        self._negate_next = False
+        return self
+
+    def eq(self, column, value):
+        return self._add("eq", column, value)
+
+    def neq(self, column, value):
+        return self._add("neq", column, value)
+
+    def gt(self, column, value):
+        return self._add("gt", column, value)
+
+    def gte(self, column, value):
+        return self._add("gte", column, value)
+
+    def lt(self, column, value):
+        return self._add("lt", column, value)
+
+    def lte(self, column, value):
+        return self._add("lte", column, value)
+
+    def like(self, column, pattern):
+        return self._add("like", column, pattern)
+
+    def ilike(self, column, pattern):
+        return self._add("ilike", column, pattern)
+
+    def is_(self, column, value):
+        return self._add("is", column, value)
+
+    def in_(self, column, values):
+        return self._add("in", column, [normalize_value(v) for v in values])
+
+    def or_(self, expr, **_):
+        self.filters.append(Filter("or", any_of=parse_or(expr), negate=self._negate_next))
+        self._negate_next = False
+        return self
+
+    # --- orden y ventana ---
+    def order(self, column, desc=False, nullsfirst=None, **_):
+        # PostgreSQL: ASC pone NULL al final, DESC al principio
+        self.orders.append((column, bool(desc), bool(desc) if nullsfirst is None else nullsfirst))
+        return self
+
+    def limit(self, size, **_):
+        self.limit_value = size
+        return self
+
+    def range(self, start, end, **_):
+        self.offset = start
+        self.limit_value = end - start + 1
+        return self
+
+    # --- escrituras ---
+    def insert(self, rows, **_):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def update(self, patch, **_):
+        self.op, self.payload = "update", patch
+        return self
+
+    def upsert(self, rows, on_conflict="", ignore_duplicates=False, **_):
+        self.op, self.payload = "upsert", rows
+        self.on_conflict = [c.strip() for c in on_conflict.split(",") if c.strip()] or ["id"]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def delete(self, **_):
+        self.op = "delete"
+        return self
+
+    def execute(self):
+        if self.op == "select":
+            return self.backend._execute_select(self)
+        return self.backend._execute_write(self)
+
+
+@lru_cache(maxsize=256)
+def like_to_regex(pattern, case_sensitive=False):
+    """Compile a LIKE pattern (``%``/``*`` any run, ``_`` one char)."""
+    parts = []
+    for ch in str(pattern):
+        if ch in "%*":
+            parts.append(".*")
+        elif ch == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(ch))
+    return re.compile("".join(parts), 0 if case_sensitive else re.IGNORECASE | re.DOTALL)
+
+
+def project(row, fields):
+    if "*" in fields:
+        return dict(row)
+    return {f: row.get(f) for f in fields}
+
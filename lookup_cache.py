@@ -0,0 +1,175 @@
+"""Process-local cache for the small lookup tables.
+
+``artists``, ``albums``, ``genres`` and ``song_statuses`` almost never change
+but every page used to read them again.  ``LookupCache`` keeps each table for
+``ttl`` seconds and lets the write paths push new rows (or drop a table) right
+away, so dropdowns never show stale data.  Optionally the rows can live in
+Redis so every Gunicorn worker shares one copy.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+LOOKUP_TABLES = ("artists", "albums", "genres", "song_statuses")
+
+
+class LocalBackend:
+    """Dict-backed storage with per-key expiry (one copy per process)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, rows = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return rows
+
+    def set(self, key, rows, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, rows)
+
+    def update(self, key, change, ttl):
+        """Store ``change(rows)`` if ``key`` is cached; returns the new rows or None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            rows = change(entry[1])
+            self._data[key] = (time.monotonic() + ttl, rows)
+            return rows
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisBackend:
+    """Shared storage in Redis; rows are stored as JSON with ``SETEX``."""
+
+    def __init__(self, redis_url, prefix="music-tracker:lookup:"):
+        import redis  # dependencia opcional, solo si se configura la URL
+
+        self._redis = redis.Redis.from_url(redis_url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._redis.get(self._prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, rows, ttl):
+        self._redis.setex(self._prefix + key, max(int(ttl), 1), json.dumps(rows))
+
+    def update(self, key, change, ttl):
+        """Same as ``LocalBackend.update``, atomic across workers (``WATCH``/``MULTI``)."""
+        name = self._prefix + key
+
+        def apply(pipe):
+            raw = pipe.get(name)
+            if raw is None:
+                return None
+            rows = change(json.loads(raw))
+            pipe.multi()
+            pipe.setex(name, max(int(ttl), 1), json.dumps(rows))
+            return rows
+
+        # si otro worker cambia la clave entre GET y EXEC, redis-py reintenta
+        return self._redis.transaction(apply, name, value_from_callable=True)
+
+    def delete(self, key):
+        self._redis.delete(self._prefix + key)
+
+
+class LookupCache:
+    """Read-through cache of whole lookup tables.
+
+    ``loader(table)`` returns the full list of rows for a table.  At most
+    ``max_rows`` rows are kept across all tables: storing a table evicts the
+    least recently used ones until the rest fits.  The table just loaded is
+    always kept, even when it alone is larger than ``max_rows``.
+    """
+
+    def __init__(self, loader, ttl=300, max_rows=20000, backend=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.backend = backend or LocalBackend()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # tabla -> filas guardadas, de la usada hace más tiempo a la más reciente
+        self._sizes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, table):
+        rows = self.backend.get(table) if self.ttl > 0 else None
+        with self._lock:
+            if rows is not None:
+                self.hits += 1
+                if table in self._sizes:
+                    self._sizes.move_to_end(table)
+                return rows
+            self.misses += 1
+        rows = self.loader(table)
+        if self.ttl > 0:
+            with self._lock:
+                self._store(table, rows)
+        return rows
+
+    def _store(self, table, rows):
+        # con self._lock tomado
+        self.backend.set(table, rows, self.ttl)
+        self._sizes[table] = len(rows)
+        self._sizes.move_to_end(table)
+        total = sum(self._sizes.values())
+        while total > self.max_rows and len(self._sizes) > 1:
+            old, size = self._sizes.popitem(last=False)
+            self.backend.delete(old)
+            total -= size
+            self.evictions += 1
+
+    def add_row(self, table, row):
+        """Write-through for a freshly inserted row."""
+        if not row:
+            return
+
+        def change(rows):
+            return [r for r in rows if r.get("id") != row.get("id")] + [row]
+
+        with self._lock:
+            rows = self.backend.update(table, change, self.ttl)
+            if rows is not None:
+                self._sizes[table] = len(rows)
+
+    def invalidate(self, table=None):
+        with self._lock:
+            for name in (table,) if table else LOOKUP_TABLES:
+                self.backend.delete(name)
+                self._sizes.pop(name, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0,
+                "evictions": self.evictions,
+                "cached_rows": sum(self._sizes.values()),
+                "ttl": self.ttl,
+                "max_rows": self.max_rows,
+                "backend": type(self.backend).__name__,
+            }
+
+
+def backend_from_env():
+    redis_url = os.environ.get("LOOKUP_CACHE_REDIS_URL")
+    return RedisBackend(redis_url) if redis_url else LocalBackend()
@@ -0,0 +1,235 @@
+"""In-memory stand-in for the Supabase client.
+
+``MemoryStore`` keeps every table as a dict of rows keyed by ``id`` and
+answers the same builder calls as supabase-py (see ``local_query.py``) with
+PostgREST semantics: comparisons against NULL never match (so
+``not_.in_`` skips NULLs too), ascending order puts NULLs last and
+descending first, and ``count="exact"`` counts before ``limit``/``range``.
+It needs no network, which makes it the backend for benchmarks and for
+running the app without credentials.
+"""
+import json
+import threading
+from datetime import datetime, timezone
+
+from local_query import EMBEDS, LocalQuery, LocalResponse, like_to_regex, project
+
+# columnas que la base de datos actualiza sola (trigger/default en Supabase)
+TOUCH_COLUMNS = {"songs": "updated_at"}
+# default de Supabase en cada tabla, solo al insertar
+CREATED_COLUMN = "created_at"
+
+_COMPARE = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+def _coerce(value, other):
+    """Compare like Postgres would: dates/timestamps as text, numbers as numbers."""
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(other, str) and not isinstance(value, str):
+        return str(value)
+    if isinstance(other, (int, float)) and isinstance(value, str):
+        try:
+            return type(other)(value)
+        except ValueError:
+            return value
+    return value
+
+
+def evaluate(f, row):
+    """Three-valued result of a filter: True, False or None (unknown/NULL)."""
+    if f.op == "or":
+        # corta en la primera alternativa verdadera
+        result = False
+        for sub in f.any_of:
+            outcome = evaluate(sub, row)
+            if outcome is True:
+                result = True
+                break
+            if outcome is None:
+                result = None
+    elif f.op == "is":
+        value = row.get(f.column)
+        result = value is None if f.value is None else value == f.value
+    else:
+        value = row.get(f.column)
+        if value is None:
+            return None
+        if f.op in _COMPARE:
+            if f.value is None:
+                return None
+            try:
+                result = _COMPARE[f.op](_coerce(value, f.value), f.value)
+            except TypeError:
+                result = False
+        elif f.op == "in":
+            result = value in f.value_set or str(value) in f.value_set
+        elif f.op in ("like", "ilike"):
+            result = like_to_regex(f.value, case_sensitive=f.op == "like").fullmatch(str(value)) is not None
+        else:
+            raise ValueError(f"Unsupported filter: {f.op}")
+    if f.negate and result is not None:
+        return not result
+    return result
+
+
+def sort_rows(rows, orders):
+    """Stable multi-column sort, one pass per column from the last to the first."""
+    rows = list(rows)
+    for column, desc, nullsfirst in reversed(orders):
+        present = [r for r in rows if r.get(column) is not None]
+        nulls = [r for r in rows if r.get(column) is None]
+        try:
+            present.sort(key=lambda r: r[column], reverse=desc)
+        except TypeError:
+            present.sort(key=lambda r: str(r[column]), reverse=desc)
+        rows = nulls + present if nullsfirst else present + nulls
+    return rows
+
+
+class MemoryStore:
+    def __init__(self, tables=None):
+        self._lock = threading.RLock()
+        self.tables = {}
+        self.next_id = {}
+        # tabla -> (versión, orden, filas ordenadas); las páginas siguientes reutilizan el orden
+        self.versions = {}
+        self._sorted = {}
+        for name, rows in (tables or {}).items():
+            self.load(name, rows)
+
+    @classmethod
+    def from_json(cls, path):
+        """Seed from a ``{"songs": [...], "artists": [...]}`` JSON file."""
+        with open(path, encoding="utf-8") as fh:
+            return cls(json.load(fh))
+
+    def load(self, name, rows):
+        with self._lock:
+            table = self.tables.setdefault(name, {})
+            for row in rows:
+                table[row["id"]] = dict(row)
+            self.next_id[name] = max(table, default=0) + 1
+            self._changed(name)
+
+    def _changed(self, name):
+        self.versions[name] = self.versions.get(name, 0) + 1
+
+    def table(self, name):
+        return LocalQuery(self, name)
+
+    def _rows(self, query, orders=None):
+        table = self.tables.get(query.table, {})
+        by_id = next((f for f in query.filters if f.column == "id" and f.op in ("eq", "in") and not f.negate), None)
+        if by_id is not None:
+            # acceso directo por clave primaria, como haría el índice de Postgres
+            ids = by_id.value if by_id.op == "in" else [by_id.value]
+            rows = [table[i] for i in dict.fromkeys(ids) if i in table]
+            rows = [r for r in rows if all(evaluate(f, r) is True for f in query.filters)]
+            return sort_rows(rows, orders) if orders else rows
+        rows = table.values()
+        if orders:
+            key = (self.versions.get(query.table, 0), tuple(orders))
+            cached = self._sorted.get(query.table)
+            if cached is None or cached[0] != key:
+                cached = (key, sort_rows(rows, orders))
+                self._sorted[query.table] = cached
+            rows = cached[1]
+        if not query.filters:
+            return list(rows)
+        return [r for r in rows if all(evaluate(f, r) is True for f in query.filters)]
+
+    def _execute_select(self, query):
+        with self._lock:
+            rows = self._rows(query, query.orders or [("id", False, False)])
+            count = len(rows) if query.count_mode else None
+            if query.offset or query.limit_value is not None:
+                end = None if query.limit_value is None else query.offset + query.limit_value
+                rows = rows[query.offset:end]
+            data = []
+            for row in rows:
+                out = project(row, query.fields)
+                for name, columns in query.embeds.items():
+                    fk = EMBEDS.get(query.table, {}).get(name)
+                    if fk is None:
+                        raise ValueError(f"Unknown relation {query.table}->{name}")
+                    ref = self.tables.get(name, {}).get(row.get(fk))
+                    out[name] = project(ref, columns) if ref else None
+                data.append(out)
+            return LocalResponse(data=data, count=count)
+
+    def _execute_write(self, query):
+        with self._lock:
+            table = self.tables.setdefault(query.table, {})
+            self._changed(query.table)
+            touch = TOUCH_COLUMNS.get(query.table)
+            now = datetime.now(timezone.utc).isoformat()
+            if query.op == "insert":
+                payload = query.payload if isinstance(query.payload, list) else [query.payload]
+                # como en Postgres, un insert múltiple es todo o nada
+                seen, clash = set(), None
+                for item in payload:
+                    item_id = item.get("id")
+                    if item_id is not None and (item_id in table or item_id in seen):
+                        clash = item_id
+                        break
+                    seen.add(item_id)
+                if clash is not None:
+                    raise ValueError(f"duplicate key value violates unique constraint: {query.table}.id={clash}")
+                out = []
+                for item in payload:
+                    row = dict(item)
+                    if row.get("id") is None:
+                        row["id"] = self.next_id.get(query.table, 1)
+                    self.next_id[query.table] = max(self.next_id.get(query.table, 1), row["id"] + 1)
+                    row.setdefault(CREATED_COLUMN, now)
+                    if touch:
+                        row[touch] = now
+                    table[row["id"]] = row
+                    out.append(dict(row))
+                return LocalResponse(data=out)
+
+            if query.op == "upsert":
+                return self._upsert(query, table, now, touch)
+
+            matched = self._rows(query)
+            if query.op == "update":
+                for row in matched:
+                    row.update(query.payload)
+                    if touch:
+                        row[touch] = now
+            else:
+                for row in matched:
+                    del table[row["id"]]
+            return LocalResponse(data=[dict(r) for r in matched])
+
+    def _upsert(self, query, table, now, touch):
+        # on_conflict hace de índice único: una fila con los mismos valores se actualiza
+        payload = query.payload if isinstance(query.payload, list) else [query.payload]
+        by_key = {tuple(r.get(c) for c in query.on_conflict): r for r in table.values()}
+        out = []
+        for item in payload:
+            row = by_key.get(tuple(item.get(c) for c in query.on_conflict))
+            if row is not None:
+                if query.ignore_duplicates:
+                    continue
+                row.update(item)
+            else:
+                row = dict(item)
+                if row.get("id") is None:
+                    row["id"] = self.next_id.get(query.table, 1)
+                self.next_id[query.table] = max(self.next_id.get(query.table, 1), row["id"] + 1)
+                row.setdefault(CREATED_COLUMN, now)
+                table[row["id"]] = row
+                by_key[tuple(row.get(c) for c in query.on_conflict)] = row
+            if touch:
+                row[touch] = now
+            out.append(dict(row))
+        return LocalResponse(data=out)
@@ -0,0 +1,272 @@
+"""Local read replica of the Supabase tables in SQLite.
+
+``SQLiteReplica`` mirrors ``songs`` and the lookup tables into a SQLite file
+and answers the same query-builder calls as the Supabase client (see
+``local_query.py``), so read routes can use it unchanged.  Each table keeps
+the full upstream row as JSON in ``data`` plus a few real, indexed columns
+used for filtering and ordering.
+
+Sync is incremental for ``songs`` (rows with ``updated_at`` at or after the
+last seen value) and full for the small lookup tables; every
+``full_sync_every`` cycles songs are reloaded completely to pick up deletes
+made elsewhere.  Writes keep going to Supabase and the app applies the
+returned rows here with ``apply``/``delete``.
+"""
+import json
+import logging
+import sqlite3
+import threading
+
+from db import fetch_all
+from local_query import EMBEDS, LocalQuery, LocalResponse, project
+
+logger = logging.getLogger(__name__)
+
+SONG_COLUMNS = (
+    "name", "project_name", "path", "url", "genre", "artist_id", "album_id",
+    "status", "rating", "in_album", "due_date", "release_date", "updated_at",
+)
+TABLE_COLUMNS = {
+    "songs": SONG_COLUMNS,
+    "artists": ("name",),
+    "albums": ("name",),
+    "genres": ("name",),
+    "song_statuses": ("name",),
+}
+INDEXES = {
+    "songs": ("status", "due_date", "release_date", "album_id", "genre", "updated_at", "artist_id"),
+    "artists": ("name",),
+    "albums": ("name",),
+    "genres": ("name",),
+    "song_statuses": ("name",),
+}
+FULL_SYNC_TABLES = ("artists", "albums", "genres", "song_statuses")
+
+_SQL_OPS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class SQLiteReplica:
+    def __init__(self, path, full_sync_every=20):
+        self.path = path
+        self.full_sync_every = full_sync_every
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._syncs = 0
+        self.last_sync_error = None
+        self._create_schema()
+
+    # ------------------------------
+    # Conexión y esquema
+    # ------------------------------
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, uri=self.path.startswith("file:"))
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS replica_meta (key TEXT PRIMARY KEY, value TEXT)")
+            for table, columns in TABLE_COLUMNS.items():
+                cols = ", ".join(columns)
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, {cols}, data TEXT NOT NULL)")
+                for column in INDEXES[table]:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})")
+
+    def _meta(self, key, value=None):
+        conn = self._conn()
+        if value is None:
+            row = conn.execute("SELECT value FROM replica_meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        conn.execute("INSERT OR REPLACE INTO replica_meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # ------------------------------
+    # Escrituras locales
+    # ------------------------------
+
+    def _upsert(self, conn, table, rows):
+        columns = TABLE_COLUMNS[table]
+        placeholders = ", ".join("?" for _ in range(len(columns) + 2))
+        sql = f"INSERT OR REPLACE INTO {table} (id, {', '.join(columns)}, data) VALUES ({placeholders})"
+        conn.executemany(sql, [
+            (row["id"], *(row.get(c) for c in columns),
+             json.dumps({k: v for k, v in row.items() if k not in EMBEDS.get(table, {})}, default=str))
+            for row in rows if row and row.get("id") is not None
+        ])
+
+    def apply(self, table, rows):
+        """Store rows returned by a successful upstream insert/update."""
+        if table not in TABLE_COLUMNS or not rows:
+            return
+        with self._conn() as conn:
+            self._upsert(conn, table, rows)
+
+    def delete(self, table, ids):
+        ids = list(ids)
+        if table not in TABLE_COLUMNS or not ids:
+            return
+        with self._conn() as conn:
+            conn.execute(f"DELETE FROM {table} WHERE id IN ({', '.join('?' for _ in ids)})", ids)
+
+    def _replace_all(self, table, rows):
+        with self._conn() as conn:
+            conn.execute(f"DELETE FROM {table}")
+            self._upsert(conn, table, rows)
+
+    # ------------------------------
+    # Sincronización
+    # ------------------------------
+
+    def sync(self, client, full=False):
+        """Pull changes from ``client`` (the Supabase client). Returns rows pulled."""
+        with self._sync_lock:
+            self._syncs += 1
+            full = full or self._meta("songs_watermark") is None or (
+                self.full_sync_every and self._syncs % self.full_sync_every == 0
+            )
+            pulled = 0
+            for table in FULL_SYNC_TABLES:
+                rows = fetch_all(lambda t=table: client.table(t).select("*").order("id"))
+                self._replace_all(table, rows)
+                pulled += len(rows)
+
+            watermark = None if full else self._meta("songs_watermark")
+
+            def songs_query():
+                query = client.table("songs").select("*").order("updated_at").order("id")
+                return query.gte("updated_at", watermark) if watermark else query
+
+            rows = fetch_all(songs_query)
+            if full:
+                self._replace_all("songs", rows)
+            else:
+                self.apply("songs", rows)
+            pulled += len(rows)
+
+            stamps = [r["updated_at"] for r in rows if r.get("updated_at")]
+            with self._conn():
+                if stamps:
+                    self._meta("songs_watermark", max(stamps + ([watermark] if watermark else [])))
+                elif full:
+                    self._meta("songs_watermark", "")
+            self.last_sync_error = None
+            return pulled
+
+    def after_fork(self):
+        """Drop the connections inherited from the parent process (SQLite must not share them)."""
+        self._local = threading.local()
+
+    def start_background_sync(self, client, interval):
+        """Sync every ``interval`` seconds in a daemon thread."""
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.sync(client)
+                except Exception as e:
+                    self.last_sync_error = str(e)
+                    logger.warning("replica sync failed: %s", e)
+
+        stop = threading.Event()
+        threading.Thread(target=loop, name="replica-sync", daemon=True).start()
+        return stop
+
+    # ------------------------------
+    # Lecturas (API tipo supabase)
+    # ------------------------------
+
+    def table(self, name):
+        return LocalQuery(self, name)
+
+    def _column_sql(self, table, column):
+        if column == "id" or column in TABLE_COLUMNS[table]:
+            return column
+        return f"json_extract(data, '$.{column}')"
+
+    def _filter_sql(self, table, f, params):
+        if f.op == "or":
+            parts = [self._filter_sql(table, sub, params) for sub in f.any_of]
+            sql = "(" + " OR ".join(parts or ["0"]) + ")"
+        else:
+            col = self._column_sql(table, f.column)
+            if f.op in _SQL_OPS:
+                sql = f"{col} {_SQL_OPS[f.op]} ?"
+                params.append(f.value)
+            elif f.op == "in":
+                values = list(f.value)
+                sql = f"{col} IN ({', '.join('?' for _ in values)})" if values else "0"
+                params.extend(values)
+            elif f.op == "is":
+                sql = f"{col} IS NULL" if f.value is None else f"{col} IS ?"
+                if f.value is not None:
+                    params.append(f.value)
+            elif f.op in ("like", "ilike"):
+                # LIKE de SQLite ignora mayúsculas (ASCII); like exacto con GLOB
+                pattern = str(f.value).replace("*", "%")
+                if f.op == "like":
+                    sql = f"{col} GLOB ?"
+                    params.append(pattern.replace("%", "*").replace("_", "?"))
+                else:
+                    sql = f"{col} LIKE ?"
+                    params.append(pattern)
+            else:
+                raise ValueError(f"Unsupported filter: {f.op}")
+        return f"NOT ({sql})" if f.negate else sql
+
+    def _execute_select(self, query):
+        table = query.table
+        if table not in TABLE_COLUMNS:
+            raise ValueError(f"Table not replicated: {table}")
+        params = []
+        where = " AND ".join(self._filter_sql(table, f, params) for f in query.filters) or "1"
+        conn = self._conn()
+
+        count = None
+        if query.count_mode:
+            count = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+
+        order = ", ".join(
+            f"{self._column_sql(table, col)} {'DESC' if desc else 'ASC'} NULLS {'FIRST' if nullsfirst else 'LAST'}"
+            for col, desc, nullsfirst in query.orders
+        )
+        sql = f"SELECT data FROM {table} WHERE {where}"
+        if order:
+            sql += f" ORDER BY {order}"
+        if query.limit_value is not None or query.offset:
+            sql += " LIMIT ? OFFSET ?"
+            params = params + [query.limit_value if query.limit_value is not None else -1, query.offset]
+
+        rows = [json.loads(r[0]) for r in conn.execute(sql, params)]
+        if query.embeds:
+            self._attach_embeds(table, rows, query.embeds)
+        data = [
+            {**project(row, query.fields), **{name: row.get(name) for name in query.embeds}}
+            for row in rows
+        ]
+        return LocalResponse(data=data, count=count)
+
+    def _execute_write(self, query):
+        raise ValueError("The replica is read-only; write upstream and use apply()/delete()")
+
+    def _attach_embeds(self, table, rows, embeds):
+        conn = self._conn()
+        for name, columns in embeds.items():
+            fk = EMBEDS.get(table, {}).get(name)
+            if fk is None:
+                raise ValueError(f"Unknown relation {table}->{name}")
+            ids = sorted({r.get(fk) for r in rows if r.get(fk) is not None})
+            refs = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                for ref in conn.execute(
+                    f"SELECT data FROM {name} WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+                ):
+                    ref = json.loads(ref[0])
+                    refs[ref["id"]] = project(ref, columns)
+            for row in rows:
+                row[name] = refs.get(row.get(fk))
@@ -0,0 +1,395 @@
+"""Time-series reports over daily rollups of the songs table.
+
+Every song contributes a handful of facts (created on day X, completed on
+day Y after Z days, open with a due date on day W) that ``DailyRollups``
+adds to per-day counters, both in total and per artist, album and genre.
+Report queries only walk the days of the requested range, so they cost the
+same whether the catalog holds one year of history or twenty.  Writes move
+a single song's facts between days (``SongReports.songs_saved``) instead of
+re-reading the table; a full rebuild happens every ``max_age`` seconds so
+writes made by other workers also show up.
+
+Completion uses the release date of songs in a completed status (the same
+rule as the dashboard activity chart) and cycle time needs ``created_at``,
+the column Supabase adds to every table by default.
+"""
+import csv
+import io
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from aggregates import COMPLETED_STATUSES
+from columnar import parse_date
+
+logger = logging.getLogger(__name__)
+
+REPORT_PROJECTION = "id, status, artist_id, album_id, genre, due_date, release_date, created_at"
+
+# agrupación -> columna de songs y tabla con los nombres
+DIMENSIONS = {"artist": ("artist_id", "artists"), "album": ("album_id", "albums"), "genre": ("genre", "genres")}
+GRANULARITIES = ("day", "week", "month", "year")
+METRICS = ("created", "completed", "cycle_days", "cycle_songs", "open_due")
+# (desde, hasta) días de retraso; None = sin límite
+AGING_BUCKETS = {"1-7": (1, 7), "8-30": (8, 30), "31-90": (31, 90), "90+": (91, None)}
+REPORTS = ("throughput", "cycle_time", "overdue_aging", "breakdown")
+# rango máximo por consulta (~10 años): el coste crece con los días, no con las canciones
+MAX_RANGE_DAYS = 3660
+DEFAULT_RANGE_DAYS = 365
+
+# dimensión de los totales (una sola clave: None)
+TOTAL = "all"
+
+
+def period_label(day, granularity):
+    """Label of the ``granularity`` period that contains ``day`` (a ``date``)."""
+    if granularity == "day":
+        return day.isoformat()
+    if granularity == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == "month":
+        return f"{day.year}-{day.month:02d}"
+    return str(day.year)
+
+
+def song_facts(song):
+    """``(created, completed, cycle, open_due, artist, album, genre)`` of a song.
+
+    Days are ordinals (None when unknown); ``cycle`` is the number of days
+    from creation to release of a completed song.
+    """
+    status = song.get("status")
+    created = parse_date(song.get("created_at"))
+    release = parse_date(song.get("release_date"))
+    due = parse_date(song.get("due_date"))
+    completed = release if status in COMPLETED_STATUSES and release else None
+    cycle = (completed - created).days if completed and created and completed >= created else None
+    # PostgREST evalúa NOT IN con NULL como falso: sin status no cuenta como abierta
+    is_open = status is not None and status not in COMPLETED_STATUSES
+    return (
+        created.toordinal() if created else None,
+        completed.toordinal() if completed else None,
+        cycle,
+        due.toordinal() if is_open and due else None,
+        song.get("artist_id"),
+        song.get("album_id"),
+        song.get("genre"),
+    )
+
+
+class DailyRollups:
+    """Per-day counters of song facts, in total and per dimension value.
+
+    ``tables[metric][dimension][day]`` is a ``Counter`` keyed by the
+    dimension id (``None`` for the ``"all"`` totals), so a total series
+    touches one entry per day however many artists or albums exist.
+    ``facts`` keeps what each song added so an update can take it back out.
+    """
+
+    def __init__(self):
+        self.tables = {metric: {dim: {} for dim in (TOTAL, *DIMENSIONS)} for metric in METRICS}
+        self.facts = {}
+
+    def __len__(self):
+        return len(self.facts)
+
+    def _apply(self, facts, sign):
+        created, completed, cycle, due, *keys = facts
+        groups = ((TOTAL, None), *((dim, key) for dim, key in zip(DIMENSIONS, keys) if key is not None))
+        updates = [("created", created, 1), ("completed", completed, 1), ("open_due", due, 1)]
+        if cycle is not None:
+            updates += [("cycle_days", completed, cycle), ("cycle_songs", completed, 1)]
+        for metric, day, amount in updates:
+            if day is None:
+                continue
+            for dim, key in groups:
+                table = self.tables[metric][dim]
+                counts = table.setdefault(day, Counter())
+                counts[key] += sign * amount
+                if not counts[key]:
+                    del counts[key]
+                if not counts:
+                    del table[day]
+
+    def add(self, song):
+        facts = song_facts(song)
+        previous = self.facts.get(song["id"])
+        if previous == facts:
+            return
+        if previous is not None:
+            self._apply(previous, -1)
+        self.facts[song["id"]] = facts
+        self._apply(facts, 1)
+
+    def remove(self, song_id):
+        previous = self.facts.pop(song_id, None)
+        if previous is not None:
+            self._apply(previous, -1)
+
+    def totals(self, metric, start, end, granularity, dimension=None):
+        """``{(period, key): amount}`` summed over the days of ``[start, end]``."""
+        table = self.tables[metric][dimension or TOTAL]
+        out = Counter()
+        for ordinal in range(start.toordinal(), end.toordinal() + 1):
+            counts = table.get(ordinal)
+            if not counts:
+                continue
+            period = period_label(date.fromordinal(ordinal), granularity) if granularity else None
+            for key, amount in counts.items():
+                out[(period, key)] += amount
+        return out
+
+    def days_before(self, metric, day, dimension=None):
+        """``{day: counts}`` of ``metric`` strictly before ``day``."""
+        return {d: counts for d, counts in self.tables[metric][dimension or TOTAL].items() if d < day}
+
+
+def _cycle_average(days, songs):
+    return round(days / songs, 1) if songs else None
+
+
+class SongReports:
+    """Daily rollups kept current by the write routes, plus the report queries.
+
+    ``loader()`` returns ``(songs, lookups)`` with songs shaped like
+    ``REPORT_PROJECTION`` and ``lookups`` as ``{table: rows}`` (used for the
+    names of artists, albums and genres).
+    """
+
+    def __init__(self, loader, max_age=600):
+        self.loader = loader
+        self.max_age = max_age
+        self.rollups = None
+        self.names = {}
+        self.built_at = None
+        self.last_error = None
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        # escrituras recibidas durante una reconstrucción; se reaplican al terminar
+        self._pending = None
+
+    @property
+    def ready(self):
+        return self.rollups is not None
+
+    def ensure(self):
+        """Build the rollups if missing (blocking) or stale (in background)."""
+        if self.rollups is None:
+            self.rebuild()
+        elif self._stale():
+            self._rebuild_in_background()
+        return self.ready
+
+    def _stale(self):
+        if self.built_at is None:
+            return True
+        return self.built_at == float("-inf") or bool(self.max_age and time.monotonic() - self.built_at > self.max_age)
+
+    def rebuild(self):
+        with self._build_lock:
+            if self.rollups is not None and not self._stale():
+                return
+            with self._lock:
+                self._pending = []
+            try:
+                songs, lookups = self.loader()
+                rollups = DailyRollups()
+                for song in songs:
+                    rollups.add(song)
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("report rollups build failed: %s", e)
+                with self._lock:
+                    self._pending = None
+                    self.built_at = None if self.rollups is None else time.monotonic()
+                return
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self.rollups = rollups
+                self.names = {table: {r.get("id"): r.get("name") for r in lookups.get(table) or []}
+                              for _, table in DIMENSIONS.values()}
+                self.built_at = time.monotonic()
+                self.last_error = None
+                for method, args in pending:
+                    method(*args)
+
+    def _rebuild_in_background(self):
+        if self._build_lock.locked():
+            return
+        threading.Thread(target=self.rebuild, name="report-rollups", daemon=True).start()
+
+    def _apply(self, method, *args):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((method, args))
+            if self.rollups is not None:
+                method(*args)
+
+    def songs_saved(self, songs):
+        """Move inserted/updated rows (full songs rows) to their new days."""
+        def apply(rows):
+            for song in rows:
+                self.rollups.add(song)
+        self._apply(apply, list(songs))
+
+    def song_deleted(self, song_id):
+        self._apply(lambda i: self.rollups.remove(i), song_id)
+
+    def lookup_added(self, table, row):
+        if not row:
+            return
+        with self._lock:
+            if table in self.names:
+                self.names[table][row.get("id")] = row.get("name")
+
+    def invalidate(self):
+        """Rebuild in the background on next use (e.g. after a bulk import)."""
+        with self._lock:
+            if self.built_at is not None:
+                self.built_at = float("-inf")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "songs": len(self.rollups) if self.rollups is not None else 0,
+                "days": {metric: len(tables[TOTAL]) for metric, tables in (self.rollups.tables if self.rollups else {}).items()},
+                "age_seconds": round(time.monotonic() - self.built_at, 1) if self.built_at not in (None, float("-inf")) else None,
+                "last_error": self.last_error,
+            }
+
+    # ------------------------------
+    # Reportes
+    # ------------------------------
+
+    def _group_columns(self, by):
+        return [by, f"{by}_name"] if by else []
+
+    def _group_values(self, by, key):
+        if not by:
+            return {}
+        return {by: key, f"{by}_name": self.names.get(DIMENSIONS[by][1], {}).get(key)}
+
+    def _periods(self, start, end, granularity):
+        labels = []
+        for ordinal in range(start.toordinal(), end.toordinal() + 1):
+            label = period_label(date.fromordinal(ordinal), granularity)
+            if not labels or labels[-1] != label:
+                labels.append(label)
+        return labels
+
+    def throughput(self, start, end, granularity="month", by=None):
+        """Songs created and completed per period."""
+        with self._lock:
+            created = self.rollups.totals("created", start, end, granularity, by)
+            completed = self.rollups.totals("completed", start, end, granularity, by)
+            rows = []
+            keys = sorted({k for _, k in created} | {k for _, k in completed}, key=lambda k: (k is None, k))
+            for period in self._periods(start, end, granularity):
+                for key in keys or [None]:
+                    if by and not created.get((period, key)) and not completed.get((period, key)):
+                        continue
+                    rows.append({
+                        "period": period,
+                        **self._group_values(by, key),
+                        "created": created.get((period, key), 0),
+                        "completed": completed.get((period, key), 0),
+                    })
+            return {"columns": ["period", *self._group_columns(by), "created", "completed"], "rows": rows}
+
+    def cycle_time(self, start, end, granularity="month", by=None):
+        """Average days from creation to release of the songs completed per period."""
+        with self._lock:
+            days = self.rollups.totals("cycle_days", start, end, granularity, by)
+            songs = self.rollups.totals("cycle_songs", start, end, granularity, by)
+            rows = []
+            for period in self._periods(start, end, granularity):
+                for (p, key) in sorted((k for k in songs if k[0] == period), key=lambda k: (k[1] is None, k[1])):
+                    rows.append({
+                        "period": period,
+                        **self._group_values(by, key),
+                        "songs": songs[(p, key)],
+                        "avg_cycle_days": _cycle_average(days.get((p, key), 0), songs[(p, key)]),
+                    })
+                if not by and (period, None) not in songs:
+                    rows.append({"period": period, "songs": 0, "avg_cycle_days": None})
+            return {"columns": ["period", *self._group_columns(by), "songs", "avg_cycle_days"], "rows": rows}
+
+    def overdue_aging(self, today=None, by=None):
+        """Open songs past their due date, by how many days they are late."""
+        today = today or date.today()
+        with self._lock:
+            buckets = {}
+            for ordinal, counts in self.rollups.days_before("open_due", today.toordinal(), by).items():
+                late = today.toordinal() - ordinal
+                label = next(name for name, (low, high) in AGING_BUCKETS.items() if late >= low and (high is None or late <= high))
+                for key, amount in counts.items():
+                    buckets.setdefault(key, Counter())[label] += amount
+            rows = []
+            for key in sorted(buckets, key=lambda k: (k is None, k)) or ([None] if not by else []):
+                counts = buckets.get(key, Counter())
+                rows.append({
+                    **self._group_values(by, key),
+                    **{label: counts.get(label, 0) for label in AGING_BUCKETS},
+                    "total": sum(counts.values()),
+                })
+            return {"columns": [*self._group_columns(by), *AGING_BUCKETS, "total"], "rows": rows}
+
+    def breakdown(self, start, end, by="artist"):
+        """Created, completed and average cycle time per artist, album or genre."""
+        with self._lock:
+            totals = {metric: self.rollups.totals(metric, start, end, None, by)
+                      for metric in ("created", "completed", "cycle_days", "cycle_songs")}
+            keys = set()
+            for counts in totals.values():
+                keys.update(key for _, key in counts)
+            rows = []
+            for key in sorted(keys, key=lambda k: (k is None, k)):
+                songs = totals["cycle_songs"].get((None, key), 0)
+                rows.append({
+                    **self._group_values(by, key),
+                    "created": totals["created"].get((None, key), 0),
+                    "completed": totals["completed"].get((None, key), 0),
+                    "avg_cycle_days": _cycle_average(totals["cycle_days"].get((None, key), 0), songs),
+                })
+            rows.sort(key=lambda r: (-r["completed"], -r["created"]))
+            return {"columns": [*self._group_columns(by), "created", "completed", "avg_cycle_days"], "rows": rows}
+
+    def run(self, name, args, today=None):
+        """Run report ``name`` with request-style string ``args``; raises ValueError on bad input."""
+        today = today or date.today()
+        if name not in REPORTS:
+            raise ValueError(f"Unknown report: {name}")
+        by = args.get("by") or None
+        if by is not None and by not in DIMENSIONS:
+            raise ValueError(f"by must be one of {', '.join(DIMENSIONS)}")
+        if name == "overdue_aging":
+            return self.overdue_aging(today, by)
+
+        end = parse_date(args.get("end")) if args.get("end") else today
+        start = parse_date(args.get("start")) if args.get("start") else end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+        if start is None or end is None:
+            raise ValueError("start and end must be ISO dates (YYYY-MM-DD)")
+        if start > end:
+            raise ValueError("start must not be after end")
+        if (end - start).days >= MAX_RANGE_DAYS:
+            raise ValueError(f"date range is limited to {MAX_RANGE_DAYS} days")
+        if name == "breakdown":
+            return self.breakdown(start, end, by or "artist")
+
+        granularity = args.get("granularity") or "month"
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        return getattr(self, name)(start, end, granularity, by)
+
+
+def report_csv(report):
+    """The rows of a report as CSV text (header included)."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=report["columns"], extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(report["rows"])
+    return buf.getvalue()
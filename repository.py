@@ -0,0 +1,107 @@
+"""Data access for the app's tables, independent of where they live.
+
+Routes talk to a ``Repository`` (``repo.songs``, ``repo.artists``,
+``repo.albums``, ``repo.genres``, ``repo.statuses``) instead of the global
+Supabase client.  Each ``TableRepository`` sends reads to ``reader`` and
+writes to ``writer``; both are supabase-style clients (``table(name)``
+returning a query builder), so the same code runs against:
+
+* Supabase (``writer`` and ``reader`` are the same client),
+* Supabase + the SQLite replica (``reader`` is the replica, and successful
+  writes are applied to it),
+* ``MemoryStore`` for benchmarks and running without credentials.
+"""
+from db import fetch_all
+
+
+class TableRepository:
+    def __init__(self, name, reader, writer, replica=None):
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.replica = replica
+
+    # ------------------------------
+    # Lecturas
+    # ------------------------------
+
+    def select(self, columns="*", count=None):
+        """Query builder for reads; chain filters/order and call ``execute()``."""
+        return self.reader.table(self.name).select(columns, count=count)
+
+    def all(self, columns="*"):
+        return fetch_all(lambda: self.select(columns).order("id"))
+
+    def count(self):
+        return self.select("id", count="exact").limit(1).execute().count or 0
+
+    def between(self, column, start, end, columns="*"):
+        """Rows whose ``column`` is in ``[start, end]`` (an indexed range read)."""
+        return fetch_all(lambda: self.select(columns).gte(column, start).lte(column, end).order("id"))
+
+    def find_by_name(self, name):
+        rows = self.select("*").eq("name", name).limit(1).execute().data
+        return rows[0] if rows else None
+
+    def find_by_names(self, names):
+        return self.select("*").in_("name", list(names)).execute().data or []
+
+    # ------------------------------
+    # Escrituras
+    # ------------------------------
+
+    def insert(self, rows, **kwargs):
+        resp = self.writer.table(self.name).insert(rows, **kwargs).execute()
+        self._replicate(resp)
+        return resp
+
+    def upsert(self, rows, on_conflict, **kwargs):
+        """Insert ``rows`` or update the ones matching ``on_conflict`` (needs a unique index on it).
+
+        With ``ignore_duplicates=True`` matching rows are left alone and not returned.
+        """
+        resp = self.writer.table(self.name).upsert(rows, on_conflict=on_conflict, **kwargs).execute()
+        self._replicate(resp)
+        return resp
+
+    def update(self, patch, ids):
+        resp = self.writer.table(self.name).update(patch).in_("id", list(ids)).execute()
+        self._replicate(resp)
+        return resp
+
+    def delete(self, ids):
+        ids = list(ids)
+        resp = self.writer.table(self.name).delete().in_("id", ids).execute()
+        if self.replica:
+            self.replica.delete(self.name, ids)
+        return resp
+
+    def _replicate(self, resp):
+        if self.replica and not getattr(resp, "error", None):
+            self.replica.apply(self.name, getattr(resp, "data", None))
+
+
+class Repository:
+    TABLES = {
+        "songs": "songs",
+        "artists": "artists",
+        "albums": "albums",
+        "genres": "genres",
+        "statuses": "song_statuses",
+    }
+
+    def __init__(self, writer, reader=None, replica=None):
+        self.writer = writer
+        self.reader = reader or writer
+        self.replica = replica
+        self._tables = {}
+        for attr, name in self.TABLES.items():
+            repo = TableRepository(name, self.reader, writer, replica)
+            self._tables[name] = repo
+            setattr(self, attr, repo)
+
+    def table(self, name):
+        """Repository for a table by its database name (e.g. ``song_statuses``)."""
+        if name not in self._tables:
+            self._tables[name] = TableRepository(name, self.reader, self.writer, self.replica)
+        return self._tables[name]
@@ -0,0 +1,419 @@
+"""In-process search index for songs and the lookup tables.
+
+``SongSearch`` keeps one inverted index per kind (songs, artists, albums,
+genres).  Songs are indexed by ``name``, ``project_name``, the artist,
+album and genre names and the last two components of ``path``.  Queries
+match every word by exact term, prefix (so typeahead works while typing)
+or, for words of four letters or more, by edit distance (one typo, two for
+long words).  Results are ranked by how each word matched and in which
+field.
+
+The index is built once from the database (``loader``), patched by the
+write routes and rebuilt in the background after ``max_age`` seconds to
+pick up changes made elsewhere.
+"""
+import bisect
+import heapq
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# columnas que necesita el índice de canciones
+SEARCH_PROJECTION = "id, name, project_name, path, artists(name), albums(name), genres(name)"
+
+# campo -> peso en el ranking (el orden define el bit de cada campo)
+SONG_FIELDS = {"name": 3.0, "project_name": 2.0, "artist": 2.0, "album": 1.5, "genre": 1.0, "path": 0.5}
+LOOKUP_FIELDS = {"name": 1.0}
+# columnas que devuelve /api/search por tipo de documento
+SONG_COLUMNS = ("id", "name", "project_name", "artist", "album")
+LOOKUP_COLUMNS = ("id", "name", "color")
+
+KINDS = ("songs", "artists", "albums", "genres")
+
+# términos que se expanden como máximo por prefijo o por errores de tipeo
+MAX_EXPANSIONS = 200
+MIN_FUZZY_LENGTH = 4
+
+EXACT_SCORE = 1.0
+FUZZY_SCORES = {1: 0.5, 2: 0.3}
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def normalize(text):
+    """Casefolded text without accents (``Canción`` -> ``cancion``)."""
+    text = unicodedata.normalize("NFKD", str(text))
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    return _TOKEN.findall(normalize(text)) if text else []
+
+
+def path_text(path):
+    # solo la carpeta y el archivo (sin extensión): el resto de la ruta es ruido
+    parts = [p for p in re.split(r"[\\/]", path or "") if p]
+    if parts:
+        parts[-1] = parts[-1].rsplit(".", 1)[0]
+    return " ".join(parts[-2:])
+
+
+def _trigrams(term):
+    padded = f"$${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or ``limit + 1`` as soon as it exceeds ``limit``.
+
+    Levenshtein plus the swap of two adjacent letters as a single edit, so
+    ``sogn`` is one typo away from ``song``.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                # dos letras vecinas intercambiadas
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def _max_typos(term):
+    if len(term) < MIN_FUZZY_LENGTH or term.isdigit():
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+class SearchIndex:
+    """Inverted index over one kind of document.
+
+    ``postings`` maps a term to ``{doc_id: field bitmask}``; the sorted
+    vocabulary answers prefixes with ``bisect`` and a trigram index over
+    the vocabulary finds candidates for typo-tolerant matches.
+    """
+
+    def __init__(self, fields, columns):
+        self.fields = fields
+        # lo que se devuelve de cada documento se guarda como tupla para ahorrar memoria
+        self.columns = columns
+        self._name_at = columns.index("name")
+        self.weights = list(fields.values())
+        self.bits = {name: 1 << i for i, name in enumerate(fields)}
+        self._mask_weights = {}
+        self.postings = {}
+        self.docs = {}
+        self.vocabulary = []
+        self.grams = {}
+        self._loading = False
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id, fields, display):
+        """Index (or re-index) ``doc_id``; ``fields`` maps field name -> text."""
+        self.remove(doc_id)
+        masks = {}
+        for name, text in fields.items():
+            for term in tokenize(text):
+                # un solo objeto por término, compartido entre documentos
+                term = sys.intern(term)
+                masks[term] = masks.get(term, 0) | self.bits[name]
+        for term, mask in masks.items():
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = {}
+                self._add_term(term)
+            docs[doc_id] = mask
+        self.docs[doc_id] = (tuple(display.get(c) for c in self.columns), tuple(masks))
+
+    def load(self, documents):
+        """Bulk ``add`` of ``(doc_id, fields, display)``; the vocabulary is sorted once."""
+        self._loading = True
+        try:
+            for doc_id, fields, display in documents:
+                self.add(doc_id, fields, display)
+        finally:
+            self._loading = False
+            self.vocabulary.sort()
+
+    def remove(self, doc_id):
+        entry = self.docs.pop(doc_id, None)
+        if entry is None:
+            return
+        for term in entry[1]:
+            docs = self.postings[term]
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+                self._remove_term(term)
+
+    def _add_term(self, term):
+        if self._loading:
+            self.vocabulary.append(term)
+        else:
+            bisect.insort(self.vocabulary, term)
+        if _max_typos(term):
+            for gram in _trigrams(term):
+                self.grams.setdefault(gram, set()).add(term)
+
+    def _remove_term(self, term):
+        if self._loading:
+            self.vocabulary.remove(term)
+        else:
+            i = bisect.bisect_left(self.vocabulary, term)
+            if i < len(self.vocabulary) and self.vocabulary[i] == term:
+                del self.vocabulary[i]
+        if _max_typos(term):
+            for gram in _trigrams(term):
+                terms = self.grams.get(gram)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self.grams[gram]
+
+    def _expand(self, token):
+        """``{term: score}`` for the vocabulary terms ``token`` can stand for."""
+        matches = {}
+        if token in self.postings:
+            matches[token] = EXACT_SCORE
+        start = bisect.bisect_left(self.vocabulary, token)
+        for term in self.vocabulary[start:start + MAX_EXPANSIONS]:
+            if not term.startswith(token):
+                break
+            if term != token:
+                # un prefijo más completo puntúa más
+                matches[term] = 0.6 + 0.3 * len(token) / len(term)
+        typos = _max_typos(token)
+        if typos:
+            shared = {}
+            for gram in _trigrams(token):
+                for term in self.grams.get(gram, ()):
+                    shared[term] = shared.get(term, 0) + 1
+            # cada error (también un intercambio de letras vecinas) cambia a lo sumo 4 trigramas
+            needed = len(token) + 1 - 4 * typos
+            candidates = heapq.nlargest(MAX_EXPANSIONS, (c for c in shared.items() if c[1] >= needed), key=lambda c: c[1])
+            for term, _ in candidates:
+                if term in matches:
+                    continue
+                distance = edit_distance(token, term, typos)
+                if distance <= typos:
+                    matches[term] = FUZZY_SCORES[distance]
+        return matches
+
+    def _weight(self, mask):
+        weight = self._mask_weights.get(mask)
+        if weight is None:
+            weight = self._mask_weights[mask] = max(w for i, w in enumerate(self.weights) if mask >> i & 1)
+        return weight
+
+    def search(self, query, limit=10):
+        """Ranked ``(score, doc_id, display)`` for documents matching every word."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        expansions = []
+        for token in tokens:
+            matches = self._expand(token)
+            if not matches:
+                return []
+            expansions.append((sum(len(self.postings[t]) for t in matches), matches))
+        # se empieza por la palabra con menos documentos; las demás solo puntúan a los que quedan
+        expansions.sort(key=lambda e: e[0])
+        totals = None
+        for size, matches in expansions:
+            if totals is not None and len(totals) * len(matches) < size:
+                scores = {}
+                for doc_id in totals:
+                    best = 0
+                    for term, term_score in matches.items():
+                        mask = self.postings[term].get(doc_id)
+                        if mask is not None:
+                            best = max(best, term_score * self._weight(mask))
+                    if best:
+                        scores[doc_id] = best
+            else:
+                scores = {}
+                for term, term_score in matches.items():
+                    for doc_id, mask in self.postings[term].items():
+                        score = term_score * self._weight(mask)
+                        if score > scores.get(doc_id, 0):
+                            scores[doc_id] = score
+            if totals is None:
+                totals = scores
+            else:
+                totals = {doc_id: total + scores[doc_id] for doc_id, total in totals.items() if doc_id in scores}
+            if not totals:
+                return []
+        best = heapq.nsmallest(
+            limit, totals.items(),
+            key=lambda item: (-item[1], len(str(self.docs[item[0]][0][self._name_at] or "")), item[0]),
+        )
+        return [(round(score, 3), doc_id, dict(zip(self.columns, self.docs[doc_id][0]))) for doc_id, score in best]
+
+
+def _name(ref):
+    return (ref or {}).get("name")
+
+
+def song_document(song):
+    """``(fields, display)`` of a song row carrying ``artists``/``albums``/``genres`` embeds."""
+    fields = {
+        "name": song.get("name"),
+        "project_name": song.get("project_name"),
+        "artist": _name(song.get("artists")),
+        "album": _name(song.get("albums")),
+        "genre": _name(song.get("genres")),
+        "path": path_text(song.get("path")),
+    }
+    return fields, dict(song, artist=fields["artist"], album=fields["album"])
+
+
+def lookup_document(row):
+    """``(doc_id, fields, display)`` of an artist/album/genre row."""
+    return row["id"], {"name": row.get("name")}, {"id": row["id"], "name": row.get("name"), "color": row.get("color")}
+
+
+class SongSearch:
+    """Search indexes for songs and lookups, kept current by the write routes.
+
+    ``loader()`` returns ``(songs, lookups)`` with songs shaped like
+    ``SEARCH_PROJECTION`` and ``lookups`` as ``{table: rows}``.
+    """
+
+    def __init__(self, loader, max_age=600):
+        self.loader = loader
+        self.max_age = max_age
+        self.indexes = None
+        self.built_at = None
+        self.last_error = None
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        # escrituras recibidas durante una reconstrucción; se reaplican al terminar
+        self._pending = None
+
+    @property
+    def ready(self):
+        return self.indexes is not None
+
+    def ensure(self, wait=True):
+        """Build the index if missing (blocking when ``wait``) or stale (in background)."""
+        if self.indexes is None:
+            if wait:
+                self.rebuild()
+            else:
+                self._rebuild_in_background()
+        elif self._stale():
+            self._rebuild_in_background()
+        return self.ready
+
+    def _stale(self):
+        if self.built_at is None:
+            return True
+        return self.built_at == float("-inf") or bool(self.max_age and time.monotonic() - self.built_at > self.max_age)
+
+    def rebuild(self):
+        with self._build_lock:
+            # otro hilo pudo terminar la reconstrucción mientras se esperaba el lock
+            if self.indexes is not None and not self._stale():
+                return
+            with self._lock:
+                self._pending = []
+            try:
+                songs, lookups = self.loader()
+                indexes = self._build(songs, lookups)
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("search index build failed: %s", e)
+                with self._lock:
+                    self._pending = None
+                    # se reintenta en la próxima consulta
+                    self.built_at = None if self.indexes is None else time.monotonic()
+                return
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self.indexes = indexes
+                self.built_at = time.monotonic()
+                self.last_error = None
+                for method, args in pending:
+                    method(*args)
+
+    def _rebuild_in_background(self):
+        if self._build_lock.locked():
+            return
+        threading.Thread(target=self.rebuild, name="search-index", daemon=True).start()
+
+    @staticmethod
+    def _build(songs, lookups):
+        indexes = {"songs": SearchIndex(SONG_FIELDS, SONG_COLUMNS)}
+        indexes["songs"].load((song["id"], *song_document(song)) for song in songs)
+        for table in KINDS[1:]:
+            indexes[table] = SearchIndex(LOOKUP_FIELDS, LOOKUP_COLUMNS)
+            indexes[table].load(lookup_document(row) for row in lookups.get(table) or [])
+        return indexes
+
+    def _apply(self, method, *args):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((method, args))
+            if self.indexes is not None:
+                method(*args)
+
+    def songs_saved(self, songs):
+        """Re-index inserted/updated rows (with ``artists``/``albums``/``genres`` embeds)."""
+        def apply(rows):
+            for song in rows:
+                fields, display = song_document(song)
+                self.indexes["songs"].add(song["id"], fields, display)
+        self._apply(apply, list(songs))
+
+    def song_deleted(self, song_id):
+        self._apply(lambda i: self.indexes["songs"].remove(i), song_id)
+
+    def lookup_added(self, table, row):
+        if table not in KINDS or not row:
+            return
+
+        self._apply(lambda r: self.indexes[table].add(*lookup_document(r)), row)
+
+    def invalidate(self):
+        """Rebuild in the background on next use (e.g. after a bulk import)."""
+        with self._lock:
+            if self.built_at is not None:
+                self.built_at = float("-inf")
+
+    def search(self, kind, query, limit=10):
+        with self._lock:
+            index = (self.indexes or {}).get(kind)
+            if index is None:
+                return []
+            return [dict(display, score=score) for score, _, display in index.search(query, limit)]
+
+    def song_ids(self, query, limit):
+        with self._lock:
+            if self.indexes is None:
+                return []
+            return [doc_id for _, doc_id, _ in self.indexes["songs"].search(query, limit)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "documents": {kind: len(index) for kind, index in (self.indexes or {}).items()},
+                "terms": {kind: len(index.vocabulary) for kind, index in (self.indexes or {}).items()},
+                "age_seconds": round(time.monotonic() - self.built_at, 1) if self.built_at not in (None, float("-inf")) else None,
+                "last_error": self.last_error,
+            }
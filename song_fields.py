@@ -0,0 +1,133 @@
+"""Coercion of incoming song fields (JSON, form data or imported rows).
+
+These are the rules ``add_song()`` has always applied: empty strings become
+NULL, ratings and status are integers, ``in_album`` accepts the usual truthy
+spellings and the FK fields accept either an id or a ``new:<name>`` token
+asking for the referenced row to be created.
+"""
+
+TEXT_FIELDS = ('name', 'project_name', 'path', 'url')
+DATE_FIELDS = ('due_date', 'release_date')
+
+# campo FK en songs -> tabla de referencia
+LOOKUP_FIELDS = {'artist_id': 'artists', 'album_id': 'albums', 'genre': 'genres'}
+# tabla de referencia -> clave en la respuesta 'created' ({clave: [filas]})
+CREATED_KEYS = {'artists': 'artist', 'albums': 'album', 'genres': 'genre'}
+
+NEW_TOKEN = 'new:'
+TRUTHY = ('1', 'true', 't', 'yes', 'y', 'on')
+
+
+def parse_in_album(val):
+    if isinstance(val, str):
+        return 1 if val.lower() in TRUTHY else 0
+    try:
+        return 1 if int(val) else 0
+    except Exception:
+        return 1 if bool(val) else 0
+
+
+def parse_optional_int(val):
+    if val in (None, ''):
+        return None
+    try:
+        return int(val)
+    except Exception:
+        return None
+
+
+def new_token_name(val):
+    """Return ``<name>`` for a ``new:<name>`` token, else None."""
+    if isinstance(val, str) and val.startswith(NEW_TOKEN):
+        return val.split(':', 1)[1]
+    return None
+
+
+def coerce_song_fields(data):
+    """Normalize ``data`` into a songs row.
+
+    Returns ``(payload, pending)`` where ``pending`` maps FK fields to names
+    from ``new:<name>`` tokens that still have to be resolved to ids.
+    """
+    payload = {}
+    pending = {}
+
+    for field in TEXT_FIELDS:
+        if field in data:
+            payload[field] = data.get(field) or None
+
+    if 'rating' in data:
+        payload['rating'] = parse_optional_int(data.get('rating'))
+
+    for field in DATE_FIELDS:
+        if field in data:
+            payload[field] = data.get(field) or None
+
+    if 'in_album' in data:
+        payload['in_album'] = parse_in_album(data.get('in_album'))
+
+    for field in LOOKUP_FIELDS:
+        if field not in data:
+            continue
+        val = data.get(field)
+        name = new_token_name(val)
+        if not val:
+            payload[field] = None
+        elif name is not None:
+            pending[field] = name
+        else:
+            payload[field] = parse_optional_int(val)
+
+    if 'status' in data:
+        payload['status'] = parse_optional_int(data.get('status'))
+
+    return payload, pending
+
+
+def merge_created(created, more):
+    """Add the rows of ``more`` to ``created`` (both ``{key: [rows]}``), once per id."""
+    for key, rows in (more or {}).items():
+        known = created.setdefault(key, [])
+        for row in rows:
+            if not any(r.get('id') == row.get('id') for r in known):
+                known.append(row)
+    return created
+
+
+def resolve_pending(payload, pending, create):
+    """Fill ``payload`` FKs from ``pending`` names using ``create(table, name)``.
+
+    ``create`` returns ``(row, inserted)``: the created or existing row (None
+    on failure) and whether it was inserted just now.  Returns the
+    ``created`` dict the JSON endpoints send back to the client: a list of
+    ``{"id", "name"}`` rows per kind (``artist``, ``album``, ``genre``),
+    holding only the rows that were inserted.
+    """
+    created = {}
+    for field, name in pending.items():
+        table = LOOKUP_FIELDS[field]
+        row, inserted = create(table, name)
+        payload[field] = row.get('id') if row else None
+        if row and inserted:
+            merge_created(created, {CREATED_KEYS[table]: [{'id': row.get('id'), 'name': row.get('name') or name}]})
+    return created
+
+
+def coerce_song_update(data):
+    """Normalize a partial update with the rules ``edit_song()`` applies.
+
+    Same as ``coerce_song_fields`` plus the legacy ``artist``/``album`` name
+    fields, used only when the matching ``*_id`` field is absent.  Returns
+    ``(payload, pending, by_name)``; ``by_name`` maps FK fields to names that
+    must be looked up (and created if missing).
+    """
+    payload, pending = coerce_song_fields(data)
+    by_name = {}
+    if 'artist_id' not in data and 'artist' in data:
+        if data.get('artist'):
+            by_name['artist_id'] = data.get('artist')
+        else:
+            payload['artist_id'] = None
+    if 'album_id' not in data and 'album' in data and not data.get('album'):
+        payload['album_id'] = None
+    return payload, pending, by_name
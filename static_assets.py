@@ -0,0 +1,97 @@
+"""Content-hashed URLs for ``static/`` files, cached by browsers for a year.
+
+``url_for('static', filename='css/style.css')`` returns
+``/static/css/style.<hash>.css``.  The hash changes whenever the file does,
+so the hashed URL is served with ``Cache-Control: public, max-age=31536000,
+immutable`` and a repeat visit loads the CSS and images without
+revalidating them.  Text files are compressed once (brotli/gzip) and kept
+in memory.  Unhashed URLs keep working as before, and with ``app.debug``
+URLs are not hashed, so edited files show up without a restart.
+"""
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, current_app, request
+
+from compression import COMPRESSIBLE_TYPES, accepted_encoding, compress
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASH_LENGTH = 10
+
+
+def hashed_name(filename, digest):
+    """``css/style.css`` -> ``css/style.<digest>.css``."""
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{digest[:HASH_LENGTH]}{ext}"
+
+
+class StaticManifest:
+    """Hashed name of every file under ``folder`` (and the way back)."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.hashed = {}
+        self.original = {}
+        # (archivo, codificación) -> bytes comprimidos
+        self._encoded = {}
+        self.build()
+
+    def build(self):
+        self.hashed, self.original, self._encoded = {}, {}, {}
+        if not self.folder or not os.path.isdir(self.folder):
+            return self
+        for dirpath, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                filename = os.path.relpath(path, self.folder).replace(os.sep, "/")
+                with open(path, "rb") as fh:
+                    digest = hashlib.sha256(fh.read()).hexdigest()
+                self.hashed[filename] = hashed_name(filename, digest)
+                self.original[self.hashed[filename]] = filename
+        return self
+
+    def encoded(self, filename, encoding):
+        key = (filename, encoding)
+        if key not in self._encoded:
+            with open(os.path.join(self.folder, filename), "rb") as fh:
+                self._encoded[key] = compress(fh.read(), encoding, level=9)
+        return self._encoded[key]
+
+
+def init_app(app):
+    """Hash ``url_for('static', ...)`` URLs and serve them as immutable."""
+    manifest = StaticManifest(app.static_folder)
+    app.extensions["static_manifest"] = manifest
+    send_static_file = app.view_functions["static"]
+
+    @app.url_defaults
+    def _hash_static_url(endpoint, values):
+        if endpoint == "static" and not current_app.debug:
+            filename = values.get("filename")
+            if filename in manifest.hashed:
+                values["filename"] = manifest.hashed[filename]
+
+    def serve_static(filename):
+        original = manifest.original.get(filename)
+        if original is None:
+            return send_static_file(filename=filename)
+        mimetype = mimetypes.guess_type(original)[0] or "application/octet-stream"
+        encoding = accepted_encoding(request.accept_encodings) if mimetype in COMPRESSIBLE_TYPES else None
+        if encoding:
+            response = Response(manifest.encoded(original, encoding), mimetype=mimetype)
+            response.headers["Content-Encoding"] = encoding
+            response.vary.add("Accept-Encoding")
+        else:
+            response = send_static_file(filename=original)
+            if mimetype in COMPRESSIBLE_TYPES:
+                response.vary.add("Accept-Encoding")
+        response.set_etag(f"{filename}:{encoding}" if encoding else filename)
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+        return response.make_conditional(request)
+
+    app.view_functions["static"] = serve_static
+    return manifest
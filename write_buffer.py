@@ -0,0 +1,221 @@
+"""Fewer upstream writes while editing songs inline.
+
+``WriteCoalescer`` merges edits to the same song that arrive within
+``window`` seconds, or while the previous write for that song is still in
+flight, into one ``update``.  Only songs edited in the last
+``BURST_SECONDS`` wait for the window, so a lone edit is written at once.
+Every request in the group waits for that write and gets the same result
+(the row with all the merged fields); later fields win, as if the edits
+had been sent one after another.
+
+``LookupNames`` resolves ``new:<name>`` tokens.  It keeps an in-process
+``name -> row`` map per lookup table, serializes creations of the same name
+and writes with ``upsert(on_conflict="name", ignore_duplicates=True)``, so a
+double submit (or two workers racing) cannot create two artists, albums or
+genres with one name, and only the request that inserted a row reports it
+as created.
+Without a unique index on ``name`` the upsert fails; it then falls back to
+find-then-insert, still deduplicated within the process.  Any other
+error (timeout, 5xx) is raised and the next write tries the upsert again.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from song_fields import merge_created
+
+logger = logging.getLogger(__name__)
+
+# locks repartidos por hash de la clave en lugar de uno por canción
+LOCK_STRIPES = 64
+# una canción editada hace menos que esto está en plena edición: se espera la ventana
+BURST_SECONDS = 1.0
+# canciones recientes que se recuerdan para detectar ráfagas
+MAX_RECENT = 10000
+# error de Postgres cuando on_conflict no coincide con ningún índice único
+NO_UNIQUE_INDEX_CODE = "42P10"
+NO_UNIQUE_INDEX_MESSAGE = "no unique or exclusion constraint matching the ON CONFLICT specification"
+
+
+def missing_unique_index(error):
+    """True if ``error`` says the ``on_conflict`` column has no unique index."""
+    return getattr(error, "code", None) == NO_UNIQUE_INDEX_CODE or NO_UNIQUE_INDEX_MESSAGE in str(error)
+
+
+class _Group:
+    def __init__(self):
+        self.patch = {}
+        self.created = {}
+        self.requests = 0
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class WriteCoalescer:
+    """Group commit of partial updates per song.
+
+    ``write(song_id, patch, created)`` performs the update (and whatever
+    follows it) and returns the response; ``submit`` returns that response
+    to every request merged into the write, or raises its exception.
+    """
+
+    def __init__(self, write, window=0.05):
+        self.write = write
+        self.window = window
+        self._open = {}
+        self._recent = {}
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.requests = 0
+        self.writes = 0
+
+    def submit(self, song_id, patch, created=None):
+        now = time.monotonic()
+        with self._lock:
+            group = self._open.get(song_id)
+            leader = group is None
+            if leader:
+                group = self._open[song_id] = _Group()
+                linger = now - self._recent.get(song_id, float("-inf")) < BURST_SECONDS
+            self._recent[song_id] = now
+            if len(self._recent) > MAX_RECENT:
+                self._recent = {k: t for k, t in self._recent.items() if now - t < BURST_SECONDS}
+            group.patch.update(patch)
+            merge_created(group.created, created)
+            group.requests += 1
+            self.requests += 1
+        if leader:
+            self._flush(song_id, group, linger)
+        else:
+            group.done.wait()
+        if group.error is not None:
+            raise group.error
+        return group.result
+
+    def _flush(self, song_id, group, linger):
+        if linger and self.window > 0:
+            time.sleep(self.window)
+        # mientras la escritura anterior de esta canción sigue en curso el grupo acepta más cambios
+        with self._stripes[hash(song_id) % LOCK_STRIPES]:
+            with self._lock:
+                self._open.pop(song_id, None)
+            try:
+                group.result = self.write(song_id, group.patch, group.created)
+            except Exception as e:
+                group.error = e
+            finally:
+                self.writes += 1
+                group.done.set()
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'writes': self.writes,
+            'window_ms': round(self.window * 1000),
+            'open': len(self._open),
+        }
+
+
+class LookupNames:
+    """``name -> row`` for the lookup tables, creating missing names once.
+
+    ``rows(table)`` returns the cached rows of a table, ``table(name)`` the
+    repository used to write, and ``on_created(table, row)`` is called for
+    rows this process had not seen before.  Names are remembered for ``ttl``
+    seconds (LRU, ``max_entries``), like the lookup cache, so a renamed or
+    deleted row stops resolving once it expires; ``ttl=0`` never remembers.
+    """
+
+    def __init__(self, rows, table, on_created=None, use_upsert=True, ttl=300, max_entries=20000):
+        self.rows = rows
+        self.table = table
+        self.on_created = on_created
+        self.use_upsert = use_upsert
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (tabla, nombre) -> (vence, fila)
+        self._names = OrderedDict()
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.hits = 0
+        self.writes = 0
+
+    def _known(self, table, name):
+        with self._lock:
+            entry = self._names.get((table, name))
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._names[(table, name)]
+                entry = None
+        row = entry[1] if entry is not None else None
+        if row is None:
+            row = next((r for r in self.rows(table) or [] if r.get('name') == name), None)
+            if row is not None:
+                self._remember(table, row)
+        return row
+
+    def _remember(self, table, row):
+        if self.ttl <= 0:
+            return
+        key = (table, row.get('name'))
+        with self._lock:
+            self._names[key] = (time.monotonic() + self.ttl, row)
+            self._names.move_to_end(key)
+            while len(self._names) > self.max_entries:
+                self._names.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._names.clear()
+
+    def resolve(self, table, name):
+        """``(row, inserted)`` for ``name`` in ``table``, creating the row if it does not exist yet.
+
+        ``inserted`` is True only when this call wrote the row; ``row`` is
+        None if the write failed.
+        """
+        row = self._known(table, name)
+        if row is not None:
+            self.hits += 1
+            return row, False
+        with self._stripes[hash((table, name)) % LOCK_STRIPES]:
+            # otra petición pudo crearla mientras se esperaba el lock
+            row = self._known(table, name)
+            if row is not None:
+                self.hits += 1
+                return row, False
+            row, inserted = self._write(table, name)
+            if row is not None:
+                self._remember(table, row)
+        if row is not None and self.on_created:
+            self.on_created(table, row)
+        return row, inserted
+
+    def _write(self, table, name):
+        self.writes += 1
+        repo = self.table(table)
+        if self.use_upsert:
+            try:
+                # ignore_duplicates: un nombre que ya existe no vuelve en la respuesta
+                resp = repo.upsert({'name': name}, on_conflict='name', ignore_duplicates=True)
+            except Exception as e:
+                # solo la falta del índice único cambia de estrategia; timeouts y 5xx se propagan
+                if not missing_unique_index(e):
+                    raise
+                logger.warning("no unique index on %s.name (%s); falling back to find + insert", table, e)
+                self.use_upsert = False
+            else:
+                data = getattr(resp, 'data', None)
+                if data:
+                    return data[0], True
+                # otro worker la creó antes
+                return repo.find_by_name(name), False
+        row = repo.find_by_name(name)
+        if row is not None:
+            return row, False
+        data = getattr(repo.insert({'name': name}), 'data', None)
+        return (data[0], True) if data else (None, False)
+
+    def stats(self):
+        return {'names': len(self._names), 'hits': self.hits, 'writes': self.writes, 'ttl': self.ttl, 'upsert': self.use_upsert}